@@ -0,0 +1,18 @@
+"""
+Benchmarks for loading and profiling the crop yield dataset
+"""
+
+import pandas as pd
+from analyze_crop_yield_data import create_crop_profiles, create_state_wise_recommendations
+
+def bench_csv_load(benchmark, yield_csv):
+    df = benchmark(pd.read_csv, yield_csv)
+    assert len(df) > 0
+
+def bench_create_crop_profiles(benchmark, yield_df, workdir):
+    profiles = benchmark(create_crop_profiles, yield_df)
+    assert profiles
+
+def bench_create_state_wise_recommendations(benchmark, yield_df, workdir):
+    recommendations = benchmark(create_state_wise_recommendations, yield_df)
+    assert recommendations
@@ -0,0 +1,78 @@
+"""
+Benchmarks for the yield, crop recommendation and disease model hot paths
+"""
+
+import numpy as np
+import pytest
+import torch
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from analyze_crop_yield_data import train_yield_prediction_model, YIELD_FEATURES
+from train_crop_model import load_and_prepare_data
+from train_disease_model import create_resnet_model, DISEASE_CLASSES
+
+@pytest.fixture(scope='session')
+def yield_model_and_features(yield_df, tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('yield_model')
+    (workdir / 'data').mkdir()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(workdir)
+        model, le_crop, le_season, le_state, _ = train_yield_prediction_model(yield_df)
+
+    df = yield_df.dropna()
+    X = df[['Crop', 'Season', 'State', 'Crop_Year', 'Area', 'Annual_Rainfall',
+            'Fertilizer', 'Pesticide']].rename(columns={
+        'Crop': 'Crop_encoded', 'Season': 'Season_encoded', 'State': 'State_encoded'
+    })
+    X['Crop_encoded'] = le_crop.transform(df['Crop'])
+    X['Season_encoded'] = le_season.transform(df['Season'])
+    X['State_encoded'] = le_state.transform(df['State'])
+    return model, X[YIELD_FEATURES]
+
+@pytest.fixture(scope='session')
+def crop_model():
+    df = load_and_prepare_data()
+    X = df.drop(columns='label')
+    y = LabelEncoder().fit_transform(df['label'])
+    model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42,
+                                   min_samples_split=5, min_samples_leaf=2)
+    model.fit(X, y)
+    return model, X
+
+@pytest.fixture(scope='session')
+def disease_model():
+    model = create_resnet_model(len(DISEASE_CLASSES), pretrained=False)
+    return model.eval()
+
+def bench_yield_fit(benchmark, yield_df, workdir):
+    benchmark.pedantic(train_yield_prediction_model, args=(yield_df,), rounds=1, iterations=1)
+
+def bench_yield_predict_single(benchmark, yield_model_and_features):
+    model, X = yield_model_and_features
+    benchmark(model.predict, X.iloc[:1])
+
+def bench_yield_predict_batch(benchmark, yield_model_and_features):
+    model, X = yield_model_and_features
+    predictions = benchmark(model.predict, X)
+    assert len(predictions) == len(X)
+
+def bench_crop_predict_single(benchmark, crop_model):
+    model, X = crop_model
+    benchmark(model.predict_proba, X.iloc[:1])
+
+def bench_crop_predict_batch(benchmark, crop_model):
+    model, X = crop_model
+    benchmark(model.predict_proba, X)
+
+@pytest.mark.parametrize('batch_size', [1, 8, 32])
+def bench_disease_forward(benchmark, disease_model, batch_size):
+    inputs = torch.from_numpy(
+        np.random.default_rng(42).standard_normal((batch_size, 3, 224, 224), dtype=np.float32)
+    )
+
+    def forward():
+        with torch.no_grad():
+            return disease_model(inputs)
+
+    logits = benchmark.pedantic(forward, rounds=5, warmup_rounds=1)
+    assert logits.shape == (batch_size, len(DISEASE_CLASSES))
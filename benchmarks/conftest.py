@@ -0,0 +1,72 @@
+"""
+Shared fixtures for the AgriBot benchmark suite
+
+Run from the repository root:
+    python -m pytest benchmarks
+Results are saved as JSON under benchmarks/.results/ on every run.
+Compare against the previous run and fail on regressions with:
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:20%
+Scales (multiples of crop_yeild.csv) are set with AGRIBOT_BENCH_SCALES,
+e.g. AGRIBOT_BENCH_SCALES=1,10 for a quicker run.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+SOURCE_CSV = os.path.join(ROOT_DIR, 'crop_yeild.csv')
+SCALES = [int(scale) for scale in os.environ.get('AGRIBOT_BENCH_SCALES', '1,10,100').split(',')]
+NUMERIC_JITTER_COLUMNS = ['Area', 'Production', 'Annual_Rainfall', 'Fertilizer', 'Pesticide',
+                          'Yield', 'N_SOIL', 'P_SOIL', 'K_SOIL', 'TEMPERATURE', 'HUMIDITY',
+                          'ph', 'RAINFALL', 'CROP_PRICE']
+
+_datasets = {}
+
+def pytest_configure(config):
+    # Keep results next to the suite regardless of the working directory
+    config.option.benchmark_storage = 'file://' + os.path.join(BENCH_DIR, '.results')
+
+def make_yield_dataset(scale, seed=42):
+    """
+    Replicate crop_yeild.csv `scale` times with +-5% multiplicative jitter
+    on the numeric columns, so larger scales are not exact duplicates
+    """
+    if scale not in _datasets:
+        base = pd.read_csv(SOURCE_CSV)
+        df = pd.concat([base] * scale, ignore_index=True)
+        if scale > 1:
+            rng = np.random.default_rng(seed)
+            jitter = rng.uniform(0.95, 1.05, (len(df), len(NUMERIC_JITTER_COLUMNS)))
+            df[NUMERIC_JITTER_COLUMNS] = df[NUMERIC_JITTER_COLUMNS].to_numpy() * jitter
+        _datasets[scale] = df
+    return _datasets[scale]
+
+@pytest.fixture(scope='session', params=SCALES, ids=lambda scale: f'{scale}x')
+def scale(request):
+    return request.param
+
+@pytest.fixture(scope='session')
+def yield_df(scale):
+    return make_yield_dataset(scale)
+
+@pytest.fixture(scope='session')
+def yield_csv(yield_df, scale, tmp_path_factory):
+    path = tmp_path_factory.mktemp('data') / f'crop_yield_{scale}x.csv'
+    yield_df.to_csv(path, index=False)
+    return str(path)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Run in a temporary directory with a data/ folder, since the scripts
+    write their artifacts relative to the working directory
+    """
+    (tmp_path / 'data').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
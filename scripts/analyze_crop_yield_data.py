@@ -15,9 +15,24 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib
+import os
+import sys
+import tempfile
 import warnings
+from data_quality import RULES, rules_with_outlier_statistics, run_quality_stage, streaming_outlier_statistics, validate_dataframe
+from forest_arrays import flatten_forest, per_tree_predictions
+from climate_features import save_climate_features
+from instrumentation import get_recorder, peak_rss_mb, span
+from model_registry import register_model
+from profitability import save_price_table
+from profile_artifacts import save_crop_profiles_npz, save_state_recommendations_npz
+from similar_farms import SimilarFarmIndex
+from yield_timeseries import save_yield_timeseries
 warnings.filterwarnings('ignore')
 
+YIELD_FEATURES = ['Crop_encoded', 'Season_encoded', 'State_encoded', 'Crop_Year',
+                  'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+
 def fetch_and_load_data():
     """
     Fetch the crop yield data from the provided URL
@@ -219,8 +234,20 @@ def create_crop_profiles(df):
         json.dump(crop_profiles, f, indent=2, default=str)
     
     print(f"Crop profiles saved to data/crop_profiles_real.json")
+    save_crop_profiles_npz(crop_profiles)
     return crop_profiles
 
+def register_yield_model(metadata):
+    """
+    Add the saved yield model and its encoders to the model registry
+    """
+    register_model('yield_prediction', {
+        'model.pkl': 'data/yield_prediction_model.pkl',
+        'crop_encoder.pkl': 'data/crop_encoder.pkl',
+        'season_encoder.pkl': 'data/season_encoder.pkl',
+        'state_encoder.pkl': 'data/state_encoder.pkl'
+    }, metadata)
+
 def train_yield_prediction_model(df):
     """
     Train a machine learning model to predict crop yield
@@ -235,13 +262,13 @@ def train_yield_prediction_model(df):
     le_season = LabelEncoder()
     le_state = LabelEncoder()
     
-    df_model['Crop_encoded'] = le_crop.fit_transform(df_model['Crop'])
-    df_model['Season_encoded'] = le_season.fit_transform(df_model['Season'])
-    df_model['State_encoded'] = le_state.fit_transform(df_model['State'])
+    with span('encode', rows=len(df_model)):
+        df_model['Crop_encoded'] = le_crop.fit_transform(df_model['Crop'])
+        df_model['Season_encoded'] = le_season.fit_transform(df_model['Season'])
+        df_model['State_encoded'] = le_state.fit_transform(df_model['State'])
     
     # Features and target
-    features = ['Crop_encoded', 'Season_encoded', 'State_encoded', 'Crop_Year', 
-                'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+    features = YIELD_FEATURES
     X = df_model[features]
     y = df_model['Yield']
     
@@ -257,10 +284,12 @@ def train_yield_prediction_model(df):
         min_samples_leaf=2
     )
     
-    model.fit(X_train, y_train)
+    with span('fit', rows=len(X_train)):
+        model.fit(X_train, y_train)
     
     # Make predictions
-    y_pred = model.predict(X_test)
+    with span('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
     
     # Calculate metrics
     mse = mean_squared_error(y_test, y_pred)
@@ -281,10 +310,11 @@ def train_yield_prediction_model(df):
     print(feature_importance)
     
     # Save model and encoders
-    joblib.dump(model, 'data/yield_prediction_model.pkl')
-    joblib.dump(le_crop, 'data/crop_encoder.pkl')
-    joblib.dump(le_season, 'data/season_encoder.pkl')
-    joblib.dump(le_state, 'data/state_encoder.pkl')
+    with span('save'):
+        joblib.dump(model, 'data/yield_prediction_model.pkl')
+        joblib.dump(le_crop, 'data/crop_encoder.pkl')
+        joblib.dump(le_season, 'data/season_encoder.pkl')
+        joblib.dump(le_state, 'data/state_encoder.pkl')
     
     # Save model metadata
     metadata = {
@@ -301,10 +331,247 @@ def train_yield_prediction_model(df):
     
     with open('data/yield_model_metadata.json', 'w') as f:
         json.dump(metadata, f, indent=2)
+    register_yield_model(metadata)
     
     print(f"\nModel and encoders saved successfully!")
     return model, le_crop, le_season, le_state, metadata
 
+def iter_yield_chunks(path, chunksize=100000, columns=None):
+    """
+    Stream the yield dataset from a CSV or Parquet file in row groups
+    """
+    if str(path).endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=columns):
+            yield chunk
+
+def fit_encoders_streaming(path, chunksize=100000):
+    """
+    First lightweight pass: read only the categorical columns to fit the encoders
+    """
+    categories = {'Crop': set(), 'Season': set(), 'State': set()}
+    total_rows = 0
+    
+    for chunk in iter_yield_chunks(path, chunksize, columns=list(categories)):
+        total_rows += len(chunk)
+        for column, values in categories.items():
+            # Stripped like the values the data quality stage passes on
+            values.update(chunk[column].dropna().str.strip().unique().tolist())
+    
+    le_crop = LabelEncoder().fit(sorted(categories['Crop']))
+    le_season = LabelEncoder().fit(sorted(categories['Season']))
+    le_state = LabelEncoder().fit(sorted(categories['State']))
+    
+    return le_crop, le_season, le_state, total_rows
+
+def _prepare_yield_chunk(chunk, le_crop, le_season, le_state, chunk_index,
+                         test_size=0.2, random_state=42, rules=RULES):
+    """
+    Validate and encode one chunk, returning its train and holdout parts.
+    Pass rules from rules_with_outlier_statistics so outliers are judged
+    against the whole file rather than this chunk.
+    """
+    chunk = validate_dataframe(chunk, rules=rules).clean
+    
+    X = pd.DataFrame({
+        'Crop_encoded': le_crop.transform(chunk['Crop']),
+        'Season_encoded': le_season.transform(chunk['Season']),
+        'State_encoded': le_state.transform(chunk['State']),
+        'Crop_Year': chunk['Crop_Year'].to_numpy(),
+        'Area': chunk['Area'].to_numpy(),
+        'Annual_Rainfall': chunk['Annual_Rainfall'].to_numpy(),
+        'Fertilizer': chunk['Fertilizer'].to_numpy(),
+        'Pesticide': chunk['Pesticide'].to_numpy()
+    })[YIELD_FEATURES]
+    y = chunk['Yield'].to_numpy()
+    
+    # The holdout mask is seeded by chunk position so every pass sees the same split
+    rng = np.random.default_rng(random_state + chunk_index)
+    is_test = rng.random(len(X)) < test_size
+    
+    return X[~is_test], y[~is_test], X[is_test], y[is_test]
+
+def _spill_training_buckets(path, chunksize, n_buckets, n_used, le_crop, le_season, le_state,
+                            directory, seed=42, rules=RULES):
+    """
+    One streaming pass that encodes the training rows and scatters them at
+    random over n_buckets, writing the first n_used buckets to raw float64
+    files. Every bucket is then a uniform sample of the whole file instead of
+    one contiguous slice of the sorted CSV.
+    """
+    rng = np.random.default_rng(seed)
+    paths = [os.path.join(directory, f'bucket_{i}.f64') for i in range(n_used)]
+    files = [open(bucket_path, 'wb') for bucket_path in paths]
+    try:
+        for chunk_index, chunk in enumerate(iter_yield_chunks(path, chunksize)):
+            X_train, y_train, _, _ = _prepare_yield_chunk(
+                chunk, le_crop, le_season, le_state, chunk_index, rules=rules
+            )
+            rows = np.column_stack([X_train.to_numpy(dtype=np.float64), y_train.astype(np.float64)])
+            buckets = rng.integers(0, n_buckets, len(rows))
+            order = np.argsort(buckets, kind='stable')
+            bounds = np.searchsorted(buckets[order], np.arange(n_used + 1))
+            for bucket in range(n_used):
+                rows[order[bounds[bucket]:bounds[bucket + 1]]].tofile(files[bucket])
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+def train_yield_prediction_model_chunked(path, chunksize=100000, n_estimators=100, spill_dir=None):
+    """
+    Train the yield model out-of-core by streaming the dataset in chunks.
+    A first pass scatters the encoded training rows at random into buckets
+    of about one chunk each, spilled to disk. The forest then grows bucket
+    by bucket (warm start) to exactly n_estimators trees, so every tree sees
+    a sample of all crops and states, and peak memory is bounded by one
+    bucket plus the fitted trees. With more buckets than trees, each tree
+    is fitted on its own bucket and the remaining buckets are not written.
+    The yield outlier statistics come from their own pass over the file, so
+    the rejected rows do not depend on where the chunks are cut.
+    """
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be positive, got {chunksize}")
+    if n_estimators < 1:
+        raise ValueError(f"n_estimators must be positive, got {n_estimators}")
+    
+    print(f"\nTraining yield prediction model in chunked mode from {path}...")
+    
+    with span('encode'):
+        le_crop, le_season, le_state, total_rows = fit_encoders_streaming(path, chunksize)
+        rules = rules_with_outlier_statistics(streaming_outlier_statistics(iter_yield_chunks(path, chunksize)))
+    if total_rows == 0:
+        raise ValueError(f"No rows found in {path}")
+    n_chunks = int(np.ceil(total_rows / chunksize))
+    n_used = min(n_chunks, n_estimators)
+    trees_per_bucket = [len(trees) for trees in np.array_split(np.arange(n_estimators), n_used)]
+    print(f"Found {total_rows:,} rows; fitting {n_estimators} trees over {n_used} shuffled buckets")
+    
+    model = RandomForestRegressor(
+        n_estimators=0,
+        max_depth=15,
+        random_state=42,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        warm_start=True
+    )
+    
+    training_samples = 0
+    pending_trees = 0
+    with tempfile.TemporaryDirectory(dir=spill_dir) as directory:
+        with span('shuffle'):
+            bucket_paths = _spill_training_buckets(
+                path, chunksize, n_chunks, n_used, le_crop, le_season, le_state, directory, rules=rules
+            )
+        
+        for bucket_index, bucket_path in enumerate(bucket_paths):
+            pending_trees += trees_per_bucket[bucket_index]
+            data = np.fromfile(bucket_path, dtype=np.float64).reshape(-1, len(YIELD_FEATURES) + 1)
+            os.remove(bucket_path)
+            if len(data) == 0:
+                continue  # its trees move to the next bucket
+            
+            X_train = pd.DataFrame(data[:, :-1], columns=YIELD_FEATURES)
+            model.n_estimators += pending_trees
+            pending_trees = 0
+            with span('fit', chunk=bucket_index, rows=len(X_train)):
+                model.fit(X_train, data[:, -1])
+            training_samples += len(X_train)
+            print(f"Bucket {bucket_index + 1}/{n_used}: {len(X_train):,} rows, "
+                  f"{model.n_estimators} trees, peak RSS {peak_rss_mb():.1f} MB")
+    
+    if model.n_estimators == 0:
+        raise ValueError(f"No valid training rows in {path}")
+    model.warm_start = False
+    
+    # Second pass: accumulate holdout error without keeping the rows around
+    test_samples = 0
+    sum_y = 0.0
+    sum_y_squared = 0.0
+    squared_error = 0.0
+    for chunk_index, chunk in enumerate(iter_yield_chunks(path, chunksize)):
+        _, _, X_test, y_test = _prepare_yield_chunk(
+            chunk, le_crop, le_season, le_state, chunk_index, rules=rules
+        )
+        if len(X_test) == 0:
+            continue
+        
+        with span('predict', chunk=chunk_index, rows=len(X_test)):
+            y_pred = model.predict(X_test)
+        test_samples += len(y_test)
+        sum_y += float(y_test.sum())
+        sum_y_squared += float(np.square(y_test).sum())
+        squared_error += float(np.square(y_test - y_pred).sum())
+    
+    if test_samples:
+        rmse = np.sqrt(squared_error / test_samples)
+        total_variance = sum_y_squared - sum_y ** 2 / test_samples
+        r2 = 1 - squared_error / total_variance if total_variance > 0 else float('nan')
+    else:
+        print("Warning: no holdout rows were sampled; RMSE and R² are undefined")
+        rmse = r2 = float('nan')
+    peak_rss = peak_rss_mb()
+    
+    print(f"Model Performance:")
+    print(f"RMSE: {rmse:.4f}")
+    print(f"R² Score: {r2:.4f}")
+    print(f"Peak RSS: {peak_rss:.1f} MB")
+    
+    # Save model and encoders
+    with span('save'):
+        joblib.dump(model, 'data/yield_prediction_model.pkl')
+        joblib.dump(le_crop, 'data/crop_encoder.pkl')
+        joblib.dump(le_season, 'data/season_encoder.pkl')
+        joblib.dump(le_state, 'data/state_encoder.pkl')
+    
+    # Save model metadata
+    metadata = {
+        'model_type': 'RandomForestRegressor',
+        'training_mode': 'chunked',
+        'chunksize': chunksize,
+        'n_estimators': model.n_estimators,
+        'rmse': None if np.isnan(rmse) else float(rmse),
+        'r2_score': None if np.isnan(r2) else float(r2),
+        'peak_rss_mb': float(peak_rss),
+        'features': YIELD_FEATURES,
+        'crops': le_crop.classes_.tolist(),
+        'seasons': le_season.classes_.tolist(),
+        'states': le_state.classes_.tolist(),
+        'training_samples': training_samples,
+        'test_samples': test_samples
+    }
+    
+    with open('data/yield_model_metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    register_yield_model(metadata)
+    
+    print(f"\nModel and encoders saved successfully!")
+    return model, le_crop, le_season, le_state, metadata
+
+def predict_yield_distribution(model, X, quantiles=(0.05, 0.5, 0.95), flat_forest=None):
+    """
+    Batched yield prediction with uncertainty from the spread of the trees.
+    The leaves come from each tree's compiled apply() and their values from
+    the flattened forest arrays, so the per-tree predictions cost about as
+    much as model.predict; the mean, spread and quantiles come on top.
+    Pass a precomputed flatten_forest(model) as flat_forest when calling repeatedly.
+    """
+    flat_forest = flat_forest or flatten_forest(model)
+    tree_predictions = per_tree_predictions(flat_forest, X, model=model)
+    
+    result = pd.DataFrame({
+        'mean': tree_predictions.mean(axis=1),
+        'std': tree_predictions.std(axis=1)
+    })
+    for q, values in zip(quantiles, np.quantile(tree_predictions, quantiles, axis=1)):
+        result[f'q{q * 100:g}'] = values
+    
+    return result
+
 def create_state_wise_recommendations(df):
     """
     Create state-wise crop recommendations
@@ -339,20 +606,53 @@ def create_state_wise_recommendations(df):
         json.dump(state_recommendations, f, indent=2, default=str)
     
     print(f"State-wise recommendations saved to data/state_wise_recommendations.json")
+    save_state_recommendations_npz(state_recommendations)
     return state_recommendations
 
 if __name__ == "__main__":
     print("AGRIBOT - REAL CROP YIELD DATA ANALYSIS")
     print("="*50)
     
+    import argparse
+    parser = argparse.ArgumentParser(description='Analyze crop yield data and train the yield model')
+    parser.add_argument('--chunked', metavar='PATH',
+                        help='Train the yield model out-of-core from a local CSV/Parquet file')
+    parser.add_argument('--chunksize', type=int, default=100000,
+                        help='Rows per chunk in chunked mode')
+    args = parser.parse_args()
+    
     # Create data directory
     import os
     os.makedirs('data', exist_ok=True)
     
+    recorder = get_recorder('yield_model')
+    
+    if args.chunked:
+        model, le_crop, le_season, le_state, metadata = train_yield_prediction_model_chunked(
+            args.chunked, chunksize=args.chunksize
+        )
+        # RMSE and R² are None when no holdout rows were sampled (R² also
+        # when the holdout yields are constant), so only record real values
+        if metadata['r2_score'] is None:
+            print("- Model R² Score: undefined (holdout too small or constant)")
+        else:
+            print(f"- Model R² Score: {metadata['r2_score']:.4f}")
+        print(f"- Peak RSS: {metadata['peak_rss_mb']:.1f} MB")
+        for metric in ('rmse', 'r2_score'):
+            if metadata[metric] is not None:
+                recorder.record_metric(metric, metadata[metric])
+        recorder.save('data/yield_model_run.json')
+        sys.exit(0)
+    
     # Fetch and load data
-    df = fetch_and_load_data()
+    with span('load'):
+        df = fetch_and_load_data()
     
     if df is not None:
+        # Validate and quarantine bad rows before profiling and training
+        with span('data_quality', rows=len(df)):
+            df = run_quality_stage(df, outlier_severity='reject')
+        
         # Analyze dataset
         df = analyze_dataset(df)
         
@@ -360,27 +660,53 @@ if __name__ == "__main__":
         create_visualizations(df)
         
         # Create crop profiles
-        crop_profiles = create_crop_profiles(df)
+        with span('crop_profiles'):
+            crop_profiles = create_crop_profiles(df)
         
         # Train yield prediction model
         model, le_crop, le_season, le_state, metadata = train_yield_prediction_model(df)
         
         # Create state-wise recommendations
-        state_recommendations = create_state_wise_recommendations(df)
+        with span('state_recommendations'):
+            state_recommendations = create_state_wise_recommendations(df)
+        
+        # Build the historical yield time-series store
+        with span('yield_timeseries'):
+            save_yield_timeseries(df)
+        
+        # Precompute climate normals per State and location
+        with span('climate_features'):
+            save_climate_features(df)
+        
+        # Price distributions for the profitability ranking
+        with span('price_table'):
+            save_price_table(df)
+        
+        # Index the soil samples for "farms like mine" search
+        with span('similar_farms'):
+            SimilarFarmIndex.build(df).save()
         
         print(f"\n" + "="*50)
         print("ANALYSIS COMPLETED SUCCESSFULLY!")
         print("="*50)
         
         print(f"\nFiles created:")
+        print("- data/quarantine.csv")
+        print("- data/data_quality_summary.json")
         print("- data/crop_yield_analysis.png")
         print("- data/crop_profiles_real.json")
+        print("- data/crop_profiles_real.npz")
         print("- data/yield_prediction_model.pkl")
         print("- data/crop_encoder.pkl")
         print("- data/season_encoder.pkl")
         print("- data/state_encoder.pkl")
         print("- data/yield_model_metadata.json")
         print("- data/state_wise_recommendations.json")
+        print("- data/state_wise_recommendations.npz")
+        print("- data/yield_timeseries.npz")
+        print("- data/climate_features.npz")
+        print("- data/crop_price_table.npz")
+        print("- data/similar_farms.npz")
         
         print(f"\nDataset Summary:")
         print(f"- Total records: {len(df):,}")
@@ -393,5 +719,9 @@ if __name__ == "__main__":
         df.to_csv('data/processed_crop_yield.csv', index=False)
         print("- data/processed_crop_yield.csv")
         
+        recorder.record_metric('rmse', metadata['rmse'])
+        recorder.record_metric('r2_score', metadata['r2_score'])
+        recorder.save('data/yield_model_run.json')
+        
     else:
         print("Failed to load data. Please check the URL and try again.")
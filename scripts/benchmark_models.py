@@ -0,0 +1,133 @@
+"""
+Benchmark the model backends for AgriBot
+This script trains every backend on the same crop and yield splits and
+reports fit time, predict latency, model size and accuracy side by side
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
+from model_backends import BACKENDS, create_backend
+
+def load_crop_task():
+    """
+    Load the crop recommendation features and encoded labels
+    """
+    if os.path.exists('data/crop_recommendation.csv'):
+        df = pd.read_csv('data/crop_recommendation.csv')
+    else:
+        from train_crop_model import load_and_prepare_data
+        df = load_and_prepare_data()
+
+    X = df[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']].to_numpy(dtype=np.float64)
+    y = LabelEncoder().fit_transform(df['label'])
+    return X, y
+
+def load_yield_task(path='crop_yeild.csv'):
+    """
+    Load the yield features with the same encoding as train_yield_prediction_model
+    """
+    df = pd.read_csv(path).dropna()
+    X = np.column_stack([
+        LabelEncoder().fit_transform(df['Crop']),
+        LabelEncoder().fit_transform(df['Season']),
+        LabelEncoder().fit_transform(df['State']),
+        df[['Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']].to_numpy()
+    ]).astype(np.float64)
+    y = df['Yield'].to_numpy()
+    return X, y
+
+def benchmark_backend(name, task, splits, latency_repeats=200):
+    """
+    Train one backend and measure fit time, predict latency, size and accuracy
+    """
+    X_train, X_test, y_train, y_test = splits
+    backend = create_backend(name, task=task)
+
+    start = time.perf_counter()
+    backend.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = backend.predict(X_test)
+    batch_time = time.perf_counter() - start
+
+    single_row = X_test[:1]
+    timings = []
+    for _ in range(latency_repeats):
+        start = time.perf_counter()
+        backend.predict(single_row)
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        'backend': name,
+        'task': task,
+        'fit_time_s': fit_time,
+        'predict_single_ms': float(np.median(timings) * 1000),
+        'predict_batch_rows_per_s': len(X_test) / batch_time,
+        'model_size_kb': backend.model_size_bytes() / 1024
+    }
+
+    if task == 'classification':
+        result['accuracy'] = float(accuracy_score(y_test, y_pred))
+    else:
+        result['rmse'] = float(np.sqrt(mean_squared_error(y_test, y_pred)))
+        result['r2_score'] = float(r2_score(y_test, y_pred))
+
+    return result
+
+def run_benchmarks(backends=None, yield_path='crop_yeild.csv'):
+    """
+    Train every backend on the same splits for the crop and yield tasks
+    """
+    backends = backends or list(BACKENDS)
+    tasks = {
+        'classification': load_crop_task(),
+        'regression': load_yield_task(yield_path)
+    }
+
+    results = []
+    for task, (X, y) in tasks.items():
+        stratify = y if task == 'classification' else None
+        splits = train_test_split(X, y, test_size=0.2, random_state=42, stratify=stratify)
+        for name in backends:
+            print(f"Benchmarking {name} ({task})...")
+            try:
+                results.append(benchmark_backend(name, task, splits))
+            except ImportError as e:
+                print(f"Skipping {name}: {e}")
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare model backends on the same splits')
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKENDS),
+                        help='Backends to benchmark (default: all)')
+    parser.add_argument('--yield-data', default='crop_yeild.csv',
+                        help='Path to the crop yield CSV')
+    parser.add_argument('--output', default='data/model_benchmark.json',
+                        help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    print("AgriBot Model Backend Benchmark")
+    print("=" * 50)
+
+    results = run_benchmarks(args.backends, args.yield_data)
+
+    for task in ('classification', 'regression'):
+        table = pd.DataFrame([r for r in results if r['task'] == task])
+        if not table.empty:
+            print(f"\n{task.capitalize()} results:")
+            print(table.drop(columns='task').to_string(index=False, float_format='%.4f'))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nBenchmark results saved to {args.output}")
@@ -0,0 +1,192 @@
+"""
+Precomputed climate features for AgriBot
+Builds multi-year climate normals per State from crop_yeild.csv and maps every
+location in Indian-Cities-Geo-Data.json onto them, so the recommender can
+auto-fill missing temperature, humidity and rainfall with a dictionary lookup
+"""
+
+import json
+import numpy as np
+import pandas as pd
+
+# Model input name -> source column in crop_yeild.csv
+CLIMATE_COLUMNS = {
+    'temperature': 'TEMPERATURE',
+    'humidity': 'HUMIDITY',
+    'rainfall': 'RAINFALL',
+    'annual_rainfall': 'Annual_Rainfall'
+}
+AUTOFILL_FEATURES = ['temperature', 'humidity', 'rainfall']
+LOCATION_SUFFIX = ' Latitude and Longitude'
+
+def _normalize(name):
+    return str(name).strip().lower()
+
+def build_climate_features(df, geo_records):
+    """
+    Build the per-State and per-location climate feature tables.
+    State normals are the mean and std over years of each State-year mean.
+    States without climate records borrow the normals of the nearest covered
+    State, measured between the centroids of their geo locations.
+    """
+    columns = list(CLIMATE_COLUMNS.values())
+    yearly = (
+        df.assign(State=df['State'].str.strip())
+        .groupby(['State', 'Crop_Year'])[columns].mean()
+        .groupby(level='State').agg(['mean', 'std'])
+    )
+
+    feature_names = [f'{name}_{stat}' for name in CLIMATE_COLUMNS for stat in ('mean', 'std')]
+    covered_states = yearly.index.to_numpy(dtype=str)
+    covered_features = np.column_stack([
+        yearly[(column, stat)].to_numpy() for column in columns for stat in ('mean', 'std')
+    ])
+    years_observed = (
+        df.assign(State=df['State'].str.strip())
+        .groupby('State')['Crop_Year'].nunique()
+        .reindex(covered_states).to_numpy()
+    )
+
+    geo = pd.DataFrame(geo_records)
+    geo['State'] = geo['State'].str.strip()
+    geo['Location'] = geo['Location'].str.replace(LOCATION_SUFFIX, '', regex=False).str.strip()
+    centroids = geo.groupby('State')[['Latitude', 'Longitude']].mean()
+
+    # Every State from either source, covered States first
+    all_states = list(covered_states) + sorted(set(centroids.index) - set(covered_states))
+    centroid_table = centroids.reindex(all_states).to_numpy()
+    covered_centroids = centroid_table[:len(covered_states)]
+
+    source = np.arange(len(all_states))
+    uncovered = np.arange(len(covered_states), len(all_states))
+    known = ~np.isnan(covered_centroids).any(axis=1)
+    if len(uncovered) and known.any():
+        distances = np.linalg.norm(
+            centroid_table[uncovered][:, None, :] - covered_centroids[known][None, :, :], axis=2
+        )
+        source[uncovered] = np.flatnonzero(known)[distances.argmin(axis=1)]
+
+    state_position = {_normalize(state): i for i, state in enumerate(all_states)}
+    location_state = geo['State'].map(lambda state: state_position[_normalize(state)]).to_numpy()
+
+    return {
+        'feature_names': np.array(feature_names),
+        'states': np.array(all_states),
+        'state_features': covered_features[source].astype(np.float32),
+        'state_source': source.astype(np.int32),
+        'years_observed': np.concatenate([
+            years_observed, np.zeros(len(uncovered), dtype=years_observed.dtype)
+        ]).astype(np.int32),
+        'n_covered_states': np.array(len(covered_states)),
+        'locations': geo['Location'].to_numpy(dtype=str),
+        'location_state': location_state.astype(np.int32),
+        'latitude': geo['Latitude'].to_numpy(dtype=np.float32),
+        'longitude': geo['Longitude'].to_numpy(dtype=np.float32)
+    }
+
+def save_climate_features(df, geo_path='data/Indian-Cities-Geo-Data.json',
+                          path='data/climate_features.npz'):
+    """
+    Build and save the climate feature artifact
+    """
+    with open(geo_path, encoding='utf-8') as f:
+        geo_records = json.load(f)
+
+    features = build_climate_features(df, geo_records)
+    np.savez_compressed(path, **features)
+    print(f"Climate features for {len(features['states'])} states and "
+          f"{len(features['locations'])} locations saved to {path}")
+    return features
+
+class ClimateFeatureStore:
+    """
+    Constant-time lookups of climate normals by State or location
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.feature_names = arrays['feature_names'].tolist()
+        self.state_index = {_normalize(state): i for i, state in enumerate(arrays['states'].tolist())}
+        self.location_index = {}
+        for i, (location, state) in enumerate(zip(arrays['locations'].tolist(),
+                                                  arrays['location_state'].tolist())):
+            self.location_index.setdefault(_normalize(location), i)
+            self.location_index.setdefault((_normalize(location), state), i)
+
+    @classmethod
+    def load(cls, path='data/climate_features.npz'):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def _state_row(self, i):
+        a = self.arrays
+        source = int(a['state_source'][i])
+        row = dict(zip(self.feature_names, a['state_features'][i].tolist()))
+        row['state'] = str(a['states'][i])
+        row['source_state'] = str(a['states'][source])
+        row['years_observed'] = int(a['years_observed'][source])
+        return row
+
+    def lookup_state(self, state):
+        i = self.state_index.get(_normalize(state))
+        return None if i is None else self._state_row(i)
+
+    def lookup_location(self, location, state=None):
+        key = _normalize(location)
+        if state is not None:
+            state_i = self.state_index.get(_normalize(state))
+            i = self.location_index.get((key, state_i))
+        else:
+            i = self.location_index.get(key)
+        if i is None:
+            return None
+
+        row = self._state_row(int(self.arrays['location_state'][i]))
+        row['location'] = str(self.arrays['locations'][i])
+        row['latitude'] = float(self.arrays['latitude'][i])
+        row['longitude'] = float(self.arrays['longitude'][i])
+        return row
+
+    def fill_missing(self, soil_params, state=None, location=None):
+        """
+        Return a copy of soil_params with missing temperature, humidity and
+        rainfall taken from the location's or State's climate normals.
+        State/location may also be given as keys of soil_params.
+        """
+        state = state or soil_params.get('state')
+        location = location or soil_params.get('location')
+        missing = [feature for feature in AUTOFILL_FEATURES
+                   if soil_params.get(feature) is None or pd.isna(soil_params.get(feature))]
+        if not missing:
+            return dict(soil_params)
+
+        climate = None
+        if location:
+            climate = self.lookup_location(location, state)
+        if climate is None and state:
+            climate = self.lookup_state(state)
+        if climate is None:
+            return dict(soil_params)
+
+        filled = dict(soil_params)
+        for feature in missing:
+            filled[feature] = climate[f'{feature}_mean']
+        filled['autofilled'] = missing
+        return filled
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Build per-State and per-location climate features')
+    parser.add_argument('--data', default='crop_yeild.csv', help='Path to the crop yield CSV')
+    parser.add_argument('--geo', default='data/Indian-Cities-Geo-Data.json')
+    parser.add_argument('--output', default='data/climate_features.npz')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    df = pd.read_csv(args.data)
+    save_climate_features(df, args.geo, args.output)
+
+    store = ClimateFeatureStore.load(args.output)
+    example = store.fill_missing({'N': 90, 'P': 42, 'K': 43, 'ph': 6.5}, location='Port Blair')
+    print(f"\nAuto-filled inputs for Port Blair: {example}")
@@ -0,0 +1,284 @@
+"""
+Cached crop recommendation predictor for AgriBot
+Soil-card inputs are quantized to their measurement precision and the top-k
+predictions are memoized in a bounded LRU, optionally backed by SQLite so
+several worker processes can share results
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import joblib
+import numpy as np
+import pandas as pd
+from forest_attributions import ForestExplainer
+from model_registry import REGISTRY_ROOT, current_artifacts, file_sha256
+from soil_features import FEATURES
+
+
+# Precision soil health card labs report each input at
+FEATURE_PRECISION = {
+    'N': 1.0,
+    'P': 1.0,
+    'K': 1.0,
+    'temperature': 0.1,
+    'humidity': 1.0,
+    'ph': 0.1,
+    'rainfall': 1.0
+}
+
+def quantize_soil_params(soil_params):
+    """
+    Map soil parameters onto an integer grid at their measurement precision.
+    Raises ValueError naming any parameter that is missing, e.g. a climate
+    value the ClimateFeatureStore had no normals to fill in.
+    """
+    missing = [feature for feature in FEATURES
+               if soil_params.get(feature) is None or pd.isna(soil_params.get(feature))]
+    if missing:
+        raise ValueError(f"Missing soil parameters: {', '.join(missing)}")
+    return tuple(int(round(float(soil_params[feature]) / FEATURE_PRECISION[feature]))
+                 for feature in FEATURES)
+
+def dequantize_key(key):
+    """
+    Convert a quantized key back to model input values
+    """
+    return [value * FEATURE_PRECISION[feature] for feature, value in zip(FEATURES, key)]
+
+class PredictionCache:
+    """
+    Bounded LRU of prediction results with hit/miss counters.
+    When sqlite_path is set, entries are also written to a SQLite table
+    keyed by model hash, which other processes can read.
+    """
+    def __init__(self, maxsize=10000, sqlite_path=None):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+
+        if sqlite_path:
+            self.db = sqlite3.connect(sqlite_path, timeout=30, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                'model_hash TEXT NOT NULL, key TEXT NOT NULL, result TEXT NOT NULL, '
+                'PRIMARY KEY (model_hash, key))'
+            )
+            self.db.commit()
+
+    def get(self, model_hash, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    'SELECT result FROM predictions WHERE model_hash = ? AND key = ?',
+                    (model_hash, json.dumps(key))
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._store(key, result)
+                    self.hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def put_many(self, model_hash, items):
+        with self.lock:
+            for key, result in items:
+                self._store(key, result)
+
+            if self.db is not None:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO predictions (model_hash, key, result) VALUES (?, ?, ?)',
+                    [(model_hash, json.dumps(key), json.dumps(result)) for key, result in items]
+                )
+                self.db.commit()
+
+    def record_hits(self, count):
+        """
+        Count results served without a lookup, e.g. repeats within a batch
+        """
+        with self.lock:
+            self.hits += count
+
+    def _store(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, retired_hash=None):
+        """
+        Clear the in-memory entries and drop the shared entries of the
+        retired model only, so workers sharing the SQLite table that still
+        serve another model keep theirs
+        """
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None and retired_hash is not None:
+                self.db.execute('DELETE FROM predictions WHERE model_hash = ?', (retired_hash,))
+                self.db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self.entries),
+            'maxsize': self.maxsize
+        }
+
+class CachedCropPredictor:
+    """
+    Crop recommendation predictor with a quantized-input result cache.
+    The model served is the CURRENT version of registry_name in the model
+    registry, so registering or rolling back a version switches it; the
+    fixed model_path/encoder_path are used only while nothing is registered.
+    The model file is re-hashed whenever its path, size or mtime changes,
+    and the cache is invalidated when the hash differs from the loaded model.
+    With a ClimateFeatureStore, missing temperature/humidity/rainfall are
+    filled from the 'state' or 'location' given in the soil parameters.
+    With explain=True every recommendation carries reason codes from its
+    per-feature attributions; top_k and explain are part of the cache key,
+    so predictors with different settings can share one SQLite table.
+    """
+    def __init__(self, model_path='data/crop_recommendation_model.pkl',
+                 encoder_path='data/crop_label_encoder.pkl', top_k=3,
+                 maxsize=10000, sqlite_path=None, climate_store=None, explain=False,
+                 registry_name='crop_recommendation', registry_root=REGISTRY_ROOT):
+        self.model_path = model_path
+        self.encoder_path = encoder_path
+        self.registry_name = registry_name
+        self.registry_root = registry_root
+        self.top_k = top_k
+        self.climate_store = climate_store
+        self.explain = explain
+        self.explainer = None
+        self.cache = PredictionCache(maxsize=maxsize, sqlite_path=sqlite_path)
+        self.model = None
+        self.label_encoder = None
+        self.model_hash = None
+        self.model_stat = None
+        self._ensure_current()
+
+    def _artifact_paths(self):
+        fallback = {'model.pkl': self.model_path, 'label_encoder.pkl': self.encoder_path}
+        if self.registry_name is None:
+            return fallback
+        return current_artifacts(self.registry_name, fallback, self.registry_root)[1]
+
+    def _ensure_current(self):
+        paths = self._artifact_paths()
+        model_path = paths['model.pkl']
+        stat = os.stat(model_path)
+        stat_key = (model_path, stat.st_mtime_ns, stat.st_size)
+        if stat_key == self.model_stat:
+            return
+
+        model_hash = file_sha256(model_path)
+        self.model_stat = stat_key
+        if model_hash == self.model_hash:
+            return
+
+        self.model = joblib.load(model_path)
+        self.label_encoder = joblib.load(paths['label_encoder.pkl'])
+        if self.explain:
+            self.explainer = ForestExplainer(self.model, FEATURES)
+        self.cache.invalidate(self.model_hash)
+        self.model_hash = model_hash
+        print(f"Loaded crop model {model_hash[:12]} and cleared the prediction cache")
+
+    def _predict_keys(self, keys):
+        inputs = pd.DataFrame([dequantize_key(key) for key in keys], columns=FEATURES)
+        probabilities = self.model.predict_proba(inputs)
+        top_indices = np.argsort(probabilities, axis=1)[:, ::-1][:, :self.top_k]
+        crops = self.label_encoder.inverse_transform(self.model.classes_[top_indices].ravel())
+        crops = crops.reshape(top_indices.shape)
+
+        results = [
+            [{'crop': str(crop), 'confidence': float(probabilities[row, index]) * 100}
+             for crop, index in zip(crops[row], top_indices[row])]
+            for row in range(len(keys))
+        ]
+
+        if self.explainer is not None:
+            for rank in range(top_indices.shape[1]):
+                _, reasons = self.explainer.explain(inputs.to_numpy(), target=top_indices[:, rank])
+                for row, row_reasons in enumerate(reasons):
+                    results[row][rank]['reasons'] = [reason['reason'] for reason in row_reasons]
+
+        return results
+
+    def predict(self, soil_params):
+        """
+        Top-k crop recommendations for one set of soil parameters
+        """
+        return self.predict_batch([soil_params])[0]
+
+    def predict_batch(self, soil_params_list):
+        """
+        Top-k crop recommendations for many inputs.
+        Cache misses are predicted together in a single model call.
+        """
+        self._ensure_current()
+        if self.climate_store is not None:
+            soil_params_list = [self.climate_store.fill_missing(params) for params in soil_params_list]
+        keys = [quantize_soil_params(params) for params in soil_params_list]
+
+        # Look each distinct input up once; repeats within the batch are hits
+        found = {key: self.cache.get(self.model_hash, (key, self.top_k, self.explain))
+                 for key in dict.fromkeys(keys)}
+        self.cache.record_hits(len(keys) - len(found))
+
+        missing = [key for key, result in found.items() if result is None]
+        if missing:
+            predicted = self._predict_keys(missing)
+            found.update(zip(missing, predicted))
+            self.cache.put_many(self.model_hash, [((key, self.top_k, self.explain), result)
+                                                  for key, result in zip(missing, predicted)])
+
+        return [found[key] for key in keys]
+
+    def stats(self):
+        return dict(self.cache.stats(), model_hash=self.model_hash)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Exercise the cached crop predictor')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--sqlite', help='Optional SQLite file shared between workers')
+    args = parser.parse_args()
+
+    predictor = CachedCropPredictor(sqlite_path=args.sqlite)
+
+    # Lab-report style inputs: few distinct, coarsely rounded values
+    rng = np.random.default_rng(42)
+    requests = [
+        {'N': rng.integers(60, 63), 'P': rng.integers(40, 42), 'K': rng.integers(40, 42),
+         'temperature': round(rng.uniform(20, 20.3), 1), 'humidity': rng.integers(80, 82),
+         'ph': round(rng.uniform(6.4, 6.6), 1), 'rainfall': rng.integers(200, 202)}
+        for _ in range(args.requests)
+    ]
+
+    start = time.perf_counter()
+    for params in requests:
+        predictor.predict(params)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} predictions in {elapsed:.2f}s "
+          f"({elapsed / args.requests * 1000:.3f} ms/request)")
+    print(f"Cache stats: {predictor.stats()}")
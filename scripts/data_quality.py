@@ -0,0 +1,261 @@
+"""
+Data quality stage for the crop yield dataset
+Validates every ingest of crop_yeild.csv against a declarative schema and a
+list of cross-column rules before profiling and training. Each rule is one
+vectorized mask, and the masks are packed into a bit field per row, so a
+multi-million-row file is checked in a single pass over its columns.
+
+Rows failing a 'reject' rule go to a quarantine file together with the names
+of the rules they failed; 'warn' rules are only counted in the summary.
+Yield outliers within a Crop x State group are rejected by default so they
+never reach training; callers can pass a different severity per rule, e.g.
+to only warn on them.
+"""
+
+import json
+import time
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+SEASONS = ['Autumn', 'Kharif', 'Rabi', 'Summer', 'Whole Year', 'Winter']
+
+# Column -> expectations. Every listed column is required and must be non-null.
+SCHEMA = {
+    'Crop': {'type': 'category'},
+    'Season': {'type': 'category', 'allowed': SEASONS},
+    'State': {'type': 'category'},
+    'Crop_Year': {'type': 'numeric', 'min': 1950, 'max': 2100},
+    'Area': {'type': 'numeric', 'min': 0, 'exclusive_min': True},
+    'Production': {'type': 'numeric', 'min': 0},
+    'Annual_Rainfall': {'type': 'numeric', 'min': 0},
+    'Fertilizer': {'type': 'numeric', 'min': 0},
+    'Pesticide': {'type': 'numeric', 'min': 0},
+    'Yield': {'type': 'numeric', 'min': 0},
+    'N_SOIL': {'type': 'numeric', 'min': 0, 'optional': True},
+    'P_SOIL': {'type': 'numeric', 'min': 0, 'optional': True},
+    'K_SOIL': {'type': 'numeric', 'min': 0, 'optional': True},
+    'TEMPERATURE': {'type': 'numeric', 'min': -10, 'max': 60, 'optional': True},
+    'HUMIDITY': {'type': 'numeric', 'min': 0, 'max': 100, 'optional': True},
+    'ph': {'type': 'numeric', 'min': 0, 'max': 14, 'optional': True},
+    'RAINFALL': {'type': 'numeric', 'min': 0, 'optional': True},
+    'CROP_PRICE': {'type': 'numeric', 'min': 0, 'exclusive_min': True, 'optional': True}
+}
+
+# Relative mismatch between Yield and Production/Area tolerated by the
+# consistency rule; the published data agrees to within 5% at the median
+# and 49% at worst, so larger gaps point at unit or entry errors
+YIELD_TOLERANCE = 0.5
+# Robust z-score of log yield within a Crop x State group beyond which a row
+# is an outlier. Grouping by crop alone would compare States that grow the
+# same crop in different units or varieties (Uttar Pradesh Jute yields about
+# 0.8 where West Bengal's is about 15) and quarantine a whole State.
+OUTLIER_Z = 6.0
+OUTLIER_GROUP = ['Crop', 'State']
+OUTLIER_RULE = 'yield_outlier_within_crop_state'
+
+def _yield_mismatch(df):
+    expected = df['Production'] / df['Area']
+    return (np.abs(expected - df['Yield']) > YIELD_TOLERANCE * np.maximum(expected, df['Yield'])).to_numpy()
+
+def yield_outlier_statistics(df):
+    """
+    Median and scaled MAD of log yield per Crop x State group
+    """
+    log_yield = np.log1p(df['Yield'].astype(float))
+    keys = [df[column] for column in OUTLIER_GROUP]
+    median = log_yield.groupby(keys, observed=True).transform('median')
+    deviation = (log_yield - median).abs()
+    return pd.DataFrame({
+        'median': log_yield.groupby(keys, observed=True).median(),
+        'mad': deviation.groupby(keys, observed=True).median() * 1.4826
+    })
+
+def streaming_outlier_statistics(chunks):
+    """
+    Outlier statistics over a whole file read in chunks, so chunked
+    validation rejects the same rows as validating the file at once.
+    Keeps the group columns and yield of the schema-clean rows in memory.
+    """
+    rules = [rule for rule in RULES if rule['name'] != OUTLIER_RULE]
+    parts = []
+    for chunk in chunks:
+        clean = validate_dataframe(chunk, rules=rules).clean
+        parts.append(clean[OUTLIER_GROUP + ['Yield']].astype(
+            {column: 'category' for column in OUTLIER_GROUP}))
+    if not parts:
+        return yield_outlier_statistics(pd.DataFrame(columns=OUTLIER_GROUP + ['Yield']))
+    # pd.concat falls back to object columns when the chunks' categories differ
+    combined = pd.DataFrame({
+        column: union_categoricals([part[column] for part in parts]) for column in OUTLIER_GROUP
+    })
+    combined['Yield'] = np.concatenate([part['Yield'].to_numpy(dtype=float) for part in parts])
+    return yield_outlier_statistics(combined)
+
+def _yield_outliers(df, statistics=None):
+    if statistics is None:
+        statistics = yield_outlier_statistics(df)
+    groups = pd.MultiIndex.from_frame(df[OUTLIER_GROUP])
+    median = statistics['median'].reindex(groups).to_numpy()
+    mad = statistics['mad'].reindex(groups).to_numpy()
+    z = np.abs(np.log1p(df['Yield'].to_numpy(dtype=float)) - median) / np.where(mad > 0, mad, np.nan)
+    return z > OUTLIER_Z
+
+# Cross-column rules, evaluated after the schema rules on the coerced columns
+RULES = [
+    {'name': 'yield_matches_production_per_area', 'severity': 'warn',
+     'columns': ['Yield', 'Production', 'Area'], 'check': _yield_mismatch},
+    {'name': OUTLIER_RULE, 'severity': 'reject',
+     'columns': ['Yield'] + OUTLIER_GROUP, 'check': _yield_outliers}
+]
+
+def rules_with_outlier_statistics(statistics, rules=RULES):
+    """
+    Copy of rules whose outlier check uses precomputed statistics, e.g.
+    from streaming_outlier_statistics, instead of the rows it is given
+    """
+    return [dict(rule, check=lambda df: _yield_outliers(df, statistics)) if rule['name'] == OUTLIER_RULE
+            else rule for rule in rules]
+
+class ValidationResult:
+    """
+    Clean rows, quarantined rows and the summary of one validation run
+    """
+    def __init__(self, clean, quarantine, summary):
+        self.clean = clean
+        self.quarantine = quarantine
+        self.summary = summary
+
+def _schema_rules(df, schema):
+    """
+    Coerce the schema columns in place and yield (name, severity, mask)
+    """
+    for column, spec in schema.items():
+        if column not in df.columns:
+            if spec.get('optional'):
+                continue
+            raise ValueError(f"Required column {column} is missing")
+
+        if spec['type'] == 'category':
+            df[column] = df[column].astype('string').str.strip()
+            yield f'{column}_missing', 'reject', (df[column].isna() | (df[column] == '')).to_numpy()
+            if 'allowed' in spec:
+                yield (f'{column}_unknown_category', 'reject',
+                       (df[column].notna() & ~df[column].isin(spec['allowed'])).to_numpy())
+            continue
+
+        values = pd.to_numeric(df[column], errors='coerce')
+        df[column] = values
+        yield f'{column}_missing', 'reject', values.isna().to_numpy()
+
+        out_of_range = np.zeros(len(values), dtype=bool)
+        if 'min' in spec:
+            out_of_range |= (values <= spec['min'] if spec.get('exclusive_min') else values < spec['min']).to_numpy()
+        if 'max' in spec:
+            out_of_range |= (values > spec['max']).to_numpy()
+        yield f'{column}_out_of_range', 'reject', out_of_range
+
+def validate_dataframe(df, schema=SCHEMA, rules=RULES, severities=None):
+    """
+    Validate a dataframe. Returns a ValidationResult whose clean frame has
+    stripped categories and numeric columns, and whose quarantine frame holds
+    the rejected rows with a dq_failures column.
+    severities optionally maps rule names to 'reject' or 'warn', overriding
+    the severity declared in rules.
+    """
+    start = time.perf_counter()
+    df = df.copy()
+    overrides = severities or {}
+    names, severities, masks = [], [], []
+    for name, severity, mask in _schema_rules(df, schema):
+        names.append(name)
+        severities.append(severity)
+        masks.append(mask)
+
+    # Cross-column rules only see rows that passed the schema checks, so a
+    # missing or out-of-range value never skews the per-crop statistics
+    schema_rejected = np.zeros(len(df), dtype=bool)
+    for severity, mask in zip(severities, masks):
+        if severity == 'reject':
+            schema_rejected |= mask
+    valid = df[~schema_rejected]
+
+    for rule in rules:
+        if not all(column in df.columns for column in rule['columns']):
+            continue
+        mask = np.zeros(len(df), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mask[~schema_rejected] = np.asarray(rule['check'](valid), dtype=bool)
+        names.append(rule['name'])
+        severities.append(overrides.get(rule['name'], rule['severity']))
+        masks.append(mask)
+
+    if len(masks) > 64:
+        raise ValueError("At most 64 rules fit in the failure bit field")
+    bits = np.uint64(1) << np.arange(len(masks), dtype=np.uint64)
+    flags = np.zeros(len(df), dtype=np.uint64)
+    for bit, mask in zip(bits, masks):
+        flags |= np.where(mask, bit, np.uint64(0))
+
+    reject_bits = np.bitwise_or.reduce(
+        [bit for bit, severity in zip(bits, severities) if severity == 'reject'], initial=np.uint64(0)
+    )
+    rejected = (flags & reject_bits) != 0
+
+    quarantine = df[rejected].copy()
+    # Few distinct failure combinations exist, so name them once per combination
+    combinations = {flag: ';'.join(name for name, bit in zip(names, bits) if flag & bit)
+                    for flag in np.unique(flags[rejected]).tolist()}
+    quarantine['dq_failures'] = [combinations[flag] for flag in flags[rejected].tolist()]
+
+    counts = {name: int(mask.sum()) for name, mask in zip(names, masks)}
+    summary = {
+        'rows_checked': len(df),
+        'rows_clean': int(len(df) - rejected.sum()),
+        'rows_quarantined': int(rejected.sum()),
+        'rows_with_warnings': int(((flags & ~reject_bits) != 0).sum()),
+        'seconds': time.perf_counter() - start,
+        'rules': [{'name': name, 'severity': severity, 'failed_rows': counts[name]}
+                  for name, severity in zip(names, severities)]
+    }
+    return ValidationResult(df[~rejected], quarantine, summary)
+
+def run_quality_stage(df, quarantine_path='data/quarantine.csv',
+                      summary_path='data/data_quality_summary.json', outlier_severity='reject'):
+    """
+    Validate the dataset, write the quarantine file and summary, and return
+    the clean rows. outlier_severity is 'reject' to quarantine yield
+    outliers or 'warn' to keep them and only count them.
+    """
+    if outlier_severity not in ('reject', 'warn'):
+        raise ValueError(f"outlier_severity must be 'reject' or 'warn', got {outlier_severity!r}")
+    print(f"\nValidating {len(df):,} rows...")
+    result = validate_dataframe(df, severities={OUTLIER_RULE: outlier_severity})
+    summary = result.summary
+
+    result.quarantine.to_csv(quarantine_path, index=False)
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Clean rows: {summary['rows_clean']:,}, quarantined: {summary['rows_quarantined']:,}, "
+          f"with warnings: {summary['rows_with_warnings']:,} ({summary['seconds']:.2f}s)")
+    for rule in summary['rules']:
+        if rule['failed_rows']:
+            print(f"  {rule['severity']:<6} {rule['name']}: {rule['failed_rows']:,} rows")
+    print(f"Quarantined rows saved to {quarantine_path}, summary to {summary_path}")
+    return result.clean
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Validate a crop yield CSV')
+    parser.add_argument('--data', default='crop_yeild.csv', help='Path to the crop yield CSV')
+    parser.add_argument('--quarantine', default='data/quarantine.csv')
+    parser.add_argument('--summary', default='data/data_quality_summary.json')
+    parser.add_argument('--outlier-severity', choices=['reject', 'warn'], default='reject',
+                        help='Quarantine yield outliers or only count them')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.quarantine) or '.', exist_ok=True)
+    run_quality_stage(pd.read_csv(args.data), args.quarantine, args.summary, args.outlier_severity)
@@ -0,0 +1,403 @@
+"""
+Similar-case retrieval for disease photos
+Indexes the 2048-d penultimate (pooled) ResNet features of past uploads
+so agronomists can look up the most similar confirmed cases, and catches
+re-uploads of the same photo before they reach the model.
+
+Features are L2-normalized and stored either as float16 (4 KB per case) or
+product-quantized (PQ): the vector is cut into subspaces, and each subspace
+is stored as the uint8 id of its nearest k-means centroid (64 bytes per case
+with 64 subspaces). Queries are scored in batches: one matrix product for
+float16, or one lookup table per query and subspace for PQ.
+
+Each case also keeps a 64-bit difference hash (dHash) of its pixels. An
+upload whose hash is within a few bits of a stored case is answered from
+that case without running the model.
+"""
+
+import json
+import time
+import numpy as np
+import torch
+from PIL import Image
+from scipy.sparse import csr_matrix
+from sklearn.cluster import MiniBatchKMeans
+
+COMPRESSIONS = ('float16', 'pq')
+PQ_SUBSPACES = 64
+PQ_CENTROIDS = 256
+# Differing dHash bits still treated as the same photo. Re-encoding flips a
+# few bits, while distinct photos differ in about half of the 64
+DUPLICATE_MAX_DISTANCE = 4
+
+def difference_hashes(images):
+    """
+    64-bit dHash of each (H, W, 3) uint8 image: the sign of the horizontal
+    gradients of a 9x8 grayscale thumbnail
+    """
+    thumbnails = np.stack([
+        np.asarray(Image.fromarray(np.asarray(image)).convert('L').resize((9, 8), Image.BILINEAR), dtype=np.int16)
+        for image in images
+    ])
+    bits = (thumbnails[:, :, 1:] > thumbnails[:, :, :-1]).reshape(len(thumbnails), 64)
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+def group_near_duplicates(hashes, max_distance=DUPLICATE_MAX_DISTANCE):
+    """
+    Index of the first earlier hash within max_distance bits of each hash,
+    or its own index, so near-identical uploads in one batch share a
+    representative
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    distances = np.bitwise_count(np.bitwise_xor(hashes[:, None], hashes[None, :]))
+    # Only earlier items can be representatives, and only those that are themselves one
+    representatives = np.arange(len(hashes))
+    for i in range(1, len(hashes)):
+        candidates = np.flatnonzero(distances[i, :i] <= max_distance)
+        candidates = candidates[representatives[candidates] == candidates]
+        if len(candidates):
+            representatives[i] = candidates[0]
+    return representatives
+
+def embed_and_classify(model, batch):
+    """
+    Pooled penultimate features and logits from one forward pass of a ResNet
+    (2048-d for ResNet50) or MobileNet disease model
+    """
+    with torch.no_grad():
+        if hasattr(model, 'fc'):
+            x = model.conv1(batch)
+            x = model.maxpool(model.relu(model.bn1(x)))
+            x = model.layer4(model.layer3(model.layer2(model.layer1(x))))
+            features = torch.flatten(model.avgpool(x), 1)
+            logits = model.fc(features)
+        else:
+            features = torch.flatten(model.avgpool(model.features(batch)), 1)
+            logits = model.classifier(features)
+    return features, logits
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class DiseaseCaseIndex:
+    """
+    Compressed embedding index of past disease cases with their dHashes
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.compression = str(arrays['compression'])
+        self.cases = json.loads(str(arrays['cases']))
+
+    @classmethod
+    def build(cls, embeddings, hashes, cases, compression='float16', n_subspaces=PQ_SUBSPACES, seed=42):
+        """
+        Build the index. cases is a list of dicts (one per embedding), e.g.
+        {'case_id': ..., 'disease': ..., 'confidence': ..., 'confirmed': ...}.
+        For PQ, the codebooks are trained on these embeddings.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'. Available: {list(COMPRESSIONS)}")
+        embeddings = _normalize(embeddings)
+        arrays = {
+            'compression': np.array(compression),
+            'dim': np.array(embeddings.shape[1]),
+            'hashes': np.asarray(hashes, dtype=np.uint64),
+            'cases': np.array(json.dumps(list(cases)))
+        }
+        if compression == 'pq':
+            arrays['codebooks'] = cls._train_pq(embeddings, n_subspaces, seed)
+        index = cls(arrays)
+        index.arrays['vectors'] = index._encode(embeddings)
+        return index
+
+    @staticmethod
+    def _train_pq(embeddings, n_subspaces, seed=42):
+        """
+        One k-means codebook per subspace: (n_subspaces, centroids, dim / n_subspaces)
+        """
+        n, dim = embeddings.shape
+        if dim % n_subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible into {n_subspaces} subspaces")
+        n_centroids = min(PQ_CENTROIDS, n)
+        subvectors = embeddings.reshape(n, n_subspaces, dim // n_subspaces)
+        return np.stack([
+            MiniBatchKMeans(n_clusters=n_centroids, random_state=seed, n_init=3,
+                            batch_size=4096).fit(subvectors[:, j]).cluster_centers_
+            for j in range(n_subspaces)
+        ]).astype(np.float32)
+
+    def _encode(self, embeddings):
+        if self.compression == 'float16':
+            return embeddings.astype(np.float16)
+
+        codebooks = self.arrays['codebooks']
+        n_subspaces, _, sub_dim = codebooks.shape
+        subvectors = embeddings.reshape(len(embeddings), n_subspaces, sub_dim)
+        codes = np.empty((len(embeddings), n_subspaces), dtype=np.uint8)
+        for j in range(n_subspaces):
+            # Nearest centroid by squared distance, without the constant |x|^2 term
+            distances = (codebooks[j] ** 2).sum(axis=1) - 2 * subvectors[:, j] @ codebooks[j].T
+            codes[:, j] = distances.argmin(axis=1)
+        return codes
+
+    def reconstruct(self, rows):
+        """
+        Approximate stored embeddings of the given rows as float32
+        """
+        vectors = self.arrays['vectors'][rows]
+        if self.compression == 'float16':
+            return vectors.astype(np.float32)
+        codebooks = self.arrays['codebooks']
+        return codebooks[np.arange(codebooks.shape[0]), vectors].reshape(len(rows), -1)
+
+    def add(self, embeddings, hashes, cases):
+        """
+        Append cases (PQ codebooks are kept as trained)
+        """
+        self.arrays['vectors'] = np.concatenate([self.arrays['vectors'], self._encode(_normalize(embeddings))])
+        self.arrays['hashes'] = np.concatenate([self.arrays['hashes'], np.asarray(hashes, dtype=np.uint64)])
+        self.cases.extend(cases)
+
+    def save(self, path='disease_case_index.npz'):
+        self.arrays['cases'] = np.array(json.dumps(self.cases))
+        np.savez(path, **self.arrays)
+        print(f"Disease case index ({len(self)} cases, {self.compression}) saved to {path}")
+
+    @classmethod
+    def load(cls, path='disease_case_index.npz'):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def __len__(self):
+        return len(self.cases)
+
+    def memory_bytes(self):
+        return self.arrays['vectors'].nbytes + self.arrays.get('codebooks', np.empty(0)).nbytes
+
+    def search(self, queries, k=5, block_size=16384):
+        """
+        Cosine top-k for a batch of query embeddings.
+        Returns (indices, scores), both of shape (n_queries, k), best first.
+        """
+        queries = _normalize(queries)
+        vectors = self.arrays['vectors']
+        k = min(k, len(vectors))
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+        if self.compression == 'pq':
+            codebooks = self.arrays['codebooks']
+            n_subspaces, n_centroids, sub_dim = codebooks.shape
+            # tables[q, j * n_centroids + c]: query q's subvector j dotted with centroid c
+            tables = np.einsum('qjd,jcd->qjc', queries.reshape(len(queries), n_subspaces, sub_dim),
+                               codebooks).reshape(len(queries), -1)
+            offsets = np.arange(n_subspaces, dtype=np.int32) * n_centroids
+
+        best_indices = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(vectors), block_size):
+            block = vectors[start:start + block_size]
+            if self.compression == 'float16':
+                scores = queries @ block.astype(np.float32).T
+            else:
+                # Summing one table entry per subspace is a product with the
+                # one-hot code matrix, which sparse BLAS does far faster than
+                # fancy indexing
+                one_hot = csr_matrix(
+                    (np.ones(block.size, dtype=np.float32), (block.astype(np.int32) + offsets).ravel(),
+                     np.arange(0, block.size + 1, n_subspaces)),
+                    shape=(len(block), tables.shape[1])
+                )
+                scores = np.asarray(one_hot @ tables.T).T
+
+            # Merge this block's candidates with the running top-k
+            candidates = np.concatenate([best_scores, scores], axis=1)
+            candidate_indices = np.concatenate(
+                [best_indices, np.broadcast_to(np.arange(start, start + len(block)), scores.shape)], axis=1
+            )
+            top = np.argpartition(-candidates, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(candidates, top, axis=1)
+            best_indices = np.take_along_axis(candidate_indices, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def find_duplicates(self, hashes, max_distance=DUPLICATE_MAX_DISTANCE):
+        """
+        Row of the closest stored case whose dHash is within max_distance
+        bits of each query hash, or -1
+        """
+        stored = self.arrays['hashes']
+        if len(stored) == 0:
+            return np.full(len(hashes), -1)
+        distances = np.bitwise_count(np.bitwise_xor(np.asarray(hashes, dtype=np.uint64)[:, None], stored[None, :]))
+        nearest = distances.argmin(axis=1)
+        return np.where(distances[np.arange(len(hashes)), nearest] <= max_distance, nearest, -1)
+
+class DiseaseCaseService:
+    """
+    Disease inference with duplicate short-circuiting and similar-case lookup
+    """
+    def __init__(self, model, class_names, index, preprocessor, max_distance=DUPLICATE_MAX_DISTANCE):
+        self.model = model.eval()
+        self.class_names = class_names
+        self.index = index
+        self.preprocessor = preprocessor
+        self.max_distance = max_distance
+
+    def _similar(self, queries, k, exclude=None):
+        rows, scores = self.index.search(queries, k + (exclude is not None))
+        results = []
+        for i in range(len(rows)):
+            matches = [{**self.index.cases[row], 'similarity': float(score)}
+                       for row, score in zip(rows[i].tolist(), scores[i].tolist())
+                       if exclude is None or row != exclude[i]]
+            results.append(matches[:k])
+        return results
+
+    def process(self, sources, k=5, add_to_index=True):
+        """
+        Predict and retrieve similar cases for a batch of uploads (paths,
+        file objects or bytes). Uploads matching a stored case by dHash reuse
+        its prediction and skip the model, and near-identical uploads within
+        the batch share one forward pass and one new case.
+        """
+        from disease_inference import decode_image
+
+        pixels = list(self.preprocessor.pool.map(lambda source: decode_image(source, self.preprocessor.size), sources))
+        hashes = difference_hashes(pixels)
+        duplicates = self.index.find_duplicates(hashes, self.max_distance)
+        results = [None] * len(sources)
+
+        hits = np.flatnonzero(duplicates >= 0)
+        if len(hits):
+            rows = duplicates[hits]
+            similar = self._similar(self.index.reconstruct(rows), k, exclude=rows)
+            for i, row, cases in zip(hits.tolist(), rows.tolist(), similar):
+                stored = self.index.cases[row]
+                results[i] = {'disease': stored['disease'], 'confidence': stored['confidence'],
+                              'duplicate_of': stored['case_id'], 'similar_cases': cases}
+
+        misses = np.flatnonzero(duplicates < 0)
+        if len(misses):
+            # Identical or near-identical uploads within the batch run through
+            # the model once and are indexed once
+            representatives = misses[group_near_duplicates(hashes[misses], self.max_distance)]
+            unique = np.unique(representatives)
+            device = next(self.model.parameters()).device
+            batch = torch.from_numpy(np.stack([pixels[i] for i in unique])).permute(0, 3, 1, 2).float()
+            batch.mul_(self.preprocessor.scale).add_(self.preprocessor.offset)
+            features, logits = embed_and_classify(self.model, batch.to(device))
+            temperature = getattr(self.model, 'temperature', 1.0)
+            confidences, predictions = torch.softmax(logits / temperature, dim=1).max(dim=1)
+            features = features.cpu().numpy()
+            confidences, predictions = confidences.cpu().tolist(), predictions.cpu().tolist()
+            similar = self._similar(features, k)
+
+            new_cases = []
+            position = {}
+            for j, i in enumerate(unique.tolist()):
+                case = {'case_id': f'case_{len(self.index) + j}',
+                        'disease': self.class_names[predictions[j]],
+                        'confidence': confidences[j] * 100,
+                        'confirmed': False}
+                position[i] = j
+                new_cases.append(case)
+            for i, representative in zip(misses.tolist(), representatives.tolist()):
+                j = position[representative]
+                results[i] = {'disease': new_cases[j]['disease'], 'confidence': new_cases[j]['confidence'],
+                              'duplicate_of': None if i == representative or not add_to_index
+                              else new_cases[j]['case_id'],
+                              'similar_cases': similar[j]}
+            if add_to_index:
+                self.index.add(features, hashes[unique], new_cases)
+
+        return results
+
+def recall_at_k(index, queries, true_rows, k=10):
+    """
+    Share of queries whose true nearest case (true_rows) is in the index's top-k
+    """
+    found, _ = index.search(queries, k)
+    return float((found == np.asarray(true_rows)[:, None]).any(axis=1).mean())
+
+if __name__ == "__main__":
+    import argparse
+    import io
+    from disease_inference import FastPreprocessor, load_disease_model
+    from train_disease_model import DISEASE_CLASSES, create_resnet_model, create_sample_data
+
+    parser = argparse.ArgumentParser(description='Build the disease case index and benchmark search and dedup')
+    parser.add_argument('--samples-per-class', type=int, default=8)
+    parser.add_argument('--compression', choices=COMPRESSIONS, default='float16')
+    parser.add_argument('--scale', type=int, default=20000,
+                        help='Synthetic cases for the search benchmark (jittered copies of real embeddings)')
+    parser.add_argument('--queries', type=int, default=64)
+    parser.add_argument('--output', default='disease_case_index.npz')
+    args = parser.parse_args()
+
+    print("Disease Case Index")
+    print("=" * 50)
+
+    try:
+        model, metadata = load_disease_model('teacher')
+        class_names = metadata['classes']
+    except FileNotFoundError:
+        print("No trained teacher found; using random weights")
+        class_names = DISEASE_CLASSES
+        model = create_resnet_model(len(class_names), pretrained=False).eval()
+
+    images, labels, _ = create_sample_data(args.samples_per_class)
+    uploads = []
+    for image in images:
+        buffer = io.BytesIO()
+        Image.fromarray(np.asarray(image)).save(buffer, format='JPEG', quality=90)
+        uploads.append(buffer.getvalue())
+
+    preprocessor = FastPreprocessor(224, max_batch=32)
+    index = DiseaseCaseIndex.build(np.empty((0, 2048), dtype=np.float32), [], [], 'float16')
+    service = DiseaseCaseService(model, class_names, index, preprocessor)
+
+    start = time.perf_counter()
+    for begin in range(0, len(uploads), 32):
+        service.process(uploads[begin:begin + 32])
+    first_pass = (time.perf_counter() - start) / len(uploads) * 1000
+
+    # Re-uploads of the same photos, re-encoded at a different quality
+    reuploads = []
+    for upload in uploads[:32]:
+        buffer = io.BytesIO()
+        Image.open(io.BytesIO(upload)).save(buffer, format='JPEG', quality=75)
+        reuploads.append(buffer.getvalue())
+    start = time.perf_counter()
+    repeat_results = service.process(reuploads, add_to_index=False)
+    repeat_pass = (time.perf_counter() - start) / len(reuploads) * 1000
+    caught = sum(result['duplicate_of'] is not None for result in repeat_results)
+    print(f"New uploads: {first_pass:.1f} ms/image through the model")
+    print(f"Re-uploads:  {repeat_pass:.1f} ms/image, {caught}/{len(reuploads)} caught by dHash")
+
+    embeddings = index.reconstruct(np.arange(len(index)))
+    final = DiseaseCaseIndex.build(embeddings, index.arrays['hashes'], index.cases, args.compression)
+    final.save(args.output)
+
+    # Search benchmark on a larger synthetic case base around the real embeddings
+    rng = np.random.default_rng(42)
+    base = embeddings[rng.integers(0, len(embeddings), args.scale)]
+    base = _normalize(base + rng.normal(0, 0.02, base.shape).astype(np.float32))
+    # Queries are perturbed copies of stored cases; the truth is the exact float32 nearest case
+    queries = base[rng.choice(args.scale, args.queries, replace=False)]
+    queries = queries + rng.normal(0, 0.005, queries.shape).astype(np.float32)
+    true_rows = np.argmax(_normalize(queries) @ base.T, axis=1)
+    print(f"\nSearch over {args.scale:,} cases, batch of {args.queries} queries, top-10:")
+    print(f"{'Index':<10} {'Bytes/case':>11} {'Memory (MB)':>12} {'Search (ms)':>12} {'1-Recall@10':>12}")
+    print(f"{'float32':<10} {base.shape[1] * 4:>11,} {base.nbytes / 1024**2:>12.1f} {'-':>12} {'1.00':>12}")
+    for compression in COMPRESSIONS:
+        bench = DiseaseCaseIndex.build(base, np.zeros(len(base), dtype=np.uint64), [{}] * len(base), compression)
+        start = time.perf_counter()
+        bench.search(queries, 10)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{compression:<10} {bench.arrays['vectors'][0].nbytes:>11,} {bench.memory_bytes() / 1024**2:>12.1f} "
+              f"{elapsed:>12.1f} {recall_at_k(bench, queries, true_rows):>12.2f}")
+    preprocessor.close()
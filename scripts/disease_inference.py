@@ -0,0 +1,480 @@
+"""
+Disease Prediction Inference for AgriBot
+This script runs the ResNet disease model with optional test-time augmentation
+(TTA) and temperature-scaled confidences
+
+Uploaded photos go through a fast preprocessing path: JPEGs are decoded in
+draft mode at the smallest DCT scale that still covers the model input, the
+resized uint8 pixels are normalized in place into a preallocated batch
+tensor, and decoding runs in a thread pool so the next batch is prepared
+while the model runs on the current one.
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+import torch
+import torch.nn.functional as F
+import torchvision.transforms as transforms
+from torch.utils.data import DataLoader
+from train_disease_model import (
+    ArrayImageDataset,
+    create_resnet_model,
+    create_sample_data,
+    split_indices
+)
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+SERVING_CONFIG = 'config/disease_serving.json'
+# Model variants serving can route to, selected by the 'model' entry of SERVING_CONFIG
+DISEASE_MODELS = {
+    'teacher': {'weights': 'plant_disease_resnet.pth', 'metadata': 'disease_model_metadata.json'},
+    'student': {'weights': 'plant_disease_student.pth', 'metadata': 'disease_student_metadata.json'}
+}
+
+# Number of augmented views each TTA mode expands an image into
+TTA_MODES = {
+    'none': 1,
+    'flip': 2,
+    'five_crop': 5,
+    'ten_crop': 10
+}
+
+def tta_input_size(mode, crop_size=224, resize_size=256):
+    """
+    Side length images are resized to before they are expanded into views.
+    The corner crops need a margin, so five_crop/ten_crop resize slightly
+    above the crop size; 'none' and 'flip' see the whole image resized to
+    crop_size, exactly like the Resize(224) used in training.
+    """
+    if mode not in TTA_MODES:
+        raise ValueError(f"Unknown TTA mode '{mode}'. Available: {list(TTA_MODES)}")
+    return resize_size if mode in ('five_crop', 'ten_crop') else crop_size
+
+def create_tta_transform(mode='flip', crop_size=224, resize_size=256):
+    """
+    Create the inference transform for a TTA mode.
+    Images are resized once; all views are then cut from the resulting
+    tensor batch.
+    """
+    size = tta_input_size(mode, crop_size, resize_size)
+    return transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    ])
+
+def expand_tta_views(batch, mode='flip', crop_size=224):
+    """
+    Expand a (B, C, H, W) batch into (B, V, C, crop_size, crop_size) views
+    using tensor slicing and flips only
+    """
+    if mode not in TTA_MODES:
+        raise ValueError(f"Unknown TTA mode '{mode}'. Available: {list(TTA_MODES)}")
+
+    height, width = batch.shape[-2:]
+    top = (height - crop_size) // 2
+    left = (width - crop_size) // 2
+    center = batch[..., top:top + crop_size, left:left + crop_size]
+
+    if mode == 'none':
+        views = [center]
+    elif mode == 'flip':
+        views = [center, torch.flip(center, dims=[-1])]
+    else:
+        bottom = height - crop_size
+        right = width - crop_size
+        views = [
+            center,
+            batch[..., :crop_size, :crop_size],
+            batch[..., :crop_size, right:],
+            batch[..., bottom:, :crop_size],
+            batch[..., bottom:, right:]
+        ]
+        if mode == 'ten_crop':
+            views += [torch.flip(view, dims=[-1]) for view in views]
+
+    return torch.stack(views, dim=1)
+
+def predict_logits(model, batch, mode='flip', crop_size=224, temperature=1.0):
+    """
+    Run the model once on all TTA views of a batch and average the logits
+    """
+    views = expand_tta_views(batch, mode, crop_size)
+    batch_size, num_views = views.shape[:2]
+
+    with torch.no_grad():
+        logits = model(views.flatten(0, 1))
+
+    return logits.view(batch_size, num_views, -1).mean(dim=1) / temperature
+
+def predict_disease(model, batch, class_names, mode='flip', temperature=None):
+    """
+    Predict diseases for a batch of preprocessed images. Without an explicit
+    temperature, the model's calibrated temperature set by
+    load_disease_model is used (1.0 for a model loaded any other way).
+    """
+    if temperature is None:
+        temperature = getattr(model, 'temperature', 1.0)
+    probabilities = F.softmax(predict_logits(model, batch, mode, temperature=temperature), dim=1)
+    confidences, predictions = probabilities.max(dim=1)
+
+    return [
+        {'disease': class_names[int(index)], 'confidence': float(confidence) * 100}
+        for index, confidence in zip(predictions, confidences)
+    ]
+
+def collect_logits(model, loader, mode='flip', device='cpu'):
+    """
+    Collect TTA-averaged logits and labels over a data loader
+    """
+    model = model.to(device).eval()
+    all_logits = []
+    all_labels = []
+
+    for inputs, labels in loader:
+        all_logits.append(predict_logits(model, inputs.to(device), mode).cpu())
+        all_labels.append(labels)
+
+    return torch.cat(all_logits), torch.cat(all_labels)
+
+def calibrate_temperature(model, loader, mode='none', device='cpu'):
+    """
+    Temperature that calibrates the model's confidences on a held-out
+    loader of (image, label), for serving with the given TTA mode
+    """
+    return fit_temperature(*collect_logits(model, loader, mode, device))
+
+def fit_temperature(logits, labels, max_iter=50):
+    """
+    Fit a temperature that minimises the validation negative log-likelihood
+    """
+    log_temperature = torch.zeros(1, requires_grad=True)
+    optimizer = torch.optim.LBFGS([log_temperature], lr=0.1, max_iter=max_iter)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = F.cross_entropy(logits / log_temperature.exp(), labels)
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)
+    return float(log_temperature.detach().exp())
+
+def expected_calibration_error(probabilities, labels, n_bins=15):
+    """
+    Expected calibration error of the top-1 confidence
+    """
+    confidences, predictions = probabilities.max(dim=1)
+    correct = (predictions == labels).float()
+    bins = torch.clamp((confidences * n_bins).long(), max=n_bins - 1)
+
+    confidence_sums = torch.bincount(bins, weights=confidences, minlength=n_bins)
+    correct_sums = torch.bincount(bins, weights=correct, minlength=n_bins)
+
+    return float((confidence_sums - correct_sums).abs().sum() / len(labels))
+
+def benchmark_tta(model, calibration_loaders, eval_loaders, modes=None, device='cpu'):
+    """
+    Benchmark speed, accuracy and calibration for each TTA mode.
+    The loaders are dicts of mode -> loader, since the input size depends
+    on the mode (see tta_input_size). The temperature is fitted on the
+    calibration loader and evaluated on the held-out eval loader.
+    """
+    modes = modes or list(eval_loaders)
+    results = []
+
+    for mode in modes:
+        calibration_logits, calibration_labels = collect_logits(model, calibration_loaders[mode], mode, device)
+        temperature = fit_temperature(calibration_logits, calibration_labels)
+
+        start = time.perf_counter()
+        logits, labels = collect_logits(model, eval_loaders[mode], mode, device)
+        elapsed = time.perf_counter() - start
+
+        raw_probabilities = F.softmax(logits, dim=1)
+        calibrated_probabilities = F.softmax(logits / temperature, dim=1)
+        accuracy = float((raw_probabilities.argmax(dim=1) == labels).float().mean())
+
+        results.append({
+            'mode': mode,
+            'views': TTA_MODES[mode],
+            'ms_per_image': elapsed / len(labels) * 1000,
+            'accuracy': accuracy,
+            'temperature': temperature,
+            'ece_uncalibrated': expected_calibration_error(raw_probabilities, labels),
+            'ece_calibrated': expected_calibration_error(calibrated_probabilities, labels)
+        })
+        print(f"{mode:>10}: {results[-1]['ms_per_image']:.1f} ms/image, "
+              f"accuracy {accuracy:.4f}, T={temperature:.3f}")
+
+    return results
+
+def load_disease_model(variant=None, config_path=SERVING_CONFIG, model_dir='.'):
+    """
+    Load the disease model to serve: the ResNet50 teacher or the distilled
+    student. The variant comes from the argument, else from the 'model'
+    entry of the serving config, else defaults to the teacher.
+    Returns the model in eval mode and its metadata (classes, temperature...).
+    The calibrated temperature from the metadata is also set as
+    model.temperature, which predict_disease and predict_images use by default.
+    """
+    if variant is None:
+        variant = 'teacher'
+        if config_path and os.path.exists(config_path):
+            with open(config_path) as f:
+                variant = json.load(f).get('model', variant)
+    if variant not in DISEASE_MODELS:
+        raise ValueError(f"Unknown disease model '{variant}'. Available: {list(DISEASE_MODELS)}")
+
+    files = DISEASE_MODELS[variant]
+    with open(os.path.join(model_dir, files['metadata'])) as f:
+        metadata = json.load(f)
+
+    if variant == 'student':
+        from distill_disease_model import create_student_model
+        model = create_student_model(metadata['num_classes'], metadata['model_type'])
+    else:
+        model = create_resnet_model(metadata['num_classes'], pretrained=False)
+    model.load_state_dict(torch.load(os.path.join(model_dir, files['weights']), map_location='cpu'))
+    metadata['variant'] = variant
+    if 'temperature' not in metadata:
+        print(f"Warning: {files['metadata']} has no calibrated temperature; serving raw confidences")
+    model.temperature = float(metadata.get('temperature', 1.0))
+    return model.eval(), metadata
+
+def decode_image(source, size=224):
+    """
+    Decode an image file, path or bytes straight to a (size, size, 3) uint8
+    array. For JPEGs, draft mode lets the decoder skip the DCT detail the
+    resize would throw away, so a 12-megapixel photo is decoded at 1/8 scale.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    with Image.open(source) as image:
+        # Draft mode only reduces by powers of two and never below the request
+        image.draft('RGB', (size, size))
+        image = image.convert('RGB')
+        if image.size != (size, size):
+            image = image.resize((size, size), Image.BILINEAR)
+        return np.array(image)
+
+class FastPreprocessor:
+    """
+    Threaded image preprocessing into reusable, preallocated batch tensors.
+    Each worker decodes one image and writes its normalized pixels into its
+    own slot of the batch, so no intermediate float images are allocated.
+    """
+    def __init__(self, size=224, max_batch=32, workers=None):
+        self.size = size
+        self.max_batch = max_batch
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        # Two buffers: one being filled while the model reads the other
+        self.buffers = [torch.empty((max_batch, 3, size, size)) for _ in range(2)]
+        self.scale = (1.0 / (255.0 * torch.tensor(IMAGENET_STD))).view(3, 1, 1)
+        self.offset = (-torch.tensor(IMAGENET_MEAN) / torch.tensor(IMAGENET_STD)).view(3, 1, 1)
+
+    def _fill(self, buffer, index, source):
+        pixels = torch.from_numpy(decode_image(source, self.size)).permute(2, 0, 1)
+        slot = buffer[index]
+        slot.copy_(pixels)
+        slot.mul_(self.scale).add_(self.offset)
+
+    def _submit(self, sources, buffer):
+        if len(sources) > self.max_batch:
+            raise ValueError(f"Batch of {len(sources)} images exceeds max_batch={self.max_batch}")
+        return [self.pool.submit(self._fill, buffer, i, source) for i, source in enumerate(sources)]
+
+    def preprocess(self, sources):
+        """
+        Preprocess one batch. The returned tensor is a view of an internal
+        buffer that the next call overwrites; clone it to keep it.
+        """
+        buffer = self.buffers[0]
+        for future in self._submit(sources, buffer):
+            future.result()
+        return buffer[:len(sources)]
+
+    def stream(self, sources, batch_size=None):
+        """
+        Yield preprocessed batches, decoding the next batch in the background
+        while the caller works on the current one. Each batch is only valid
+        until the generator is advanced.
+        """
+        batch_size = min(batch_size or self.max_batch, self.max_batch)
+        batches = [sources[start:start + batch_size] for start in range(0, len(sources), batch_size)]
+        pending = self._submit(batches[0], self.buffers[0]) if batches else []
+
+        for number, batch in enumerate(batches):
+            buffer = self.buffers[number % 2]
+            for future in pending:
+                future.result()
+            if number + 1 < len(batches):
+                pending = self._submit(batches[number + 1], self.buffers[(number + 1) % 2])
+            yield buffer[:len(batch)]
+
+    def close(self):
+        self.pool.shutdown()
+
+def predict_images(model, preprocessor, sources, class_names, mode='none', temperature=None, batch_size=None):
+    """
+    Predict diseases for image files, paths or bytes with the fast
+    preprocessing path, overlapping decoding with the model.
+    The preprocessor size must match the mode: FastPreprocessor(224) for
+    'none'/'flip', FastPreprocessor(256) for the crop modes.
+    """
+    size = tta_input_size(mode)
+    if preprocessor.size != size:
+        raise ValueError(f"TTA mode '{mode}' needs images preprocessed at {size}px, "
+                         f"got a {preprocessor.size}px preprocessor")
+
+    device = next(model.parameters()).device
+    results = []
+    for batch in preprocessor.stream(sources, batch_size):
+        results.extend(predict_disease(model, batch.to(device), class_names, mode, temperature))
+    return results
+
+def write_sample_photos(directory, count=8, size=(4000, 3000), seed=42):
+    """
+    Write synthetic phone-sized JPEGs (12 megapixels by default) for benchmarking
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    width, height = size
+    # Smooth gradients plus noise compress like photos rather than pure noise
+    y, x = np.mgrid[0:height, 0:width]
+    paths = []
+    for i in range(count):
+        base = np.stack([(x * (i + 1)) % 256, (y * 2) % 256, ((x + y) // (i + 2)) % 256], axis=-1)
+        pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f'photo_{i}.jpg')
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def benchmark_preprocessing(model, paths, batch_size=8, workers=None):
+    """
+    Per-image preprocessing time and end-to-end throughput of the baseline
+    val_transform against the fast path, plus the largest pixel difference
+    """
+    from train_disease_model import create_data_transforms
+
+    _, val_transform = create_data_transforms()
+
+    def baseline_batch(batch_paths):
+        return torch.stack([val_transform(Image.open(path).convert('RGB')) for path in batch_paths])
+
+    batches = [paths[start:start + batch_size] for start in range(0, len(paths), batch_size)]
+    preprocessor = FastPreprocessor(224, batch_size, workers)
+    results = {}
+
+    start = time.perf_counter()
+    reference = torch.cat([baseline_batch(batch) for batch in batches])
+    results['baseline_preprocess_ms'] = (time.perf_counter() - start) / len(paths) * 1000
+
+    start = time.perf_counter()
+    fast = torch.cat([preprocessor.preprocess(batch).clone() for batch in batches])
+    results['fast_preprocess_ms'] = (time.perf_counter() - start) / len(paths) * 1000
+    results['max_abs_diff'] = float((fast - reference).abs().max())
+    results['mean_abs_diff'] = float((fast - reference).abs().mean())
+
+    with torch.no_grad():
+        start = time.perf_counter()
+        model(reference[:batch_size])
+        results['forward_ms'] = (time.perf_counter() - start) / min(batch_size, len(paths)) * 1000
+
+        start = time.perf_counter()
+        for batch in batches:
+            model(baseline_batch(batch))
+        results['baseline_end_to_end_ms'] = (time.perf_counter() - start) / len(paths) * 1000
+
+        start = time.perf_counter()
+        for batch in preprocessor.stream(paths, batch_size):
+            model(batch)
+        results['fast_end_to_end_ms'] = (time.perf_counter() - start) / len(paths) * 1000
+
+    preprocessor.close()
+    return results
+
+if __name__ == "__main__":
+    import tempfile
+    from train_disease_model import DISEASE_CLASSES
+
+    parser = argparse.ArgumentParser(description='Benchmark TTA settings and preprocessing for disease inference')
+    parser.add_argument('--samples-per-class', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--modes', nargs='+', choices=list(TTA_MODES), default=list(TTA_MODES))
+    parser.add_argument('--weights', default='plant_disease_resnet.pth',
+                        help='Trained model weights (random weights if missing)')
+    parser.add_argument('--output', default='disease_tta_benchmark.json')
+    parser.add_argument('--preprocess-benchmark', action='store_true',
+                        help='Benchmark the fast preprocessing path on 12-megapixel JPEGs instead')
+    parser.add_argument('--photos', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None, help='Decode threads (default: up to 4)')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    if args.preprocess_benchmark:
+        print("Disease Inference Preprocessing Benchmark")
+        print("=" * 50)
+
+        model = create_resnet_model(len(DISEASE_CLASSES), pretrained=False)
+        if os.path.exists(args.weights):
+            model.load_state_dict(torch.load(args.weights, map_location='cpu'))
+        model.eval()
+
+        with tempfile.TemporaryDirectory() as scratch:
+            paths = write_sample_photos(scratch, args.photos)
+            results = benchmark_preprocessing(model, paths, args.batch_size, args.workers)
+
+        print(f"Preprocessing:  baseline {results['baseline_preprocess_ms']:.1f} ms/image, "
+              f"fast {results['fast_preprocess_ms']:.1f} ms/image "
+              f"({results['baseline_preprocess_ms'] / results['fast_preprocess_ms']:.1f}x)")
+        print(f"Model forward:  {results['forward_ms']:.1f} ms/image")
+        print(f"End to end:     baseline {results['baseline_end_to_end_ms']:.1f} ms/image, "
+              f"fast {results['fast_end_to_end_ms']:.1f} ms/image")
+        print(f"Input difference: mean {results['mean_abs_diff']:.4f}, max {results['max_abs_diff']:.4f} "
+              f"(normalized units)")
+        output = 'disease_preprocess_benchmark.json'
+    else:
+        print("Disease Inference TTA Benchmark")
+        print("=" * 50)
+
+        images, labels, class_names = create_sample_data(args.samples_per_class)
+        _, val_indices = split_indices(labels, test_size=0.5)
+        calibration_indices, eval_indices = np.array_split(val_indices, 2)
+
+        calibration_loaders = {}
+        eval_loaders = {}
+        for mode in args.modes:
+            tta_transform = create_tta_transform(mode)
+            calibration_loaders[mode] = DataLoader(
+                ArrayImageDataset(images, labels, calibration_indices, tta_transform),
+                batch_size=args.batch_size
+            )
+            eval_loaders[mode] = DataLoader(
+                ArrayImageDataset(images, labels, eval_indices, tta_transform),
+                batch_size=args.batch_size
+            )
+
+        model = create_resnet_model(len(class_names), pretrained=False)
+        if os.path.exists(args.weights):
+            model.load_state_dict(torch.load(args.weights, map_location='cpu'))
+        model.eval()
+
+        results = benchmark_tta(model, calibration_loaders, eval_loaders, args.modes, device)
+        output = args.output
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\nBenchmark saved to {output}")
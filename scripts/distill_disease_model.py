@@ -0,0 +1,378 @@
+"""
+Knowledge distillation of the disease classifier for low-end CPU nodes
+Trains a small student network (MobileNetV3 or ResNet18) to match the
+ResNet50 teacher from train_disease_model.py. The teacher runs once over
+the training images and its logits are cached on disk, so each student
+epoch costs only the student's own forward and backward passes.
+
+The teacher logits are computed on the un-augmented images, while the
+student sees the usual training augmentations of the same images. The
+report compares accuracy, size and CPU latency of both models. Serving
+picks one of them through config/disease_serving.json (see
+disease_inference.load_disease_model).
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+import torchvision.models as models
+from torch.utils.data import DataLoader, Dataset
+from model_registry import file_sha256, register_model
+
+STUDENT_ARCHITECTURES = ('mobilenet_v3_small', 'mobilenet_v3_large', 'resnet18')
+
+def create_student_model(num_classes, arch='mobilenet_v3_small', pretrained=False):
+    """
+    Create a small student network with a new classification layer
+    """
+    if arch not in STUDENT_ARCHITECTURES:
+        raise ValueError(f"Unknown student architecture '{arch}'. Available: {list(STUDENT_ARCHITECTURES)}")
+
+    weights = 'DEFAULT' if pretrained else None
+    model = getattr(models, arch)(weights=weights)
+
+    if arch == 'resnet18':
+        model.fc = nn.Linear(model.fc.in_features, num_classes)
+    else:
+        model.classifier[-1] = nn.Linear(model.classifier[-1].in_features, num_classes)
+
+    return model
+
+class TeacherLogitDataset(Dataset):
+    """
+    Wraps an image dataset (PlantDiseaseDataset or ArrayImageDataset) and
+    returns the cached teacher logits with every image
+    """
+    def __init__(self, dataset, logits):
+        if len(dataset) != len(logits):
+            raise ValueError(f"{len(logits)} cached logits for {len(dataset)} images")
+        self.dataset = dataset
+        self.logits = torch.as_tensor(np.asarray(logits, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        image, label = self.dataset[idx]
+        return image, label, self.logits[idx]
+
+def dataset_sample_hash(dataset):
+    """
+    SHA-256 identifying which samples a dataset holds, in order: the file
+    paths of a folder dataset, or the selected indices and labels of an
+    ArrayImageDataset together with its memory-mapped file, if any
+    """
+    digest = hashlib.sha256()
+    if hasattr(dataset, 'samples'):
+        for path, label in dataset.samples:
+            digest.update(f'{os.path.abspath(path)}\t{label}\n'.encode())
+        return digest.hexdigest()
+
+    indices = np.asarray(getattr(dataset, 'indices', np.arange(len(dataset))), dtype=np.int64)
+    digest.update(indices.tobytes())
+    if getattr(dataset, 'labels', None) is not None:
+        digest.update(np.asarray(dataset.labels)[indices].astype(np.int64).tobytes())
+    source = getattr(getattr(dataset, 'images', None), 'filename', None)
+    if source:
+        digest.update(os.path.abspath(str(source)).encode())
+    return digest.hexdigest()
+
+def cache_teacher_logits(teacher, dataset, cache_path='disease_teacher_logits.npz',
+                         teacher_weights=None, batch_size=32, device='cpu'):
+    """
+    Teacher logits for every image of a dataset, computed once and stored in
+    cache_path. The cache is reused only if it was built from the same
+    teacher weights file over the same samples (see dataset_sample_hash).
+    """
+    teacher_hash = file_sha256(teacher_weights) if teacher_weights and os.path.exists(teacher_weights) else ''
+    sample_hash = dataset_sample_hash(dataset)
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if (str(cached['teacher_hash']) == teacher_hash and 'sample_hash' in cached
+                    and str(cached['sample_hash']) == sample_hash and len(cached['logits']) == len(dataset)):
+                print(f"Using cached teacher logits from {cache_path}")
+                return cached['logits']
+
+    print(f"Computing teacher logits for {len(dataset)} images...")
+    teacher = teacher.to(device).eval()
+    logits = []
+    with torch.no_grad():
+        for inputs, _ in DataLoader(dataset, batch_size=batch_size):
+            logits.append(teacher(inputs.to(device)).cpu().numpy())
+    logits = np.concatenate(logits).astype(np.float32)
+
+    np.savez(cache_path, logits=logits, teacher_hash=np.array(teacher_hash), sample_hash=np.array(sample_hash))
+    print(f"Teacher logits cached to {cache_path}")
+    return logits
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature=4.0, alpha=0.7):
+    """
+    Weighted sum of the KL divergence to the softened teacher distribution
+    (scaled by temperature^2 to keep its gradients comparable) and the
+    cross-entropy with the true labels
+    """
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction='batchmean'
+    ) * temperature ** 2
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+def evaluate_accuracy(model, loader, device='cpu'):
+    """
+    Top-1 accuracy and predictions of a model over a loader of (image, label)
+    """
+    model = model.to(device).eval()
+    predictions = []
+    labels = []
+    with torch.no_grad():
+        for inputs, batch_labels in loader:
+            predictions.append(model(inputs.to(device)).argmax(1).cpu())
+            labels.append(batch_labels)
+    predictions = torch.cat(predictions)
+    return float((predictions == torch.cat(labels)).float().mean()), predictions
+
+def train_student(student, train_loader, val_loader, num_epochs=20, device='cpu', lr=1e-3,
+                  temperature=4.0, alpha=0.7, patience=5, metrics_path='disease_distillation_metrics.jsonl'):
+    """
+    Train the student on a loader of (image, label, teacher_logits) with the
+    distillation loss. Keeps the weights with the best validation accuracy
+    and stops after patience epochs without improvement; with no epochs the
+    initial weights are returned with their validation accuracy.
+    """
+    student = student.to(device)
+    optimizer = optim.AdamW(student.parameters(), lr=lr, weight_decay=1e-4)
+    scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(num_epochs, 1))
+
+    best_accuracy = -1.0
+    best_state = {name: value.detach().clone() for name, value in student.state_dict().items()}
+    epochs_without_improvement = 0
+    start = time.perf_counter()
+
+    with open(metrics_path, 'w') as metrics_file:
+        for epoch in range(num_epochs):
+            student.train()
+            running_loss = 0.0
+            count = 0
+
+            for inputs, labels, teacher_logits in train_loader:
+                inputs = inputs.to(device)
+                labels = labels.to(device)
+                teacher_logits = teacher_logits.to(device)
+
+                optimizer.zero_grad()
+                loss = distillation_loss(student(inputs), teacher_logits, labels, temperature, alpha)
+                loss.backward()
+                optimizer.step()
+
+                running_loss += loss.item() * inputs.size(0)
+                count += inputs.size(0)
+
+            scheduler.step()
+            val_accuracy, _ = evaluate_accuracy(student, val_loader, device)
+            epoch_loss = running_loss / max(count, 1)
+            print(f"Epoch {epoch + 1}/{num_epochs}: distillation loss {epoch_loss:.4f}, "
+                  f"val accuracy {val_accuracy:.4f}")
+            metrics_file.write(json.dumps({
+                'epoch': epoch + 1,
+                'elapsed_s': round(time.perf_counter() - start, 3),
+                'train_loss': epoch_loss,
+                'val_acc': val_accuracy
+            }) + '\n')
+            metrics_file.flush()
+
+            if val_accuracy > best_accuracy:
+                best_accuracy = val_accuracy
+                best_state = {name: value.detach().clone() for name, value in student.state_dict().items()}
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= patience:
+                    print(f"Early stopping: no validation improvement for {patience} epochs")
+                    break
+
+    student.load_state_dict(best_state)
+    if best_accuracy < 0:
+        best_accuracy, _ = evaluate_accuracy(student, val_loader, device)
+    return student, best_accuracy
+
+def measure_model(model, input_size=224, batch_sizes=(1, 8), repeats=10, warmup=2):
+    """
+    Parameter count, serialized size and CPU latency per image of a model
+    """
+    model = model.cpu().eval()
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    result = {
+        'parameters': sum(parameter.numel() for parameter in model.parameters()),
+        'size_mb': buffer.tell() / 1024**2
+    }
+
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            inputs = torch.randn(batch_size, 3, input_size, input_size)
+            for _ in range(warmup):
+                model(inputs)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                model(inputs)
+            result[f'latency_ms_batch{batch_size}'] = (time.perf_counter() - start) / repeats / batch_size * 1000
+
+    return result
+
+def distillation_report(teacher, student, eval_loader, student_arch, repeats=10):
+    """
+    Accuracy, size and CPU latency of the teacher and the student on the same
+    held-out images, plus how often the student agrees with the teacher
+    """
+    teacher_accuracy, teacher_predictions = evaluate_accuracy(teacher, eval_loader)
+    student_accuracy, student_predictions = evaluate_accuracy(student, eval_loader)
+
+    report = {
+        'teacher': dict(architecture='resnet50', accuracy=teacher_accuracy,
+                        **measure_model(teacher, repeats=repeats)),
+        'student': dict(architecture=student_arch, accuracy=student_accuracy,
+                        **measure_model(student, repeats=repeats)),
+        'agreement': float((teacher_predictions == student_predictions).float().mean()),
+        'eval_images': len(teacher_predictions)
+    }
+    report['speedup_batch1'] = report['teacher']['latency_ms_batch1'] / report['student']['latency_ms_batch1']
+    report['size_ratio'] = report['teacher']['size_mb'] / report['student']['size_mb']
+    return report
+
+def save_student_model(student, class_names, arch, accuracy, report=None, calibration_loader=None):
+    """
+    Save the distilled student next to the teacher files and register it,
+    with a confidence temperature fitted on calibration_loader if given
+    """
+    torch.save(student.state_dict(), 'plant_disease_student.pth')
+
+    with open('disease_classes.json', 'w') as f:
+        json.dump(class_names, f, indent=2)
+
+    metadata = {
+        'model_type': arch,
+        'distilled_from': 'ResNet50',
+        'accuracy': float(accuracy),
+        'num_classes': len(class_names),
+        'input_size': [224, 224],
+        'classes': class_names
+    }
+    if calibration_loader is not None:
+        from disease_inference import calibrate_temperature
+        metadata['temperature'] = calibrate_temperature(student, calibration_loader)
+        print(f"Calibrated confidence temperature: {metadata['temperature']:.3f}")
+    with open('disease_student_metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    if report is not None:
+        with open('disease_distillation_report.json', 'w') as f:
+            json.dump(report, f, indent=2)
+
+    register_model('plant_disease_student', {
+        'model.pth': 'plant_disease_student.pth',
+        'classes.json': 'disease_classes.json'
+    }, metadata)
+
+    print(f"\nStudent model saved successfully!")
+    print(f"Files created:")
+    print("- plant_disease_student.pth")
+    print("- disease_student_metadata.json")
+    if report is not None:
+        print("- disease_distillation_report.json")
+
+if __name__ == "__main__":
+    import argparse
+    from train_disease_model import (
+        ArrayImageDataset,
+        create_data_transforms,
+        create_resnet_model,
+        create_sample_data,
+        save_disease_model,
+        split_indices,
+        train_model
+    )
+
+    parser = argparse.ArgumentParser(description='Distill the ResNet50 disease model into a small student')
+    parser.add_argument('--student', choices=STUDENT_ARCHITECTURES, default='mobilenet_v3_small')
+    parser.add_argument('--samples-per-class', type=int, default=20)
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--teacher-epochs', type=int, default=5,
+                        help='Epochs to train the teacher when no teacher weights exist')
+    parser.add_argument('--teacher-weights', default='plant_disease_resnet.pth')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--eval-every', type=int, default=4,
+                        help='Teacher steps between validation checks that drive early stopping '
+                             '(0 checks once per epoch)')
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.7)
+    parser.add_argument('--pretrained', action='store_true', help='Start from ImageNet weights (needs a download)')
+    parser.add_argument('--repeats', type=int, default=10, help='Timed forward passes per latency measurement')
+    args = parser.parse_args()
+
+    print("Plant Disease Model Distillation")
+    print("=" * 50)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    images, labels, class_names = create_sample_data(args.samples_per_class)
+    train_indices, val_indices = split_indices(labels)
+    # Half of the held-out images pick the best student epoch, the other half is reported
+    selection_indices, eval_indices = np.array_split(val_indices, 2)
+    train_transform, val_transform = create_data_transforms()
+
+    selection_loader = DataLoader(ArrayImageDataset(images, labels, selection_indices, val_transform),
+                                  batch_size=args.batch_size)
+    eval_loader = DataLoader(ArrayImageDataset(images, labels, eval_indices, val_transform),
+                             batch_size=args.batch_size)
+
+    teacher = create_resnet_model(len(class_names), pretrained=args.pretrained)
+    if os.path.exists(args.teacher_weights):
+        print(f"\nLoading teacher weights from {args.teacher_weights}")
+        teacher.load_state_dict(torch.load(args.teacher_weights, map_location='cpu'))
+    else:
+        print(f"\nTraining the ResNet50 teacher for up to {args.teacher_epochs} epochs...")
+        teacher_train_loader = DataLoader(ArrayImageDataset(images, labels, train_indices, train_transform),
+                                          batch_size=args.batch_size, shuffle=True)
+        teacher, *_ = train_model(teacher, teacher_train_loader, selection_loader,
+                                  num_epochs=args.teacher_epochs, device=device,
+                                  eval_every=args.eval_every or None)
+        teacher_accuracy, _ = evaluate_accuracy(teacher, selection_loader, device)
+        save_disease_model(teacher.cpu(), class_names, teacher_accuracy, calibration_loader=selection_loader)
+        args.teacher_weights = 'plant_disease_resnet.pth'
+
+    teacher_logits = cache_teacher_logits(
+        teacher, ArrayImageDataset(images, labels, train_indices, val_transform),
+        teacher_weights=args.teacher_weights, batch_size=args.batch_size, device=device
+    )
+    train_loader = DataLoader(
+        TeacherLogitDataset(ArrayImageDataset(images, labels, train_indices, train_transform), teacher_logits),
+        batch_size=args.batch_size, shuffle=True
+    )
+
+    print(f"\nDistilling into {args.student}...")
+    student = create_student_model(len(class_names), args.student, args.pretrained)
+    student, student_accuracy = train_student(student, train_loader, selection_loader, args.epochs, device,
+                                              temperature=args.temperature, alpha=args.alpha)
+
+    print("\nMeasuring both models on the held-out images...")
+    report = distillation_report(teacher.cpu(), student.cpu(), eval_loader, args.student, args.repeats)
+    save_student_model(student, class_names, args.student, report['student']['accuracy'], report,
+                       calibration_loader=selection_loader)
+
+    print(f"\n{'Model':<22} {'Accuracy':>9} {'Params':>12} {'Size (MB)':>10} "
+          f"{'ms/img b=1':>11} {'ms/img b=8':>11}")
+    for role in ('teacher', 'student'):
+        m = report[role]
+        print(f"{role + ' (' + m['architecture'] + ')':<22} {m['accuracy']:>9.4f} {m['parameters']:>12,} "
+              f"{m['size_mb']:>10.1f} {m['latency_ms_batch1']:>11.1f} {m['latency_ms_batch8']:>11.1f}")
+    print(f"\nStudent agrees with the teacher on {report['agreement']:.1%} of {report['eval_images']} images; "
+          f"{report['speedup_batch1']:.1f}x faster at batch 1, {report['size_ratio']:.1f}x smaller")
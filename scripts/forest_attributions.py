@@ -0,0 +1,180 @@
+"""
+Per-prediction feature attributions for the AgriBot random forests
+Decomposes every forest prediction into a bias plus one contribution per
+feature by following each sample's decision path through the flattened tree
+arrays: whenever a split moves the sample to a child node, the change in
+node value is credited to the split feature. The contributions sum exactly to
+the prediction, and all trees and samples advance together, so explaining a
+batch costs about the same as predicting it.
+
+Contributions are also split by split direction, which gives the wording of
+the reason codes: a feature whose contribution came mostly from going below
+its split thresholds is reported as "low", otherwise as "high".
+"""
+
+import numpy as np
+from forest_arrays import flat_children, flatten_forest, predict_flat_forest, split_left
+
+FEATURE_LABELS = {
+    'N': 'N',
+    'P': 'P',
+    'K': 'K',
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'ph': 'pH',
+    'rainfall': 'rainfall',
+    'Annual_Rainfall': 'annual rainfall',
+    'Fertilizer': 'fertilizer use',
+    'Pesticide': 'pesticide use',
+    'Area': 'area'
+}
+
+def forest_attributions(flat, X, target=None, batch_size=1024, max_trees=None):
+    """
+    Path attributions for every sample.
+    For classifiers, target gives the class column to explain per sample
+    (default: the predicted class). max_trees explains with the first trees
+    only, bounding the cost on large forests.
+    Returns bias (n_samples,), contributions and below_threshold, both of
+    shape (n_samples, n_features); bias + contributions.sum(1) equals the
+    prediction of the trees used.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n_samples, n_features = X.shape
+    roots = flat['roots'][:max_trees]
+    n_trees = len(roots)
+    children = flat_children(flat)
+
+    value = flat['value']
+    n_classes = value.shape[1] if flat['is_classifier'] else 1
+    if flat['is_classifier'] and target is None:
+        target = predict_flat_forest(flat, X, batch_size).argmax(axis=1)
+    value = np.ascontiguousarray(value).ravel()
+
+    bias = np.empty(n_samples)
+    contributions = np.empty((n_samples, n_features))
+    below_threshold = np.empty((n_samples, n_features))
+
+    for start in range(0, n_samples, batch_size):
+        X_batch = X[start:start + batch_size]
+        batch = len(X_batch)
+        row_offsets = (np.arange(batch, dtype=np.int32) * n_features)[:, None]
+        class_offsets = 0 if target is None else np.asarray(target[start:start + batch])[:, None]
+        X_values = X_batch.ravel()
+        nodes = np.repeat(roots[None, :], batch, axis=0)
+        node_value = value.take(nodes * n_classes + class_offsets)
+        bias[start:start + batch] = node_value.mean(axis=1)
+
+        total = np.zeros(batch * n_features)
+        below = np.zeros(batch * n_features)
+        for _ in range(flat['max_depth']):
+            split_feature = flat['feature'].take(nodes)
+            go_left = split_left(flat, X_values.take(row_offsets + split_feature), nodes)
+            nodes = children.take(2 * nodes + go_left)
+            child_value = value.take(nodes * n_classes + class_offsets)
+
+            # Leaves point to themselves, so finished paths add zero
+            delta = child_value - node_value
+            slots = row_offsets + split_feature
+            total += np.bincount(slots.ravel(), weights=delta.ravel(), minlength=batch * n_features)
+            below += np.bincount(slots[go_left], weights=delta[go_left], minlength=batch * n_features)
+            node_value = child_value
+
+        contributions[start:start + batch] = total.reshape(batch, n_features) / n_trees
+        below_threshold[start:start + batch] = below.reshape(batch, n_features) / n_trees
+
+    return {'bias': bias, 'contributions': contributions, 'below_threshold': below_threshold}
+
+def reason_codes(attributions, feature_names, top_n=3, min_share=0.1):
+    """
+    Human-readable reasons for each sample from its largest contributions,
+    e.g. "low K drove the score down". Contributions smaller than min_share
+    of the sample's total absolute contribution are left out.
+    """
+    contributions = attributions['contributions']
+    below = attributions['below_threshold']
+    magnitude = np.abs(contributions)
+    order = np.argsort(-magnitude, axis=1, kind='stable')[:, :top_n]
+    totals = magnitude.sum(axis=1)
+
+    reasons = []
+    for row in range(len(contributions)):
+        row_reasons = []
+        for feature in order[row]:
+            contribution = contributions[row, feature]
+            if totals[row] == 0 or abs(contribution) < min_share * totals[row]:
+                break
+            # Direction of the splits that produced most of this contribution
+            low = abs(below[row, feature]) >= abs(contribution - below[row, feature])
+            level = 'low' if low else 'high'
+            label = FEATURE_LABELS.get(feature_names[feature], feature_names[feature])
+            row_reasons.append({
+                'feature': feature_names[feature],
+                'level': level,
+                'contribution': float(contribution),
+                'reason': f"{level} {label} drove the score {'up' if contribution > 0 else 'down'}"
+            })
+        reasons.append(row_reasons)
+    return reasons
+
+class ForestExplainer:
+    """
+    Attributions and reason codes for one fitted forest
+    """
+    def __init__(self, model, feature_names, max_trees=None):
+        self.flat = flatten_forest(model)
+        self.feature_names = list(feature_names)
+        self.max_trees = max_trees
+
+    def explain(self, X, target=None, top_n=3):
+        attributions = forest_attributions(self.flat, X, target, max_trees=self.max_trees)
+        return attributions, reason_codes(attributions, self.feature_names, top_n)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Explain crop recommendations and benchmark attribution cost')
+    parser.add_argument('--model', default='data/crop_recommendation_model.pkl')
+    parser.add_argument('--encoder', default='data/crop_label_encoder.pkl')
+    parser.add_argument('--data', default='data/crop_recommendation.csv')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    label_encoder = joblib.load(args.encoder)
+    features = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+    X = pd.read_csv(args.data)[features].to_numpy(dtype=np.float32)
+    explainer = ForestExplainer(model, features)
+
+    attributions, reasons = explainer.explain(X[:3])
+    predicted = predict_flat_forest(explainer.flat, X[:3])
+    for row in range(3):
+        target = predicted[row].argmax()
+        crop = label_encoder.inverse_transform(model.classes_[[target]])[0]
+        total = attributions['bias'][row] + attributions['contributions'][row].sum()
+        print(f"\n{crop}: probability {predicted[row, target]:.3f} "
+              f"(bias {attributions['bias'][row]:.3f} + contributions = {total:.3f})")
+        for reason in reasons[row]:
+            print(f"  - {reason['reason']} ({reason['contribution']:+.3f})")
+
+    print(f"\n{'Batch':>7} {'Predict (ms)':>13} {'Explain (ms)':>13} {'Ratio':>6}")
+    rng = np.random.default_rng(42)
+    for batch_size in (1, 100, 2000):
+        batch = X[rng.integers(0, len(X), batch_size)]
+        timings = []
+        for run in (lambda: predict_flat_forest(explainer.flat, batch),
+                    lambda: forest_attributions(explainer.flat, batch)):
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                run()
+            timings.append((time.perf_counter() - start) / args.repeats * 1000)
+        print(f"{batch_size:>7} {timings[0]:>13.2f} {timings[1]:>13.2f} {timings[1] / timings[0]:>6.2f}")
+
+    full = forest_attributions(explainer.flat, X[:500])
+    target = predict_flat_forest(explainer.flat, X[:500]).argmax(axis=1)
+    probabilities = predict_flat_forest(explainer.flat, X[:500])[np.arange(500), target]
+    error = np.abs(full['bias'] + full['contributions'].sum(axis=1) - probabilities).max()
+    print(f"\nMax additivity error over 500 samples: {error:.2e}")
@@ -0,0 +1,176 @@
+"""
+Lightweight instrumentation for the AgriBot training and inference scripts
+Provides timed spans around pipeline stages, peak RSS tracking, optional
+profiling and a JSON run record saved next to the model metadata
+
+Profiling is toggled with the AGRIBOT_PROFILE environment variable:
+- AGRIBOT_PROFILE=cprofile  writes one .prof file per outermost span (open with snakeviz/pstats);
+                            nested spans are timed but profiled as part of their parent
+- AGRIBOT_PROFILE=py-spy    attaches the py-spy sampler to this process for the whole run
+Profiles go to AGRIBOT_PROFILE_DIR (default: profiles/).
+"""
+
+import cProfile
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_ENV = 'AGRIBOT_PROFILE'
+PROFILE_DIR_ENV = 'AGRIBOT_PROFILE_DIR'
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak / 1024**2
+    return peak / 1024
+
+def current_rss_mb():
+    """
+    Current resident set size in MB, or None where /proc is unavailable
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024**2
+
+class RunRecorder:
+    """
+    Collects timed spans and metrics for one script run
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now().isoformat()
+        self.start_time = time.perf_counter()
+        self.spans = []
+        self.metrics = {}
+        self.profile_mode = os.environ.get(PROFILE_ENV, '').lower()
+        self.profile_dir = os.environ.get(PROFILE_DIR_ENV, 'profiles')
+        self.sampler = None
+        self.profiling = False
+
+        if self.profile_mode == 'py-spy':
+            self._start_sampler()
+
+    def _start_sampler(self):
+        py_spy = shutil.which('py-spy')
+        if py_spy is None:
+            print(f"{PROFILE_ENV}=py-spy set but py-spy is not installed; sampling disabled")
+            return
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        output = os.path.join(self.profile_dir, f'{self.name}_{os.getpid()}.speedscope.json')
+        self.sampler = subprocess.Popen(
+            [py_spy, 'record', '--pid', str(os.getpid()), '--format', 'speedscope',
+             '--output', output],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """
+        Time a pipeline stage such as load, encode, fit, predict or save
+        """
+        # Only one cProfile profiler can be active, so spans nested inside a
+        # profiled span are covered by the outer profile
+        profiler = None
+        if self.profile_mode == 'cprofile' and not self.profiling:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            self.profiling = True
+
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            rss_after = current_rss_mb()
+            record = {
+                'stage': stage,
+                'duration_s': duration,
+                'peak_rss_mb': peak_rss_mb(),
+                'rss_delta_mb': rss_after - rss_before if rss_before is not None else None
+            }
+            record.update(attributes)
+            self.spans.append(record)
+
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(
+                    self.profile_dir, f'{self.name}_{len(self.spans):02d}_{stage}.prof'
+                ))
+
+    def record_metric(self, key, value):
+        self.metrics[key] = value
+
+    def summary(self):
+        stage_totals = {}
+        for record in self.spans:
+            stage_totals[record['stage']] = stage_totals.get(record['stage'], 0.0) + record['duration_s']
+
+        return {
+            'run': self.name,
+            'started_at': self.started_at,
+            'finished_at': datetime.now().isoformat(),
+            'total_duration_s': time.perf_counter() - self.start_time,
+            'peak_rss_mb': peak_rss_mb(),
+            'stage_totals_s': stage_totals,
+            'spans': self.spans,
+            'metrics': self.metrics,
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'argv': sys.argv,
+                'profile_mode': self.profile_mode or None
+            }
+        }
+
+    def save(self, path):
+        """
+        Write the run record as JSON, typically next to the model metadata
+        """
+        if self.sampler is not None:
+            self.sampler.terminate()
+            self.sampler.wait()
+            self.sampler = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+
+        print(f"Run record saved to {path}")
+
+_recorder = None
+
+def get_recorder(name=None):
+    """
+    Return the process-wide recorder, creating it on first use
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = RunRecorder(name or os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'run')
+    return _recorder
+
+def span(stage, **attributes):
+    """
+    Time a stage on the process-wide recorder
+    """
+    return get_recorder().span(stage, **attributes)
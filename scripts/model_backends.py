@@ -0,0 +1,190 @@
+"""
+Pluggable model backends for AgriBot
+This module wraps the model choices used by the crop and yield scripts behind
+one interface so they can be trained and compared on the same data
+"""
+
+import pickle
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+import numpy as np
+from sklearn.ensemble import (
+    RandomForestClassifier,
+    RandomForestRegressor,
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor
+)
+from threadpoolctl import ThreadpoolController
+
+_controller = None
+
+def _threadpool_controller():
+    """
+    Process-wide threadpool controller, created on first use once
+    scikit-learn's OpenMP runtime is loaded
+    """
+    global _controller
+    if _controller is None:
+        _controller = ThreadpoolController()
+    return _controller
+
+class ModelBackend(ABC):
+    """
+    Base class for a model backend.
+    Subclasses build the underlying estimator in `create_estimator`.
+    """
+    name = None
+
+    def __init__(self, task='classification', **params):
+        if task not in ('classification', 'regression'):
+            raise ValueError(f"Unknown task: {task}")
+        self.task = task
+        self.params = params
+        self.model = None
+
+    @abstractmethod
+    def create_estimator(self):
+        """
+        Build the unfitted estimator for self.task and self.params
+        """
+
+    def transform(self, X):
+        """
+        Convert features into the representation the estimator is trained on
+        """
+        return np.asarray(X, dtype=np.float32)
+
+    def fit(self, X, y):
+        self.model = self.create_estimator()
+        self.model.fit(self.transform(X), y)
+        return self
+
+    def predict(self, X):
+        return self.model.predict(self.transform(X))
+
+    def predict_proba(self, X):
+        if self.task != 'classification':
+            raise ValueError(f"{self.name} backend is not a classifier")
+        return self.model.predict_proba(self.transform(X))
+
+    def model_size_bytes(self):
+        return len(pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+class RandomForestBackend(ModelBackend):
+    """
+    Random forest with the settings used in process_crop_dataset.py
+    and analyze_crop_yield_data.py
+    """
+    name = 'random_forest'
+
+    def create_estimator(self):
+        if self.task == 'classification':
+            params = {'n_estimators': 100, 'max_depth': 10, 'random_state': 42,
+                      'min_samples_split': 5, 'min_samples_leaf': 2}
+            params.update(self.params)
+            return RandomForestClassifier(**params)
+
+        params = {'n_estimators': 100, 'max_depth': 15, 'random_state': 42,
+                  'min_samples_split': 5, 'min_samples_leaf': 2}
+        params.update(self.params)
+        return RandomForestRegressor(**params)
+
+class XGBoostBackend(ModelBackend):
+    """
+    XGBoost with the settings used in train_crop_model.py
+    """
+    name = 'xgboost'
+
+    def create_estimator(self):
+        import xgboost as xgb
+
+        params = {'n_estimators': 100, 'max_depth': 6, 'learning_rate': 0.1,
+                  'subsample': 0.8, 'colsample_bytree': 0.8, 'random_state': 42}
+        params.update(self.params)
+        if self.task == 'classification':
+            return xgb.XGBClassifier(**params)
+        return xgb.XGBRegressor(**params)
+
+class FeatureBinner:
+    """
+    Quantile binning of continuous features into uint8 codes
+    """
+    def __init__(self, max_bins=255):
+        if not 2 <= max_bins <= 255:
+            raise ValueError("max_bins must be between 2 and 255")
+        self.max_bins = max_bins
+        self.bin_edges_ = None
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        quantiles = np.linspace(0, 1, self.max_bins + 1)[1:-1]
+        self.bin_edges_ = [np.unique(np.quantile(X[:, j], quantiles))
+                           for j in range(X.shape[1])]
+        return self
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        binned = np.empty(X.shape, dtype=np.uint8)
+        for j, edges in enumerate(self.bin_edges_):
+            binned[:, j] = np.searchsorted(edges, X[:, j], side='right')
+        return binned
+
+class HistGradientBoostingBackend(ModelBackend):
+    """
+    Histogram gradient boosting on features pre-binned to uint8.
+    Binning once up front keeps the training matrix at one byte per value,
+    and the estimator uses all cores through OpenMP unless n_threads is set.
+    """
+    name = 'hist_gradient_boosting'
+
+    def __init__(self, task='classification', max_bins=255, n_threads=None, **params):
+        super().__init__(task, **params)
+        self.binner = FeatureBinner(max_bins=max_bins)
+        self.n_threads = n_threads
+
+    def create_estimator(self):
+        params = {'max_iter': 100, 'learning_rate': 0.1, 'max_leaf_nodes': 31,
+                  'max_bins': self.binner.max_bins,
+                  'early_stopping': False, 'random_state': 42}
+        params.update(self.params)
+        if self.task == 'classification':
+            return HistGradientBoostingClassifier(**params)
+        return HistGradientBoostingRegressor(**params)
+
+    def transform(self, X):
+        return self.binner.transform(X)
+
+    def _thread_limit(self):
+        # threadpool_limits inspects every loaded library on each entry, which
+        # costs several milliseconds per call; the shared controller inspects
+        # them once, and without n_threads there is nothing to limit
+        if self.n_threads is None:
+            return nullcontext()
+        return _threadpool_controller().limit(limits=self.n_threads, user_api='openmp')
+
+    def fit(self, X, y):
+        self.binner.fit(X)
+        with self._thread_limit():
+            return super().fit(X, y)
+
+    def predict(self, X):
+        with self._thread_limit():
+            return super().predict(X)
+
+    def predict_proba(self, X):
+        with self._thread_limit():
+            return super().predict_proba(X)
+
+BACKENDS = {
+    RandomForestBackend.name: RandomForestBackend,
+    XGBoostBackend.name: XGBoostBackend,
+    HistGradientBoostingBackend.name: HistGradientBoostingBackend
+}
+
+def create_backend(name, task='classification', **params):
+    """
+    Create a model backend by name
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Available: {sorted(BACKENDS)}")
+    return BACKENDS[name](task=task, **params)
@@ -0,0 +1,308 @@
+"""
+Local model registry for AgriBot
+Every trained model version is stored in a content-addressed directory
+models/<name>/<sha256>/ together with its metadata, and models/<name>/CURRENT
+names the version to serve. The pointer is replaced atomically, so a retrain
+never overwrites files a server is reading.
+
+HotSwapModel is the serving side: it watches CURRENT, loads and warms up a
+new version in a background thread, then swaps it in with one reference
+assignment. Requests already running finish on the version they started with.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+REGISTRY_ROOT = 'models'
+POINTER_NAME = 'CURRENT'
+
+def _atomic_write(path, text):
+    """
+    Write a file through a temporary sibling and os.replace, so readers see
+    either the old or the new contents
+    """
+    directory = os.path.dirname(path) or '.'
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates owner-only files; serving processes may run as another user
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    SHA-256 of a file, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def version_path(name, version, root=REGISTRY_ROOT):
+    return os.path.join(root, name, version)
+
+def current_version(name, root=REGISTRY_ROOT):
+    """
+    Version named by the CURRENT pointer, or None if nothing is registered
+    """
+    try:
+        with open(os.path.join(root, name, POINTER_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def current_artifacts(name, fallback, root=REGISTRY_ROOT):
+    """
+    Paths of the artifacts of the CURRENT version of a model.
+    fallback maps artifact names to the paths used when nothing is
+    registered yet. Returns (version or None, {artifact: path}).
+    """
+    version = current_version(name, root)
+    if version is None:
+        return None, dict(fallback)
+    directory = version_path(name, version, root)
+    return version, {artifact: os.path.join(directory, artifact) for artifact in fallback}
+
+def set_current(name, version, root=REGISTRY_ROOT):
+    """
+    Point CURRENT at an existing version; also used to roll back
+    """
+    if not os.path.isdir(version_path(name, version, root)):
+        raise ValueError(f"Unknown version {version} of model {name}")
+    _atomic_write(os.path.join(root, name, POINTER_NAME), version + '\n')
+
+def list_versions(name, root=REGISTRY_ROOT):
+    """
+    Metadata of every registered version, oldest first
+    """
+    versions = []
+    model_root = os.path.join(root, name)
+    if not os.path.isdir(model_root):
+        return versions
+    for version in os.listdir(model_root):
+        metadata_path = os.path.join(model_root, version, 'metadata.json')
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                versions.append(json.load(f))
+    return sorted(versions, key=lambda metadata: metadata['registered_at'])
+
+def load_metadata(name, version, root=REGISTRY_ROOT):
+    with open(os.path.join(version_path(name, version, root), 'metadata.json')) as f:
+        return json.load(f)
+
+def register_model(name, files, metadata=None, root=REGISTRY_ROOT, make_current=True):
+    """
+    Copy model artifacts into the registry and optionally make them current.
+    files maps the artifact name inside the version directory to the source
+    path. The version is the SHA-256 over the artifact names and contents, so
+    registering identical files twice reuses the existing version.
+    """
+    digests = {artifact: file_sha256(path) for artifact, path in files.items()}
+    version = hashlib.sha256(json.dumps(digests, sort_keys=True).encode()).hexdigest()
+    final_path = version_path(name, version, root)
+
+    if not os.path.isdir(final_path):
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+        staging_path = tempfile.mkdtemp(dir=os.path.join(root, name), prefix='.staging-')
+        try:
+            os.chmod(staging_path, 0o755)
+            for artifact, path in files.items():
+                shutil.copy2(path, os.path.join(staging_path, artifact))
+            record = {
+                'name': name,
+                'version': version,
+                'registered_at': datetime.now().isoformat(),
+                'files': digests,
+                'metadata': metadata or {}
+            }
+            with open(os.path.join(staging_path, 'metadata.json'), 'w') as f:
+                json.dump(record, f, indent=2, default=str)
+            # Directory renames are atomic, so a version is either complete or absent
+            os.rename(staging_path, final_path)
+        except OSError:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            if not os.path.isdir(final_path):
+                raise
+
+    if make_current:
+        set_current(name, version, root)
+    print(f"Registered {name} version {version[:12]}" + (" (current)" if make_current else ""))
+    return version
+
+class HotSwapModel:
+    """
+    Serve the current version of a registered model and swap in new versions
+    without blocking requests.
+    loader(version_directory, metadata) builds the served object; the
+    optional warmup(model) runs on it before it receives traffic.
+    """
+    def __init__(self, name, loader, warmup=None, root=REGISTRY_ROOT, poll_interval=2.0):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.root = root
+        self.poll_interval = poll_interval
+        self.swaps = 0
+        self._active = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._reload_lock = threading.Lock()
+        self.refresh()
+        if self._active is None:
+            raise FileNotFoundError(f"No current version of {name} in {root}")
+
+    def _load(self, version):
+        metadata = load_metadata(self.name, version, self.root)
+        model = self.loader(version_path(self.name, version, self.root), metadata)
+        if self.warmup is not None:
+            self.warmup(model)
+        return model
+
+    def refresh(self):
+        """
+        Load the version named by CURRENT if it differs from the active one.
+        Returns True when a swap happened.
+        """
+        with self._reload_lock:
+            version = current_version(self.name, self.root)
+            if version is None or (self._active is not None and self._active[0] == version):
+                return False
+
+            start = time.perf_counter()
+            model = self._load(version)
+            previous = self._active
+            # A single reference assignment: requests see the old or the new pair
+            self._active = (version, model)
+            self.swaps += 1
+
+            if previous is not None:
+                print(f"Swapped {self.name} {previous[0][:12]} -> {version[:12]} "
+                      f"after {time.perf_counter() - start:.2f}s warm-up")
+            # Drop our reference to the old version now; it is freed as soon as
+            # the last in-flight request using it returns
+            del previous
+            gc.collect()
+            return True
+
+    @property
+    def version(self):
+        return self._active[0]
+
+    @property
+    def model(self):
+        return self._active[1]
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin one version for the duration of a request and yield it as a
+        (version, model) pair, so the caller can record which version served
+        the request; reading .version afterwards may already see a newer one
+        """
+        yield self._active
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the active version if the new one fails to load
+                print(f"Could not load new {self.name} version: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name=f'{self.name}-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+def load_crop_recommender(directory, metadata):
+    """
+    Loader for versions registered by save_model_and_metadata
+    """
+    import joblib
+    return {
+        'model': joblib.load(os.path.join(directory, 'model.pkl')),
+        'label_encoder': joblib.load(os.path.join(directory, 'label_encoder.pkl')),
+        'metadata': metadata
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import numpy as np
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Inspect the model registry or roll back a model')
+    parser.add_argument('name', nargs='?', default='crop_recommendation')
+    parser.add_argument('--root', default=REGISTRY_ROOT)
+    parser.add_argument('--rollback', metavar='VERSION', help='Point CURRENT at an earlier version')
+    parser.add_argument('--demo', action='store_true',
+                        help='Serve the crop model and hot-swap a re-registered copy under load')
+    args = parser.parse_args()
+
+    if args.rollback:
+        set_current(args.name, args.rollback, args.root)
+        print(f"{args.name} now points at {args.rollback}")
+
+    if args.demo:
+        features = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+        sample = pd.DataFrame([[90, 42, 43, 20.8, 82.0, 6.5, 202.9]], columns=features)
+
+        def warmup(served):
+            served['model'].predict_proba(sample)
+
+        server = HotSwapModel(args.name, load_crop_recommender, warmup, args.root, poll_interval=0.2).start()
+        served_versions = set()
+        stop = threading.Event()
+
+        def serve():
+            while not stop.is_set():
+                with server.acquire() as (version, served):
+                    served['model'].predict_proba(sample)
+                served_versions.add(version)
+
+        client = threading.Thread(target=serve)
+        client.start()
+
+        # Register a new version (same model, new metadata file content) while serving
+        directory = version_path(args.name, server.version, args.root)
+        with tempfile.TemporaryDirectory() as scratch:
+            marker = os.path.join(scratch, 'retrain.txt')
+            with open(marker, 'w') as f:
+                f.write(str(np.random.default_rng().integers(1 << 30)))
+            register_model(args.name, {
+                'model.pkl': os.path.join(directory, 'model.pkl'),
+                'label_encoder.pkl': os.path.join(directory, 'label_encoder.pkl'),
+                'retrain.txt': marker
+            }, {'demo': True}, args.root)
+        time.sleep(1.0)
+        stop.set()
+        client.join()
+        server.stop()
+        print(f"Requests were served by {len(served_versions)} versions with {server.swaps - 1} swap(s)")
+
+    print(f"\nVersions of {args.name}:")
+    current = current_version(args.name, args.root)
+    for record in list_versions(args.name, args.root):
+        marker = '*' if record['version'] == current else ' '
+        print(f"{marker} {record['version'][:12]}  {record['registered_at']}")
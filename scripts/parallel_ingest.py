@@ -0,0 +1,242 @@
+"""
+Chunk-parallel CSV ingest for the crop yield / soil dataset
+Splits the file into newline-aligned byte ranges and parses them in worker
+processes. Workers hand their columns back through shared memory blocks
+instead of pickled DataFrames: numeric columns as raw arrays, and text
+columns as int32 codes plus a small per-range category list. The parent
+unifies the categories and assembles one DataFrame with categorical columns.
+
+Column types are taken from the first rows of the file. Columns that are
+numeric there are coerced with pd.to_numeric(errors='coerce') in every
+range, as the analysis pipeline does, so a stray text value further down
+becomes NaN. Ranges are split at newlines, so a file with quoted fields
+spanning lines is detected and read serially instead.
+
+Usage:
+    python scripts/parallel_ingest.py crop_yeild.csv --benchmark --sizes-mb 2,64,512
+"""
+
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+
+SAMPLE_ROWS = 1000
+
+def byte_ranges(path, n_parts):
+    """
+    Split a file (after its header line) into at most n_parts byte ranges
+    that each start at the beginning of a line
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        boundaries = [data_start]
+        step = max(1, (size - data_start) // n_parts)
+        for i in range(1, n_parts):
+            f.seek(max(data_start + i * step, boundaries[-1]))
+            f.readline()  # move to the start of the next full line
+            position = f.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+        boundaries.append(size)
+    return header.decode().rstrip('\r\n'), list(zip(boundaries[:-1], boundaries[1:]))
+
+def _to_shared(values):
+    """
+    Copy an array into a new shared memory block owned by the parent
+    """
+    values = np.ascontiguousarray(values)
+    if values.dtype.hasobject:
+        raise TypeError("Object arrays hold pointers and cannot be shared between processes")
+    block = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+    name = block.name
+    block.close()
+    # The parent unlinks the block after copying it out, so stop this
+    # process's resource tracker from removing it when the worker exits
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return {'shm': name, 'dtype': values.dtype.str, 'length': len(values)}
+
+def _has_multiline_fields(data):
+    """
+    True if a quoted field spans lines: some line then has an odd number of
+    quote characters (escaped quotes come in pairs)
+    """
+    return b'"' in data and any(line.count(b'"') % 2 for line in data.split(b'\n'))
+
+def _parse_range(path, start, end, columns, text_columns):
+    """
+    Worker: parse one byte range and export its columns to shared memory.
+    Returns None for the columns when the range cannot be split on newlines.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if _has_multiline_fields(data):
+        return 0, None
+
+    chunk = pd.read_csv(io.BytesIO(data), header=None, names=columns,
+                        dtype={column: str for column in text_columns})
+    exported = {}
+    for column in columns:
+        if column in text_columns:
+            codes, categories = pd.factorize(chunk[column])
+            exported[column] = dict(_to_shared(codes.astype(np.int32)), categories=list(categories))
+        else:
+            exported[column] = _to_shared(pd.to_numeric(chunk[column], errors='coerce').to_numpy())
+    return len(chunk), exported
+
+def _release(spec):
+    """
+    Unlink a block that was exported but never read
+    """
+    try:
+        block = shared_memory.SharedMemory(name=spec['shm'])
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+def _read_serial(path, text_columns):
+    """
+    Single-process read with the same column types as parallel_read_csv
+    """
+    df = pd.read_csv(path, dtype={column: str for column in text_columns})
+    for column in df.columns:
+        if column in text_columns:
+            df[column] = df[column].astype('category')
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+def _read_shared(spec):
+    block = shared_memory.SharedMemory(name=spec['shm'])
+    try:
+        return np.ndarray(spec['length'], dtype=np.dtype(spec['dtype']), buffer=block.buf).copy()
+    finally:
+        block.close()
+        block.unlink()
+
+def parallel_read_csv(path, workers=None, parts=None):
+    """
+    Read a CSV with a process pool. Text columns come back as pandas
+    categoricals with one category list unified across all byte ranges.
+    """
+    workers = workers or os.cpu_count()
+    parts = parts or workers * 4
+
+    sample = pd.read_csv(path, nrows=SAMPLE_ROWS)
+    columns = list(sample.columns)
+    text_columns = [column for column in columns if not pd.api.types.is_numeric_dtype(sample[column])]
+    _, ranges = byte_ranges(path, parts)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_parse_range, path, start, end, columns, text_columns) for start, end in ranges]
+
+    try:
+        results = [future.result() for future in futures]
+        if any(exported is None for _, exported in results):
+            print("Quoted fields span lines; reading the file serially")
+            return _read_serial(path, text_columns)
+
+        data = {}
+        for column in columns:
+            specs = [exported[column] for _, exported in results]
+            if column in text_columns:
+                # Unify categories in first-seen order and remap each range's codes
+                categories = pd.Index(pd.unique(np.concatenate(
+                    [np.asarray(spec['categories'], dtype=object) for spec in specs] + [np.array([], dtype=object)]
+                )))
+                codes = []
+                for spec in specs:
+                    local = _read_shared(spec)
+                    mapping = np.append(categories.get_indexer(spec['categories']), -1).astype(np.int32)
+                    codes.append(mapping[local])  # -1 (missing) maps through the appended slot
+                data[column] = pd.Categorical.from_codes(np.concatenate(codes), categories=categories)
+            else:
+                # A range whose integers contain gaps parses as float; promote the rest to match
+                dtype = np.result_type(*[np.dtype(spec['dtype']) for spec in specs])
+                data[column] = np.concatenate([_read_shared(spec).astype(dtype, copy=False) for spec in specs])
+        return pd.DataFrame(data, columns=columns)
+    finally:
+        # Workers hand block ownership to this process, so blocks left unread
+        # after a failure (or a serial fallback) must be unlinked here
+        for future in futures:
+            if future.exception() is None and future.result()[1] is not None:
+                for spec in future.result()[1].values():
+                    _release(spec)
+
+def write_scaled_copy(source, path, target_mb):
+    """
+    Repeat the data rows of source until the file reaches about target_mb
+    """
+    with open(source, 'rb') as f:
+        header = f.readline()
+        body = f.read()
+    if not body.endswith(b'\n'):
+        body += b'\n'
+    repeats = max(1, round(target_mb * 1024**2 / len(body)))
+    with open(path, 'wb') as f:
+        f.write(header)
+        for _ in range(repeats):
+            f.write(body)
+    return path
+
+def benchmark(path, workers=None, repeats=1):
+    """
+    Wall time of pandas.read_csv against parallel_read_csv on one file
+    """
+    timings = {}
+    for name, read in (('read_csv', lambda: pd.read_csv(path)),
+                       ('parallel', lambda: parallel_read_csv(path, workers))):
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            df = read()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        rows = len(df)
+    return {'size_mb': os.path.getsize(path) / 1024**2, 'rows': rows, **timings,
+            'speedup': timings['read_csv'] / timings['parallel']}
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='Parallel CSV ingest for the crop yield dataset')
+    parser.add_argument('path', nargs='?', default='crop_yeild.csv')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--benchmark', action='store_true', help='Compare against pandas.read_csv')
+    parser.add_argument('--sizes-mb', default='2,64,512',
+                        help='File sizes for the benchmark, built by repeating the input rows')
+    parser.add_argument('--repeats', type=int, default=1)
+    args = parser.parse_args()
+
+    df = parallel_read_csv(args.path, args.workers)
+    reference = pd.read_csv(args.path)
+    matches = all(
+        np.array_equal(df[column].astype(str).to_numpy(), reference[column].astype(str).to_numpy())
+        for column in reference.columns
+    )
+    print(f"Parsed {len(df):,} rows x {len(df.columns)} columns; identical to read_csv: {matches}")
+    print(f"Memory: {df.memory_usage(deep=True).sum() / 1024**2:.1f} MB parallel (categorical) vs "
+          f"{reference.memory_usage(deep=True).sum() / 1024**2:.1f} MB read_csv")
+
+    if args.benchmark:
+        workers = args.workers or os.cpu_count()
+        print(f"\n{'Size (MB)':>10} {'Rows':>12} {'read_csv (s)':>13} {'parallel (s)':>13} {'Speedup':>8}"
+              f"   ({workers} workers)")
+        with tempfile.TemporaryDirectory() as scratch:
+            for size_mb in [float(size) for size in args.sizes_mb.split(',')]:
+                path = write_scaled_copy(args.path, os.path.join(scratch, f'{size_mb:g}mb.csv'), size_mb)
+                result = benchmark(path, args.workers, args.repeats)
+                print(f"{result['size_mb']:>10.1f} {result['rows']:>12,} {result['read_csv']:>13.2f} "
+                      f"{result['parallel']:>13.2f} {result['speedup']:>7.2f}x")
+                os.remove(path)
@@ -13,6 +13,8 @@ import joblib
 import json
 import matplotlib.pyplot as plt
 import seaborn as sns
+from instrumentation import get_recorder, span
+from model_registry import register_model
 
 def load_and_analyze_dataset():
     """
@@ -127,7 +129,8 @@ def train_crop_model(df):
     
     # Encode labels
     label_encoder = LabelEncoder()
-    y_encoded = label_encoder.fit_transform(y)
+    with span('encode', rows=len(y)):
+        y_encoded = label_encoder.fit_transform(y)
     
     # Split the data
     X_train, X_test, y_train, y_test = train_test_split(
@@ -143,10 +146,12 @@ def train_crop_model(df):
         min_samples_leaf=2
     )
     
-    model.fit(X_train, y_train)
+    with span('fit', rows=len(X_train)):
+        model.fit(X_train, y_train)
     
     # Make predictions
-    y_pred = model.predict(X_test)
+    with span('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
     
     # Calculate accuracy
     accuracy = accuracy_score(y_test, y_pred)
@@ -184,8 +189,9 @@ def save_model_and_metadata(model, label_encoder, accuracy, feature_importance):
     print("\nSaving model and metadata...")
     
     # Save model
-    joblib.dump(model, 'data/crop_recommendation_model.pkl')
-    joblib.dump(label_encoder, 'data/crop_label_encoder.pkl')
+    with span('save'):
+        joblib.dump(model, 'data/crop_recommendation_model.pkl')
+        joblib.dump(label_encoder, 'data/crop_label_encoder.pkl')
     
     # Save model metadata
     metadata = {
@@ -207,6 +213,11 @@ def save_model_and_metadata(model, label_encoder, accuracy, feature_importance):
     with open('data/crop_model_metadata.json', 'w') as f:
         json.dump(metadata, f, indent=2)
     
+    register_model('crop_recommendation', {
+        'model.pkl': 'data/crop_recommendation_model.pkl',
+        'label_encoder.pkl': 'data/crop_label_encoder.pkl'
+    }, metadata)
+    
     print(f"Model saved successfully!")
     print(f"Files created:")
     print("- data/crop_recommendation_model.pkl")
@@ -376,8 +387,11 @@ if __name__ == "__main__":
     import os
     os.makedirs('data', exist_ok=True)
     
+    recorder = get_recorder('crop_model')
+    
     # Load and analyze dataset
-    df = load_and_analyze_dataset()
+    with span('load'):
+        df = load_and_analyze_dataset()
     
     # Create crop profiles
     crop_profiles = create_crop_profiles(df)
@@ -394,6 +408,9 @@ if __name__ == "__main__":
     # Create crop information database
     crop_info = create_crop_info_database()
     
+    recorder.record_metric('accuracy', float(accuracy))
+    recorder.save('data/crop_model_run.json')
+    
     print("\n" + "=" * 50)
     print("Dataset processing completed successfully!")
     print("=" * 50)
@@ -0,0 +1,329 @@
+"""
+Compact binary artifacts for the crop profiles and state-wise recommendations
+Encodes crop_profiles_real.json and state_wise_recommendations.json as
+struct-of-arrays .npz files: numbers in typed columns, every string in one
+shared table referenced by integer codes, and lists as offset-indexed ragged
+arrays. The stores below read them back with the same mapping interface as the
+parsed JSON, but only build the nested dict for a crop or State when it is
+accessed. The arrays of an .npz are still read in full on load; a directory
+of .npy files, as published by shared_model_host.py, is memory-mapped.
+"""
+
+import json
+import os
+import time
+import tracemalloc
+from abc import abstractmethod
+from collections.abc import Mapping
+import numpy as np
+from instrumentation import current_rss_mb
+
+CROP_PROFILES_NPZ = 'data/crop_profiles_real.npz'
+STATE_RECOMMENDATIONS_NPZ = 'data/state_wise_recommendations.npz'
+
+# Nested stats blocks of a crop profile, stored as columns of one float matrix
+PROFILE_STATS = [
+    ('yield_stats', ['mean', 'median', 'std', 'min', 'max']),
+    ('area_stats', ['mean', 'total']),
+    ('production_stats', ['mean', 'total']),
+    ('rainfall_stats', ['mean', 'std', 'min', 'max']),
+    ('fertilizer_stats', ['mean', 'std']),
+    ('pesticide_stats', ['mean', 'std'])
+]
+STATE_TOTALS = ['avg_rainfall', 'total_area', 'total_production']
+
+class StringTable:
+    """
+    Assigns one integer code per distinct string
+    """
+    def __init__(self):
+        self.index = {}
+
+    def codes(self, values):
+        return [self.index.setdefault(value, len(self.index)) for value in values]
+
+    def to_array(self):
+        return np.array(list(self.index), dtype=str)
+
+def _ragged(lists, dtype):
+    """
+    Offsets and concatenated values for a list of variable-length lists
+    """
+    offsets = np.concatenate([[0], np.cumsum([len(values) for values in lists])]).astype(np.int32)
+    flat = [value for values in lists for value in values]
+    return offsets, np.array(flat, dtype=dtype)
+
+def _value_dtype(lists):
+    """
+    int64 when every value is an integer (e.g. summed integer Production),
+    so decoded values keep the type they had in the JSON
+    """
+    integral = all(isinstance(value, (int, np.integer)) for values in lists for value in values)
+    return np.int64 if integral else np.float64
+
+def encode_crop_profiles(crop_profiles):
+    """
+    Struct-of-arrays encoding of the crop profiles dict
+    """
+    strings = StringTable()
+    profiles = list(crop_profiles.values())
+    top_states = [list(profile['top_producing_states'].items()) for profile in profiles]
+
+    states_offsets, states_grown = _ragged(
+        [strings.codes(profile['states_grown']) for profile in profiles], np.int32)
+    seasons_offsets, seasons = _ragged(
+        [strings.codes(profile['seasons']) for profile in profiles], np.int32)
+    top_offsets, top_codes = _ragged(
+        [strings.codes(state for state, _ in items) for items in top_states], np.int32)
+    production = [[value for _, value in items] for items in top_states]
+    _, top_production = _ragged(production, _value_dtype(production))
+
+    return {
+        'names': np.array(strings.codes(crop_profiles), dtype=np.int32),
+        'profile_names': np.array(strings.codes(profile['name'] for profile in profiles), dtype=np.int32),
+        'total_records': np.array([profile['total_records'] for profile in profiles], dtype=np.int64),
+        'year_range': np.array([[profile['year_range']['start'], profile['year_range']['end']]
+                                for profile in profiles], dtype=np.int32).reshape(-1, 2),
+        'stats': np.array([[profile[block][stat] for block, stats in PROFILE_STATS for stat in stats]
+                           for profile in profiles], dtype=np.float64),
+        'states_offsets': states_offsets,
+        'states_grown': states_grown,
+        'seasons_offsets': seasons_offsets,
+        'seasons': seasons,
+        'top_states_offsets': top_offsets,
+        'top_states': top_codes,
+        'top_states_production': top_production,
+        'strings': strings.to_array()
+    }
+
+def encode_state_recommendations(state_recommendations):
+    """
+    Struct-of-arrays encoding of the state-wise recommendations dict
+    """
+    strings = StringTable()
+    records = list(state_recommendations.values())
+    top_crops = [list(record['top_crops'].items()) for record in records]
+    season_entries = [list(record['seasonal_recommendations'].items()) for record in records]
+    season_crops = [list(crops.items()) for entries in season_entries for _, crops in entries]
+
+    top_offsets, top_codes = _ragged([strings.codes(crop for crop, _ in items) for items in top_crops], np.int32)
+    yields = [[value for _, value in items] for items in top_crops]
+    _, top_yield = _ragged(yields, _value_dtype(yields))
+    season_offsets, season_names = _ragged(
+        [strings.codes(season for season, _ in entries) for entries in season_entries], np.int32)
+    season_crop_offsets, season_crop_codes = _ragged(
+        [strings.codes(crop for crop, _ in items) for items in season_crops], np.int32)
+    season_yields = [[value for _, value in items] for items in season_crops]
+    _, season_crop_yield = _ragged(season_yields, _value_dtype(season_yields))
+    grown_offsets, crops_grown = _ragged(
+        [strings.codes(record['crops_grown']) for record in records], np.int32)
+
+    return {
+        'names': np.array(strings.codes(state_recommendations), dtype=np.int32),
+        'totals': np.array([[record[field] for field in STATE_TOTALS] for record in records],
+                           dtype=np.float64).reshape(-1, len(STATE_TOTALS)),
+        'top_crops_offsets': top_offsets,
+        'top_crops': top_codes,
+        'top_crops_yield': top_yield,
+        'season_offsets': season_offsets,
+        'season_names': season_names,
+        'season_crop_offsets': season_crop_offsets,
+        'season_crops': season_crop_codes,
+        'season_crops_yield': season_crop_yield,
+        'crops_grown_offsets': grown_offsets,
+        'crops_grown': crops_grown,
+        'strings': strings.to_array()
+    }
+
+def save_crop_profiles_npz(crop_profiles, path=CROP_PROFILES_NPZ):
+    np.savez(path, **encode_crop_profiles(crop_profiles))
+    print(f"Crop profiles saved to {path}")
+
+def save_state_recommendations_npz(state_recommendations, path=STATE_RECOMMENDATIONS_NPZ):
+    np.savez(path, **encode_state_recommendations(state_recommendations))
+    print(f"State-wise recommendations saved to {path}")
+
+class _ArtifactStore(Mapping):
+    """
+    Read-only mapping over an encoded artifact. Entries are decoded on first
+    access and kept, so repeated lookups cost one dict access. Mapping is
+    an abstract base class, so subclasses must implement _decode.
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.strings = arrays['strings'].tolist()
+        self.index = {self.strings[code]: i for i, code in enumerate(arrays['names'].tolist())}
+        self._decoded = {}
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load from an .npz file or a directory of .npy files. Members of an
+        .npz archive cannot be memory-mapped, so an .npz is read into memory
+        in full (only the dict decoding is lazy); a directory, as published
+        by shared_model_host.py, is memory-mapped with mmap_mode.
+        """
+        if os.path.isdir(path):
+            return cls({filename[:-4]: np.load(os.path.join(path, filename), mmap_mode=mmap_mode)
+                        for filename in os.listdir(path) if filename.endswith('.npy')})
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def _slice(self, name, i):
+        offsets = self.arrays[f'{name}_offsets']
+        return slice(offsets[i], offsets[i + 1])
+
+    def _names(self, codes):
+        return [self.strings[code] for code in codes.tolist()]
+
+    @abstractmethod
+    def _decode(self, i):
+        """
+        Build the nested dict for entry i
+        """
+
+    def __getitem__(self, key):
+        entry = self._decoded.get(key)
+        if entry is None:
+            entry = self._decoded[key] = self._decode(self.index[key])
+        return entry
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+class CropProfileStore(_ArtifactStore):
+    """
+    Lazy reader for crop_profiles_real.npz
+    """
+    @classmethod
+    def load(cls, path=CROP_PROFILES_NPZ, mmap_mode='r'):
+        return super().load(path, mmap_mode)
+
+    def _decode(self, i):
+        a = self.arrays
+        top = self._slice('top_states', i)
+        profile = {
+            'name': self.strings[a['profile_names'][i]],
+            'total_records': int(a['total_records'][i]),
+            'states_grown': self._names(a['states_grown'][self._slice('states', i)]),
+            'seasons': self._names(a['seasons'][self._slice('seasons', i)]),
+            'year_range': {'start': int(a['year_range'][i, 0]), 'end': int(a['year_range'][i, 1])}
+        }
+        stats = iter(a['stats'][i].tolist())
+        for block, names in PROFILE_STATS:
+            profile[block] = {name: next(stats) for name in names}
+        profile['top_producing_states'] = dict(zip(
+            self._names(a['top_states'][top]), a['top_states_production'][top].tolist()
+        ))
+        return profile
+
+class StateRecommendationStore(_ArtifactStore):
+    """
+    Lazy reader for state_wise_recommendations.npz
+    """
+    @classmethod
+    def load(cls, path=STATE_RECOMMENDATIONS_NPZ, mmap_mode='r'):
+        return super().load(path, mmap_mode)
+
+    def _decode(self, i):
+        a = self.arrays
+        top = self._slice('top_crops', i)
+        seasonal = {}
+        for entry in range(a['season_offsets'][i], a['season_offsets'][i + 1]):
+            crops = self._slice('season_crop', entry)
+            seasonal[self.strings[a['season_names'][entry]]] = dict(zip(
+                self._names(a['season_crops'][crops]), a['season_crops_yield'][crops].tolist()
+            ))
+
+        record = {
+            'top_crops': dict(zip(self._names(a['top_crops'][top]), a['top_crops_yield'][top].tolist())),
+            'seasonal_recommendations': seasonal
+        }
+        record.update(zip(STATE_TOTALS, a['totals'][i].tolist()))
+        record['crops_grown'] = self._names(a['crops_grown'][self._slice('crops_grown', i)])
+        return record
+
+def _measure(load):
+    """
+    Wall time, traced allocations and RSS growth of one load call
+    """
+    rss_before = current_rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = current_rss_mb()
+    rss_growth = None if rss_before is None else rss_after - rss_before
+    return result, elapsed, retained / 1024**2, rss_growth
+
+def benchmark_formats(json_path, npz_path, store_class, lookups=10):
+    """
+    Compare load time and memory of the JSON artifact with the npz store,
+    including a few lookups on the store since it decodes lazily
+    """
+    def load_json():
+        with open(json_path) as f:
+            return json.load(f)
+
+    def load_store():
+        store = store_class.load(npz_path)
+        for key in list(store)[:lookups]:
+            store[key]
+        return store
+
+    results = {}
+    for name, load in (('json', load_json), ('npz', load_store)):
+        _, seconds, retained_mb, rss_growth_mb = _measure(load)
+        results[name] = {'seconds': seconds, 'retained_mb': retained_mb, 'rss_growth_mb': rss_growth_mb}
+    return results
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Encode profile JSON artifacts as .npz and benchmark them')
+    parser.add_argument('--profiles', default='data/crop_profiles_real.json')
+    parser.add_argument('--recommendations', default='data/state_wise_recommendations.json')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Replicate every entry this many times to benchmark larger catalogues')
+    args = parser.parse_args()
+
+    artifacts = [
+        (args.profiles, CROP_PROFILES_NPZ, save_crop_profiles_npz, CropProfileStore),
+        (args.recommendations, STATE_RECOMMENDATIONS_NPZ, save_state_recommendations_npz,
+         StateRecommendationStore)
+    ]
+    for json_path, npz_path, save, store_class in artifacts:
+        with open(json_path) as f:
+            original = json.load(f)
+
+        if args.scale > 1:
+            original = {f'{key} #{copy}': value for copy in range(args.scale)
+                        for key, value in original.items()}
+            json_path = json_path.replace('.json', f'_x{args.scale}.json')
+            npz_path = npz_path.replace('.npz', f'_x{args.scale}.npz')
+            with open(json_path, 'w') as f:
+                json.dump(original, f, indent=2, default=str)
+        save(original, npz_path)
+
+        store = store_class.load(npz_path)
+        # Compare serialized forms so NaN statistics count as equal
+        mismatches = [key for key in original
+                      if json.dumps(store[key], default=str) != json.dumps(original[key], default=str)]
+        print(f"Round trip: {len(original) - len(mismatches)}/{len(original)} entries identical")
+
+        results = benchmark_formats(json_path, npz_path, store_class)
+        print(f"{'Format':<6} {'Size (KB)':>10} {'Load (ms)':>10} {'Retained (MB)':>14}")
+        for name, path in (('json', json_path), ('npz', npz_path)):
+            r = results[name]
+            print(f"{name:<6} {os.path.getsize(path) / 1024:>10.1f} {r['seconds'] * 1000:>10.2f} "
+                  f"{r['retained_mb']:>14.2f}")
+        print()
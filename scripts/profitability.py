@@ -0,0 +1,252 @@
+"""
+Crop profitability ranking for AgriBot
+Precomputes CROP_PRICE distributions per Crop x State from crop_yeild.csv and
+combines them with the yield model's per-farm yield distributions to rank
+crops by expected revenue per hectare, with risk bands
+
+Yields are in tonnes per hectare and prices in rupees per quintal, so revenue
+per hectare is yield * 10 * price. Yield and price are treated as independent
+and revenue is approximated by a lognormal with the exact mean and variance
+of their product, which gives the risk-band quantiles in closed form for
+every farm and crop at once.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from forest_arrays import flatten_forest, per_tree_predictions
+
+QUINTALS_PER_TONNE = 10
+PRICE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+RISK_QUANTILES = (0.05, 0.5, 0.95)
+# Coefficient of variation of revenue at which a crop is rated medium / high risk
+RISK_BANDS = (0.25, 0.5)
+ALL_STATES = '*'
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+def build_price_table(df):
+    """
+    Price statistics per Crop x State, plus one crop-wide row per crop
+    (State '*') used when a State has no price records for the crop
+    """
+    prices = df.assign(Crop=df['Crop'].str.strip(), State=df['State'].str.strip())
+    prices = prices.dropna(subset=['CROP_PRICE'])
+    crop_wide = prices.assign(State=ALL_STATES)
+    grouped = pd.concat([prices, crop_wide]).groupby(['Crop', 'State'], sort=True)['CROP_PRICE']
+
+    stats = grouped.agg(['mean', 'std', 'count'])
+    quantiles = grouped.quantile(list(PRICE_QUANTILES)).unstack()
+    return {
+        'crops': stats.index.get_level_values('Crop').to_numpy(dtype=str),
+        'states': stats.index.get_level_values('State').to_numpy(dtype=str),
+        'mean': stats['mean'].to_numpy(dtype=np.float64),
+        'std': stats['std'].fillna(0).to_numpy(dtype=np.float64),
+        'count': stats['count'].to_numpy(dtype=np.int64),
+        'quantile_levels': np.array(PRICE_QUANTILES),
+        'quantiles': quantiles.to_numpy(dtype=np.float64)
+    }
+
+def save_price_table(df, path='data/crop_price_table.npz'):
+    """
+    Build and save the price distribution artifact
+    """
+    table = build_price_table(df)
+    np.savez_compressed(path, **table)
+    print(f"Price distributions for {len(table['crops'])} crop/State groups saved to {path}")
+    return table
+
+def _lookup_codes(values, codes, default=-1):
+    """
+    Code for every value from a dict keyed by normalized label. Only the
+    distinct values are normalized and looked up; the rows just index them.
+    """
+    positions, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    lookup = np.array([codes.get(_normalize(value), default) for value in uniques], dtype=np.int64)
+    return lookup[positions] if len(lookup) else np.full(len(positions), default, dtype=np.int64)
+
+class PriceTable:
+    """
+    Vectorized lookups of price distributions by crop and State
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.index = {(_normalize(crop), _normalize(state)): i for i, (crop, state) in
+                      enumerate(zip(arrays['crops'].tolist(), arrays['states'].tolist()))}
+
+    @classmethod
+    def load(cls, path='data/crop_price_table.npz'):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def grid(self, crops, states):
+        """
+        Table row for every crop (rows) x State (columns), falling back to
+        the crop-wide row and then to -1 when the crop has no prices at all
+        """
+        return np.array([
+            [self.index.get((_normalize(crop), _normalize(state)),
+                            self.index.get((_normalize(crop), ALL_STATES), -1)) for state in states]
+            for crop in crops
+        ], dtype=np.int64).reshape(len(crops), len(states))
+
+    def rows(self, crops, states):
+        """
+        Table row for every (crop, State) pair, looked up once per distinct
+        crop and State
+        """
+        crop_positions, crop_values = pd.factorize(np.asarray(crops, dtype=object), use_na_sentinel=False)
+        state_positions, state_values = pd.factorize(np.asarray(states, dtype=object), use_na_sentinel=False)
+        return self.grid(crop_values, state_values)[crop_positions, state_positions]
+
+def revenue_distribution(yield_mean, yield_std, price_mean, price_std, quantiles=RISK_QUANTILES):
+    """
+    Mean, std and quantiles of revenue per hectare for arrays of independent
+    yield (t/ha) and price (Rs/quintal) distributions
+    """
+    mean = yield_mean * price_mean * QUINTALS_PER_TONNE
+    second_moment = (yield_std ** 2 + yield_mean ** 2) * (price_std ** 2 + price_mean ** 2)
+    variance = np.maximum(second_moment * QUINTALS_PER_TONNE ** 2 - mean ** 2, 0)
+
+    # Lognormal with matching mean and variance
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.sqrt(np.log1p(variance / mean ** 2))
+        mu = np.log(mean) - sigma ** 2 / 2
+    result = {'mean': mean, 'std': np.sqrt(variance)}
+    for q in quantiles:
+        result[f'q{q * 100:g}'] = np.where(mean > 0, np.exp(mu + sigma * norm.ppf(q)), 0.0)
+    return result
+
+class ProfitabilityEngine:
+    """
+    Ranks candidate crops for batches of farms by expected revenue per hectare
+    """
+    def __init__(self, yield_model, le_crop, le_season, le_state, price_table):
+        self.yield_model = yield_model
+        self.flat_forest = flatten_forest(yield_model)
+        self.price_table = price_table
+        self.crops = le_crop.classes_
+        self.crop_codes = np.arange(len(self.crops))
+        self.season_codes = {_normalize(season): i for i, season in enumerate(le_season.classes_)}
+        self.state_codes = {_normalize(state): i for i, state in enumerate(le_state.classes_)}
+
+    @classmethod
+    def load(cls, data_dir='data'):
+        import joblib
+        return cls(
+            joblib.load(f'{data_dir}/yield_prediction_model.pkl'),
+            joblib.load(f'{data_dir}/crop_encoder.pkl'),
+            joblib.load(f'{data_dir}/season_encoder.pkl'),
+            joblib.load(f'{data_dir}/state_encoder.pkl'),
+            PriceTable.load(f'{data_dir}/crop_price_table.npz')
+        )
+
+    def evaluate(self, farms, crops=None):
+        """
+        Revenue distribution of every candidate crop on every farm.
+        farms has the columns State, Season, Crop_Year, Area, Annual_Rainfall,
+        Fertilizer and Pesticide. All farm x crop pairs go through the yield
+        model in one batch. Returns one row per pair; pairs whose crop has
+        no history in the farm's State have supported=False and risk
+        'unsupported'.
+        """
+        farms = farms.reset_index(drop=True)
+        crop_codes = self.crop_codes if crops is None else np.array(
+            [list(map(_normalize, self.crops)).index(_normalize(crop)) for crop in crops]
+        )
+        n_farms, n_crops = len(farms), len(crop_codes)
+
+        season = _lookup_codes(farms['Season'], self.season_codes)
+        state = _lookup_codes(farms['State'], self.state_codes)
+        known = np.repeat((season >= 0) & (state >= 0), n_crops)
+
+        pairs = pd.DataFrame({
+            'farm': np.repeat(np.arange(n_farms), n_crops),
+            'Crop_encoded': np.tile(crop_codes, n_farms),
+            'Season_encoded': np.repeat(season, n_crops),
+            'State_encoded': np.repeat(state, n_crops)
+        })
+        for column in ['Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']:
+            pairs[column] = np.repeat(farms[column].to_numpy(dtype=np.float64), n_crops)
+        pairs['crop'] = self.crops[pairs['Crop_encoded']]
+        pairs['state'] = np.repeat(farms['State'].to_numpy(), n_crops)
+
+        features = list(self.yield_model.feature_names_in_)
+        tree_predictions = per_tree_predictions(self.flat_forest, pairs[features], model=self.yield_model)
+        yield_mean = np.where(known, tree_predictions.mean(axis=1), np.nan)
+        yield_std = np.where(known, tree_predictions.std(axis=1), np.nan)
+
+        # Price rows for the candidate crops x the distinct farm States,
+        # spread to the farm-major pair order
+        state_positions, states = pd.factorize(farms['State'].to_numpy(dtype=object), use_na_sentinel=False)
+        rows = self.price_table.grid(self.crops[crop_codes], states).T[state_positions].ravel()
+        price = self.price_table.arrays
+        has_price = rows >= 0
+        price_mean = np.where(has_price, price['mean'][rows], np.nan)
+        price_std = np.where(has_price, price['std'][rows], np.nan)
+        median_column = list(price['quantile_levels']).index(0.5)
+        # The price table holds a State-level row for every Crop x State in
+        # the historical records, so a crop-wide fallback means the crop was
+        # never grown in that State
+        supported = known & has_price & (price['states'][rows] != ALL_STATES)
+
+        revenue = revenue_distribution(yield_mean, yield_std, price_mean, price_std)
+        result = pairs[['farm', 'crop', 'state']].assign(
+            yield_mean=yield_mean,
+            yield_std=yield_std,
+            price_median=np.where(has_price, price['quantiles'][rows, median_column], np.nan),
+            price_is_state_level=has_price & (price['states'][rows] != ALL_STATES),
+            supported=supported,
+            **{f'revenue_{name}': values for name, values in revenue.items()}
+        )
+        cv = result['revenue_std'] / result['revenue_mean']
+        result['risk'] = np.select([cv < RISK_BANDS[0], cv < RISK_BANDS[1]], ['low', 'medium'], 'high')
+        result.loc[result['revenue_mean'].isna(), 'risk'] = 'unknown'
+        result.loc[result['revenue_mean'].notna() & ~result['supported'], 'risk'] = 'unsupported'
+        return result
+
+    def rank(self, farms, crops=None, top_k=3, by='revenue_mean', include_unsupported=False):
+        """
+        Top crops per farm, ordered by expected revenue per hectare
+        (or by another revenue column, e.g. 'revenue_q5' for a cautious ranking).
+        Crops with no history in the farm's State are extrapolations of the
+        yield model and are left out unless include_unsupported is set.
+        """
+        evaluated = self.evaluate(farms, crops).dropna(subset=[by])
+        if not include_unsupported:
+            evaluated = evaluated[evaluated['supported']]
+        ranked = evaluated.sort_values(['farm', by], ascending=[True, False], kind='stable')
+        ranked['rank'] = ranked.groupby('farm').cumcount() + 1
+        return ranked[ranked['rank'] <= top_k].reset_index(drop=True)
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description='Build price distributions and rank crops by revenue')
+    parser.add_argument('--data', default='crop_yeild.csv', help='Path to the crop yield CSV')
+    parser.add_argument('--output', default='data/crop_price_table.npz')
+    parser.add_argument('--farms', type=int, default=1000, help='Synthetic farms in the batch benchmark')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    save_price_table(df, args.output)
+
+    engine = ProfitabilityEngine.load(os.path.dirname(args.output) or '.')
+
+    # Farms drawn from the historical records, one row per farm
+    farms = df.sample(args.farms, replace=True, random_state=42)[
+        ['State', 'Season', 'Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+    ]
+    start = time.perf_counter()
+    ranking = engine.rank(farms)
+    elapsed = time.perf_counter() - start
+    print(f"\nRanked {len(engine.crops)} crops for {args.farms} farms in {elapsed * 1000:.1f} ms")
+
+    print(f"\nFarm 0 ({farms.iloc[0]['State']}, {farms.iloc[0]['Season'].strip()}):")
+    for _, row in ranking[ranking['farm'] == 0].iterrows():
+        print(f"  {row['rank']}. {row['crop']:<8} Rs {row['revenue_mean']:>9,.0f}/ha "
+              f"(90% band Rs {row['revenue_q5']:,.0f} - {row['revenue_q95']:,.0f}, {row['risk']} risk)")
@@ -0,0 +1,222 @@
+"""
+Concurrent query orchestration for AgriBot
+Runs vocabulary translation, crop recommendation, yield prediction, disease
+lookup and LLM advice for one farmer query at the same time with asyncio,
+so end-to-end latency is the slowest branch instead of the sum of all of them
+
+Every branch has its own deadline. CPU-bound model calls run on a bounded
+executor, and a branch that fails or times out is reported in the response
+without holding back the others.
+
+A deadline only stops waiting for a model call: Python cannot interrupt a
+running thread, so a timed-out call keeps its executor worker until it
+returns (calls still queued are dropped). The executor is therefore sized
+for one stuck call per model branch for every query in flight.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Branches that run on the executor: translation, crop, yield and disease
+EXECUTOR_BRANCHES = 4
+
+DEFAULT_DEADLINES = {
+    'translation': 0.5,
+    'crop_recommendation': 2.0,
+    'yield_prediction': 2.0,
+    'disease_lookup': 3.0,
+    'advice': 8.0
+}
+
+def load_vocabulary(path='config/agricultural_vocabulary.json'):
+    """
+    Load the vocabulary written by setup_multilingual_models.py, if present
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def build_term_index(vocabulary):
+    """
+    Map every non-English term to its English equivalent, with one
+    precompiled pattern per language that matches any of its terms.
+    The vocabulary lists are aligned by position across languages.
+    """
+    terms_by_language = {}
+    english = vocabulary.get('en', {})
+    for language, categories in vocabulary.items():
+        if language == 'en':
+            continue
+        for category, terms in categories.items():
+            for term, english_term in zip(terms, english.get(category, [])):
+                terms_by_language.setdefault(language, {})[term] = english_term
+
+    # Longest terms first so multi-word terms win over their parts
+    return {
+        language: {
+            'terms': terms,
+            'pattern': re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)))
+        }
+        for language, terms in terms_by_language.items()
+    }
+
+def translate_terms(text, language, term_index):
+    """
+    Replace known agricultural terms in the farmer's language with English
+    """
+    if language == 'en' or not term_index or language not in term_index:
+        return {'text': text, 'terms': []}
+
+    terms = term_index[language]['terms']
+    pattern = term_index[language]['pattern']
+    found = []
+
+    def replace(match):
+        found.append({'term': match.group(0), 'english': terms[match.group(0)]})
+        return terms[match.group(0)]
+
+    return {'text': pattern.sub(replace, text), 'terms': found}
+
+class LocalAdviceStandIn:
+    """
+    Local stand-in for the LLM advice endpoint, used for development and
+    benchmarking so no external service is called
+    """
+    def __init__(self, delay=0.2, response="Apply nitrogen in split doses and monitor soil moisture."):
+        self.delay = delay
+        self.response = response
+        self.calls = 0
+
+    async def __call__(self, prompt, language='en'):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.response
+
+class QueryOrchestrator:
+    """
+    Fan out the sub-calls for a farmer query concurrently.
+    Model callables are synchronous and run on the executor;
+    advice_client is an async callable (prompt, language) -> str.
+    max_concurrent_queries sizes the default executor so that timed-out
+    calls still holding threads do not starve the next queries.
+    """
+    def __init__(self, crop_predictor=None, yield_predictor=None, disease_predictor=None,
+                 advice_client=None, vocabulary=None, deadlines=None, max_workers=None,
+                 executor=None, max_concurrent_queries=4):
+        self.crop_predictor = crop_predictor
+        self.yield_predictor = yield_predictor
+        self.disease_predictor = disease_predictor
+        self.advice_client = advice_client
+        self.term_index = build_term_index(vocabulary) if vocabulary else {}
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        max_workers = max_workers or EXECUTOR_BRANCHES * max_concurrent_queries
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers,
+                                                       thread_name_prefix='agribot-model')
+
+    async def _run_in_executor(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def _run_branch(self, name, coroutine):
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coroutine, timeout=self.deadlines[name])
+            status = 'ok'
+        except asyncio.TimeoutError:
+            result, status = None, 'timeout'
+        except Exception as e:
+            result, status = None, f'error: {e}'
+        return name, status, result, time.perf_counter() - start
+
+    def _branches(self, query):
+        text = query.get('text', '')
+        language = query.get('language', 'en')
+
+        branches = {}
+        if text:
+            branches['translation'] = self._run_in_executor(
+                translate_terms, text, language, self.term_index
+            )
+        if self.crop_predictor and query.get('soil_params'):
+            branches['crop_recommendation'] = self._run_in_executor(
+                self.crop_predictor, query['soil_params']
+            )
+        if self.yield_predictor and query.get('yield_inputs'):
+            branches['yield_prediction'] = self._run_in_executor(
+                self.yield_predictor, query['yield_inputs']
+            )
+        if self.disease_predictor and query.get('image') is not None:
+            branches['disease_lookup'] = self._run_in_executor(
+                self.disease_predictor, query['image']
+            )
+        if self.advice_client and text:
+            branches['advice'] = self.advice_client(text, language)
+        return branches
+
+    async def handle_query(self, query):
+        """
+        Run all applicable branches for a query and collect partial results.
+        Returns results for branches that finished, plus the status and
+        duration of every branch.
+        """
+        start = time.perf_counter()
+        branches = self._branches(query)
+        outcomes = await asyncio.gather(*(
+            self._run_branch(name, coroutine) for name, coroutine in branches.items()
+        ))
+
+        response = {'results': {}, 'status': {}, 'timings_s': {}}
+        for name, status, result, duration in outcomes:
+            response['status'][name] = status
+            response['timings_s'][name] = duration
+            if status == 'ok':
+                response['results'][name] = result
+        response['partial'] = any(status != 'ok' for status in response['status'].values())
+        response['latency_s'] = time.perf_counter() - start
+        return response
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    # Demo with local stand-ins for every branch so no model files or
+    # external endpoints are needed
+    def crop_stand_in(soil_params):
+        time.sleep(0.3)
+        return [{'crop': 'rice', 'confidence': 82.0}]
+
+    def yield_stand_in(inputs):
+        time.sleep(0.4)
+        return {'mean': 2.8, 'std': 0.3}
+
+    def slow_disease_stand_in(image):
+        time.sleep(5.0)
+        return {'disease': 'Leaf_Blight', 'confidence': 71.0}
+
+    orchestrator = QueryOrchestrator(
+        crop_predictor=crop_stand_in,
+        yield_predictor=yield_stand_in,
+        disease_predictor=slow_disease_stand_in,
+        advice_client=LocalAdviceStandIn(delay=0.5),
+        vocabulary=load_vocabulary(),
+        deadlines={'disease_lookup': 1.0}
+    )
+    query = {
+        'text': 'धान की फसल में नाइट्रोजन कितना डालें?',
+        'language': 'hi',
+        'soil_params': {'N': 90, 'P': 42, 'K': 43},
+        'yield_inputs': {'crop': 'Rice', 'state': 'Assam'},
+        'image': b'not-a-real-image'
+    }
+
+    response = asyncio.run(orchestrator.handle_query(query))
+    orchestrator.close()
+
+    print(json.dumps(response, indent=2, ensure_ascii=False))
+    print(f"\nEnd-to-end latency: {response['latency_s']:.2f}s "
+          f"(sum of branches: {sum(response['timings_s'].values()):.2f}s)")
@@ -0,0 +1,219 @@
+"""
+Score soil health card exports with the crop recommendation model
+Streams a large input CSV in chunks, scores them across a process pool and
+writes the recommendations back in input order to CSV or Parquet
+
+Each worker memory-maps the same flattened forest arrays, so the model is
+held once in the page cache no matter how many workers run. Finished chunks
+are kept as part files next to the output, so an interrupted run resumes
+from the first missing chunk.
+
+Usage:
+    python scripts/score_soil_cards.py soil_cards.csv recommendations.csv --workers 8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import joblib
+import numpy as np
+import pandas as pd
+from forest_arrays import flatten_forest, load_flat_forest, predict_flat_forest, save_flat_forest
+from model_registry import file_sha256
+from soil_features import COLUMN_ALIASES, FEATURES
+
+_worker_state = {}
+
+def export_model_artifact(model_path, encoder_path, directory):
+    """
+    Flatten the crop model once into memory-mappable arrays for the workers
+    """
+    model = joblib.load(model_path)
+    label_encoder = joblib.load(encoder_path)
+
+    save_flat_forest(flatten_forest(model), directory)
+    class_names = label_encoder.classes_[model.classes_]
+    np.save(os.path.join(directory, 'class_names.npy'), class_names.astype(str))
+
+def _init_worker(model_directory, top_k, output_format):
+    _worker_state['forest'] = load_flat_forest(model_directory, mmap_mode='r')
+    _worker_state['class_names'] = np.load(os.path.join(model_directory, 'class_names.npy'))
+    _worker_state['top_k'] = top_k
+    _worker_state['output_format'] = output_format
+
+def score_chunk(chunk):
+    """
+    Top-k crop recommendations for one chunk of soil cards
+    """
+    features = chunk.rename(columns=COLUMN_ALIASES)[FEATURES]
+    probabilities = predict_flat_forest(_worker_state['forest'], features.to_numpy(dtype=np.float32))
+
+    top_k = _worker_state['top_k']
+    top_indices = np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+    top_probabilities = np.take_along_axis(probabilities, top_indices, axis=1)
+    top_crops = _worker_state['class_names'][top_indices]
+
+    result = chunk.copy()
+    result['recommended_crop'] = top_crops[:, 0]
+    result['confidence'] = top_probabilities[:, 0] * 100
+    for rank in range(1, top_k):
+        result[f'alternative_{rank}'] = top_crops[:, rank]
+        result[f'alternative_{rank}_confidence'] = top_probabilities[:, rank] * 100
+    return result
+
+def _score_to_part(chunk_index, chunk, part_path):
+    result = score_chunk(chunk)
+
+    # Write to a temporary name first so a killed worker never leaves a partial part
+    temporary_path = part_path + '.tmp'
+    if _worker_state['output_format'] == 'parquet':
+        result.to_parquet(temporary_path, index=False)
+    else:
+        result.to_csv(temporary_path, index=False)
+    os.replace(temporary_path, part_path)
+
+    return chunk_index, len(result)
+
+def _part_path(parts_directory, chunk_index, output_format):
+    return os.path.join(parts_directory, f'part-{chunk_index:06d}.{output_format}')
+
+def _prepare_parts_directory(parts_directory, manifest):
+    """
+    Create the parts directory, or check that an existing one belongs to the same job
+    """
+    manifest_path = os.path.join(parts_directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise ValueError(
+                f"{parts_directory} was created for a different input, model or chunk size; "
+                f"remove it to start over"
+            )
+        return
+
+    os.makedirs(parts_directory, exist_ok=True)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def _merge_parts(parts_directory, n_chunks, output_path, output_format):
+    """
+    Concatenate the part files in chunk order into the final output
+    """
+    paths = [_part_path(parts_directory, i, output_format) for i in range(n_chunks)]
+
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = None
+        for path in paths:
+            table = pq.read_table(path)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+        return
+
+    with open(output_path, 'wb') as output:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as part:
+                if i > 0:
+                    part.readline()  # skip the repeated header
+                shutil.copyfileobj(part, output)
+
+def score_soil_cards(input_path, output_path, workers=None, chunksize=100000, top_k=3,
+                     model_path='data/crop_recommendation_model.pkl',
+                     encoder_path='data/crop_label_encoder.pkl', keep_parts=False):
+    """
+    Score a soil card CSV across a process pool, resuming from existing part files
+    """
+    workers = workers or os.cpu_count()
+    output_format = 'parquet' if str(output_path).endswith('.parquet') else 'csv'
+    parts_directory = f'{output_path}.parts'
+    model_directory = os.path.join(parts_directory, 'model')
+
+    # Key the resume on the model contents: a retrained model copied in with
+    # an older timestamp must not reuse parts scored by the previous one
+    input_stat = os.stat(input_path)
+    manifest = {
+        'input': os.path.abspath(input_path),
+        'input_size': input_stat.st_size,
+        'input_mtime_ns': input_stat.st_mtime_ns,
+        'model': os.path.abspath(model_path),
+        'model_sha256': file_sha256(model_path),
+        'encoder_sha256': file_sha256(encoder_path),
+        'chunksize': chunksize,
+        'top_k': top_k,
+        'format': output_format
+    }
+    _prepare_parts_directory(parts_directory, manifest)
+    if not os.path.exists(os.path.join(model_directory, 'forest.json')):
+        export_model_artifact(model_path, encoder_path, model_directory)
+
+    start = time.perf_counter()
+    rows_scored = 0
+    rows_skipped = 0
+    n_chunks = 0
+    pending = set()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_directory, top_k, output_format)) as pool:
+        for chunk_index, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize)):
+            n_chunks += 1
+            part_path = _part_path(parts_directory, chunk_index, output_format)
+            if os.path.exists(part_path):
+                rows_skipped += len(chunk)
+                continue
+
+            # Bound the number of chunks held in memory while workers catch up
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                rows_scored += sum(future.result()[1] for future in done)
+                elapsed = time.perf_counter() - start
+                print(f"Scored {rows_scored:,} rows ({rows_scored / elapsed:,.0f} rows/sec)")
+
+            pending.add(pool.submit(_score_to_part, chunk_index, chunk, part_path))
+
+        for future in pending:
+            rows_scored += future.result()[1]
+            elapsed = time.perf_counter() - start
+            print(f"Scored {rows_scored:,} rows ({rows_scored / elapsed:,.0f} rows/sec)")
+
+    elapsed = time.perf_counter() - start
+    _merge_parts(parts_directory, n_chunks, output_path, output_format)
+    if not keep_parts:
+        shutil.rmtree(parts_directory)
+
+    throughput = rows_scored / elapsed if elapsed > 0 else 0.0
+    print(f"\nScored {rows_scored:,} rows in {elapsed:.2f}s with {workers} workers "
+          f"({throughput:,.0f} rows/sec)")
+    if rows_skipped:
+        print(f"Resumed: {rows_skipped:,} rows were already scored")
+    print(f"Recommendations written to {output_path}")
+
+    return {
+        'rows_scored': rows_scored,
+        'rows_resumed': rows_skipped,
+        'chunks': n_chunks,
+        'seconds': elapsed,
+        'rows_per_sec': throughput
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Score soil health card exports with the crop model')
+    parser.add_argument('input', help='Input CSV with N, P, K, temperature, humidity, ph, rainfall')
+    parser.add_argument('output', help='Output .csv or .parquet path')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Rows per chunk')
+    parser.add_argument('--top-k', type=int, default=3, help='Recommendations per row')
+    parser.add_argument('--model', default='data/crop_recommendation_model.pkl')
+    parser.add_argument('--encoder', default='data/crop_label_encoder.pkl')
+    parser.add_argument('--keep-parts', action='store_true',
+                        help='Keep the per-chunk part files after merging')
+    args = parser.parse_args()
+
+    score_soil_cards(args.input, args.output, args.workers, args.chunksize, args.top_k,
+                     args.model, args.encoder, args.keep_parts)
@@ -0,0 +1,280 @@
+"""
+Shared model hosting for multi-worker AgriBot servers
+Publishes the crop and yield forests (as flattened tree arrays), their
+encoders and the profile tables once as plain .npy files. Every worker
+memory-maps them read-only, so all workers share one copy in the page cache
+instead of each unpickling its own forests, and workers never need to import
+scikit-learn.
+
+Usage:
+    python scripts/shared_model_host.py --publish
+    python scripts/shared_model_host.py --measure --workers 4
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from forest_arrays import flat_children, flatten_forest, load_flat_forest, per_tree_predictions, save_flat_forest
+from model_registry import REGISTRY_ROOT, current_artifacts
+
+HOST_DIR = 'data/shared_models'
+# Encoded yield model features -> (encoder name, raw input column)
+YIELD_ENCODED_FEATURES = {
+    'Crop_encoded': ('crop', 'Crop'),
+    'Season_encoded': ('season', 'Season'),
+    'State_encoded': ('state', 'State')
+}
+PROFILE_TABLES = {
+    'crop_profiles': 'crop_profiles_real.npz',
+    'state_recommendations': 'state_wise_recommendations.npz',
+    'climate_features': 'climate_features.npz',
+    'price_table': 'crop_price_table.npz'
+}
+
+def _save_arrays(arrays, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), values)
+
+def _load_arrays(directory, mmap_mode='r'):
+    return {filename[:-4]: np.load(os.path.join(directory, filename), mmap_mode=mmap_mode)
+            for filename in os.listdir(directory) if filename.endswith('.npy')}
+
+def _publish_forest(model, directory):
+    flat = flatten_forest(model)
+    # Store the child table too, so traversal never builds a private copy
+    flat['children'] = flat_children(flat)
+    save_flat_forest(flat, directory)
+
+def _publish_into(host_dir, data_dir, registry_root):
+    import joblib
+
+    versions = {}
+    version, paths = current_artifacts('crop_recommendation', {
+        'model.pkl': os.path.join(data_dir, 'crop_recommendation_model.pkl'),
+        'label_encoder.pkl': os.path.join(data_dir, 'crop_label_encoder.pkl')
+    }, registry_root)
+    versions['crop_recommendation'] = version
+    crop_model = joblib.load(paths['model.pkl'])
+    label_encoder = joblib.load(paths['label_encoder.pkl'])
+    _publish_forest(crop_model, os.path.join(host_dir, 'crop'))
+    _save_arrays({'class_names': label_encoder.classes_[crop_model.classes_].astype(str)},
+                 os.path.join(host_dir, 'crop'))
+
+    version, paths = current_artifacts('yield_prediction', {
+        'model.pkl': os.path.join(data_dir, 'yield_prediction_model.pkl'),
+        **{f'{name}_encoder.pkl': os.path.join(data_dir, f'{name}_encoder.pkl')
+           for name in ('crop', 'season', 'state')}
+    }, registry_root)
+    if os.path.exists(paths['model.pkl']):
+        versions['yield_prediction'] = version
+        yield_model = joblib.load(paths['model.pkl'])
+        _publish_forest(yield_model, os.path.join(host_dir, 'yield'))
+        _save_arrays({
+            name: joblib.load(paths[f'{name}_encoder.pkl']).classes_.astype(str)
+            for name in ('crop', 'season', 'state')
+        }, os.path.join(host_dir, 'yield', 'encoders'))
+        with open(os.path.join(host_dir, 'yield', 'features.json'), 'w') as f:
+            json.dump(list(yield_model.feature_names_in_), f)
+
+    with open(os.path.join(host_dir, 'versions.json'), 'w') as f:
+        json.dump(versions, f, indent=2)
+
+    # np.load cannot memory-map members of an .npz archive, so unpack them
+    for name, filename in PROFILE_TABLES.items():
+        path = os.path.join(data_dir, filename)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                _save_arrays({key: data[key] for key in data.files}, os.path.join(host_dir, 'tables', name))
+
+def publish_models(host_dir=HOST_DIR, data_dir='data', registry_root=REGISTRY_ROOT):
+    """
+    Convert the pickled models and .npz tables into memory-mappable files.
+    The models are taken from the CURRENT versions in the model registry,
+    falling back to the fixed files in data_dir when nothing is registered.
+    Everything is written to a temporary directory next to host_dir and
+    renamed into place, so workers never load a half-written publish
+    (one starting between the two renames of a republish finds no host_dir
+    and should retry); workers that already mapped the previous files keep
+    their mappings.
+    """
+    parent = os.path.dirname(os.path.abspath(host_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{os.path.basename(host_dir)}.', dir=parent)
+    try:
+        _publish_into(staging, data_dir, registry_root)
+        os.chmod(staging, 0o755)
+        if not os.path.exists(host_dir):
+            os.rename(staging, host_dir)
+        else:
+            # A directory cannot replace another in one rename, so move the
+            # old publish aside first and put it back if the swap fails
+            retired = tempfile.mkdtemp(prefix=f'.{os.path.basename(host_dir)}.old.', dir=parent)
+            previous = os.path.join(retired, 'published')
+            os.rename(host_dir, previous)
+            try:
+                os.rename(staging, host_dir)
+            except OSError:
+                os.rename(previous, host_dir)
+                os.rmdir(retired)
+                raise
+            shutil.rmtree(retired)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"Published shared model artifacts to {host_dir}")
+
+class SharedModelHost:
+    """
+    Zero-copy view of the published artifacts for one worker process
+    """
+    def __init__(self, host_dir=HOST_DIR):
+        self.crop_forest = load_flat_forest(os.path.join(host_dir, 'crop'), mmap_mode='r')
+        self.crop_classes = self.crop_forest.pop('class_names')
+
+        self.yield_forest = None
+        yield_dir = os.path.join(host_dir, 'yield')
+        if os.path.isdir(yield_dir):
+            self.yield_forest = load_flat_forest(yield_dir, mmap_mode='r')
+            with open(os.path.join(yield_dir, 'features.json')) as f:
+                self.yield_features = json.load(f)
+            self.encoders = {
+                name: {str(label).strip().lower(): code for code, label in enumerate(classes.tolist())}
+                for name, classes in _load_arrays(os.path.join(yield_dir, 'encoders')).items()
+            }
+
+        tables_dir = os.path.join(host_dir, 'tables')
+        self.tables = {}
+        if os.path.isdir(tables_dir):
+            self.tables = {name: _load_arrays(os.path.join(tables_dir, name)) for name in os.listdir(tables_dir)}
+
+    def recommend_crops(self, X, top_k=3):
+        """
+        Top-k crops and probabilities for soil feature rows (N, P, K,
+        temperature, humidity, ph, rainfall)
+        """
+        probabilities = per_tree_predictions(self.crop_forest, X).mean(axis=1)
+        top = np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+        return self.crop_classes[top], np.take_along_axis(probabilities, top, axis=1)
+
+    def _yield_value(self, row, feature):
+        encoded = YIELD_ENCODED_FEATURES.get(feature)
+        column = encoded[1] if encoded else feature
+        if column not in row:
+            raise ValueError(f"Yield input is missing '{column}'")
+        if encoded is None:
+            return row[column]
+
+        code = self.encoders[encoded[0]].get(str(row[column]).strip().lower())
+        if code is None:
+            raise ValueError(f"Unknown {column} '{row[column]}': the yield model was not trained on it")
+        return code
+
+    def predict_yield(self, rows):
+        """
+        Mean and tree spread of the predicted yield for dict rows with Crop,
+        Season, State, Crop_Year, Area, Annual_Rainfall, Fertilizer, Pesticide
+        """
+        if self.yield_forest is None:
+            raise ValueError("No yield model was published to this host")
+        X = np.array([[self._yield_value(row, feature) for feature in self.yield_features]
+                      for row in rows], dtype=np.float32)
+        predictions = per_tree_predictions(self.yield_forest, X)
+        return predictions.mean(axis=1), predictions.std(axis=1)
+
+    def crop_profiles(self):
+        from profile_artifacts import CropProfileStore
+        return CropProfileStore(self.tables['crop_profiles'])
+
+def memory_rollup():
+    """
+    Rss, Pss and private (unshared) memory of this process in MB from
+    /proc/self/smaps_rollup, or None where it is unavailable
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith('0'))
+    except OSError:
+        return None
+    kb = {name: int(value.split()[0]) for name, value in fields.items()}
+    return {
+        'rss_mb': kb['Rss'] / 1024,
+        'pss_mb': kb['Pss'] / 1024,
+        'private_mb': (kb['Private_Clean'] + kb['Private_Dirty']) / 1024
+    }
+
+def _measure_worker(mode, host_dir, data_dir, barrier, results):
+    """
+    Load the models the given way, serve a batch, and report memory while
+    every worker holds its models
+    """
+    rng = np.random.default_rng(os.getpid())
+    X = rng.uniform([0, 5, 5, 10, 15, 4, 20], [140, 145, 205, 44, 100, 10, 300], size=(256, 7))
+    if mode == 'pickle':
+        # Import before the baseline so only the models themselves are counted
+        import warnings
+        import joblib
+        import sklearn.ensemble
+        warnings.filterwarnings('ignore')
+    before = memory_rollup()
+
+    if mode == 'pickle':
+        model = joblib.load(os.path.join(data_dir, 'crop_recommendation_model.pkl'))
+        yield_model = joblib.load(os.path.join(data_dir, 'yield_prediction_model.pkl'))
+        model.predict_proba(X)
+        yield_model.predict(np.zeros((1, yield_model.n_features_in_)))
+    else:
+        host = SharedModelHost(host_dir)
+        host.recommend_crops(X)
+        if host.yield_forest is not None:
+            per_tree_predictions(host.yield_forest, np.zeros((1, len(host.yield_features))))
+
+    barrier.wait()
+    after = memory_rollup()
+    results.put({name: after[name] - before[name] for name in after})
+    barrier.wait()
+
+def measure_workers(mode, workers=4, host_dir=HOST_DIR, data_dir='data'):
+    """
+    Average per-worker memory growth from loading the models, measured with
+    all workers alive at once so shared pages are split between them in Pss.
+    Library imports are excluded; shared workers also skip scikit-learn.
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_measure_worker, args=(mode, host_dir, data_dir, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {name: float(np.mean([m[name] for m in measurements])) for name in measurements[0]}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Publish models for shared hosting and measure worker memory')
+    parser.add_argument('--publish', action='store_true', help='Write the memory-mappable artifacts')
+    parser.add_argument('--measure', action='store_true', help='Compare per-worker memory with pickled models')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--host-dir', default=HOST_DIR)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--registry-root', default=REGISTRY_ROOT)
+    args = parser.parse_args()
+
+    if args.publish:
+        publish_models(args.host_dir, args.data_dir, args.registry_root)
+
+    if args.measure:
+        print(f"\nPer-worker memory growth from loading the models ({args.workers} workers):")
+        print(f"{'Mode':<8} {'RSS (MB)':>9} {'PSS (MB)':>9} {'Private (MB)':>13}")
+        for mode in ('pickle', 'shared'):
+            m = measure_workers(mode, args.workers, args.host_dir, args.data_dir)
+            print(f"{mode:<8} {m['rss_mb']:>9.1f} {m['pss_mb']:>9.1f} {m['private_mb']:>13.1f}")
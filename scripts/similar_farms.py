@@ -0,0 +1,255 @@
+"""
+"Farms like mine" search over the soil samples in crop_yeild.csv
+Indexes the standardized soil/climate vector of every historical plot and
+returns the k most similar plots with their crop and yield for a batch of
+queries
+
+Tables up to a few million rows use an exact KD-tree, which stays fast in
+seven dimensions. Beyond that an IVF index keeps memory bounded: a k-means
+coarse quantizer splits the vectors into lists, the vectors are stored as
+int8 codes (4x smaller than float32), and each query scans only the n_probe
+nearest lists. The IVF index also keeps an int64 row order (8 bytes per row)
+to map codes back to plots, so it takes 15 bytes per row against 28 for the
+exact float32 vectors.
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import KDTree
+from soil_features import COLUMN_ALIASES, FEATURES, SOIL_COLUMNS
+
+# float32 vectors of this many rows take about 140 MB
+EXACT_MAX_ROWS = 5000000
+
+def _codes(values):
+    """
+    Integer codes and the string table for a column of labels
+    """
+    codes, table = pd.factorize(pd.Series(values).astype(str).str.strip())
+    return codes.astype(np.int32), np.asarray(table, dtype=str)
+
+class SimilarFarmIndex:
+    """
+    Nearest-neighbour index over standardized soil/climate vectors
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.method = str(arrays['method'])
+        self.mean = arrays['mean']
+        self.std = arrays['std']
+        if self.method == 'exact':
+            self.tree = KDTree(arrays['vectors'])
+
+    @classmethod
+    def build(cls, df, method='auto', n_lists=None, seed=42):
+        """
+        Build the index from a dataframe with the crop_yeild.csv columns.
+        method is 'exact', 'ivf' or 'auto' (exact up to EXACT_MAX_ROWS rows).
+        """
+        vectors = df[SOIL_COLUMNS].to_numpy(dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        std = vectors.std(axis=0)
+        std[std == 0] = 1.0
+        vectors = (vectors - mean) / std
+
+        if method == 'auto':
+            method = 'exact' if len(vectors) <= EXACT_MAX_ROWS else 'ivf'
+
+        crop_codes, crops = _codes(df['Crop'])
+        state_codes, states = _codes(df['State'])
+        season_codes, seasons = _codes(df['Season'])
+        arrays = {
+            'method': np.array(method),
+            'mean': mean,
+            'std': std,
+            'crop_codes': crop_codes,
+            'crops': crops,
+            'state_codes': state_codes,
+            'states': states,
+            'season_codes': season_codes,
+            'seasons': seasons,
+            'years': df['Crop_Year'].to_numpy(dtype=np.int16),
+            'yields': df['Yield'].to_numpy(dtype=np.float32)
+        }
+
+        if method == 'exact':
+            arrays['vectors'] = vectors
+        else:
+            arrays.update(cls._build_ivf(vectors, n_lists, seed))
+        return cls(arrays)
+
+    @staticmethod
+    def _build_ivf(vectors, n_lists=None, seed=42):
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        quantizer = MiniBatchKMeans(n_clusters=n_lists, batch_size=max(4096, 4 * n_lists),
+                                    n_init=1, random_state=seed)
+        assignments = quantizer.fit_predict(vectors)
+
+        # Rows grouped by list, so each list is a contiguous slice of the codes
+        order = np.argsort(assignments, kind='stable').astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+
+        # Per-dimension scalar quantization to int8
+        low = vectors.min(axis=0)
+        scale = (vectors.max(axis=0) - low) / 255
+        scale[scale == 0] = 1.0
+        codes = (np.round((vectors[order] - low) / scale) - 128).astype(np.int8)
+
+        return {
+            'centroids': quantizer.cluster_centers_.astype(np.float32),
+            'offsets': offsets.astype(np.int64),
+            'order': order,
+            'codes': codes,
+            'low': low.astype(np.float32),
+            'scale': scale.astype(np.float32)
+        }
+
+    def save(self, path='data/similar_farms.npz'):
+        np.savez(path, **self.arrays)
+        print(f"Similar-farm index ({self.method}, {len(self)} plots) saved to {path}")
+
+    @classmethod
+    def load(cls, path='data/similar_farms.npz'):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def __len__(self):
+        return len(self.arrays['yields'])
+
+    def _standardize(self, queries):
+        if isinstance(queries, pd.DataFrame):
+            queries = queries.rename(columns=COLUMN_ALIASES)[FEATURES].to_numpy()
+        elif isinstance(queries, dict):
+            queries = [[queries[feature] for feature in FEATURES]]
+        elif len(queries) and isinstance(queries[0], dict):
+            queries = [[query[feature] for feature in FEATURES] for query in queries]
+        return (np.asarray(queries, dtype=np.float32) - self.mean) / self.std
+
+    def _search_ivf(self, queries, k, n_probe):
+        a = self.arrays
+        n_queries = len(queries)
+        best_distances = np.full((n_queries, k), np.inf, dtype=np.float32)
+        best_rows = np.full((n_queries, k), -1, dtype=np.int64)
+
+        query_norms = (queries ** 2).sum(axis=1)
+        centroid_distances = ((queries[:, None, :] - a['centroids'][None, :, :]) ** 2).sum(axis=2)
+        n_probe = min(n_probe, len(a['centroids']))
+        probes = np.argpartition(centroid_distances, n_probe - 1, axis=1)[:, :n_probe]
+
+        # Scan list by list, with every query that probes the list at once
+        probing_queries = np.repeat(np.arange(n_queries), n_probe)
+        probed_lists = probes.ravel()
+        by_list = np.argsort(probed_lists, kind='stable')
+        list_ids, list_starts = np.unique(probed_lists[by_list], return_index=True)
+        list_ends = np.append(list_starts[1:], len(by_list))
+
+        for list_id, start, end in zip(list_ids, list_starts, list_ends):
+            list_start, list_end = a['offsets'][list_id], a['offsets'][list_id + 1]
+            if list_start == list_end:
+                continue
+            members = probing_queries[by_list[start:end]]
+            vectors = (a['codes'][list_start:list_end].astype(np.float32) + 128) * a['scale'] + a['low']
+            # |q - x|^2 = |q|^2 - 2 q.x + |x|^2, as one matrix product per list
+            distances = query_norms[members, None] - 2 * queries[members] @ vectors.T \
+                + (vectors ** 2).sum(axis=1)
+
+            candidates = np.concatenate([best_distances[members], distances], axis=1)
+            candidate_rows = np.concatenate([
+                best_rows[members],
+                np.broadcast_to(a['order'][list_start:list_end], distances.shape)
+            ], axis=1)
+            keep = np.argpartition(candidates, k - 1, axis=1)[:, :k] if candidates.shape[1] > k \
+                else np.broadcast_to(np.arange(candidates.shape[1]), candidates.shape)
+            best_distances[members] = np.take_along_axis(candidates, keep, axis=1)
+            best_rows[members] = np.take_along_axis(candidate_rows, keep, axis=1)
+
+        order = np.argsort(best_distances, axis=1)
+        return (np.sqrt(np.maximum(np.take_along_axis(best_distances, order, axis=1), 0)),
+                np.take_along_axis(best_rows, order, axis=1))
+
+    def search(self, queries, k=5, n_probe=8):
+        """
+        Distances (in standardized units) and row indices of the k nearest
+        plots for each query, both of shape (n_queries, k)
+        """
+        queries = self._standardize(queries)
+        k = min(k, len(self))
+        if self.method == 'exact':
+            return self.tree.query(queries, k=k)
+        return self._search_ivf(queries, k, n_probe)
+
+    def query(self, queries, k=5, n_probe=8):
+        """
+        The k most similar historical plots for each query, with crop,
+        yield, State, season and year
+        """
+        distances, rows = self.search(queries, k, n_probe)
+        a = self.arrays
+        return [
+            [{
+                'crop': str(a['crops'][a['crop_codes'][row]]),
+                'yield': float(a['yields'][row]),
+                'state': str(a['states'][a['state_codes'][row]]),
+                'season': str(a['seasons'][a['season_codes'][row]]),
+                'year': int(a['years'][row]),
+                'distance': float(distance)
+            } for distance, row in zip(query_distances, query_rows) if row >= 0]
+            for query_distances, query_rows in zip(distances, rows)
+        ]
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Build and benchmark the similar-farm index')
+    parser.add_argument('--data', default='crop_yeild.csv', help='Path to the crop yield CSV')
+    parser.add_argument('--output', default='data/similar_farms.npz')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='Replicate the table with jitter to benchmark larger indexes')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    index = SimilarFarmIndex.build(df)
+    index.save(args.output)
+
+    example = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.8, 'humidity': 82.0, 'ph': 6.5, 'rainfall': 202.9}
+    print(f"\nPlots most similar to {example}:")
+    for plot in index.query(example, k=args.k)[0]:
+        print(f"  {plot['crop']:<12} yield {plot['yield']:.2f} in {plot['state']}, "
+              f"{plot['season']} {plot['year']} (distance {plot['distance']:.2f})")
+
+    # Benchmark exact vs IVF, optionally on a jittered replica of the table
+    rng = np.random.default_rng(42)
+    table = df
+    if args.scale > 1:
+        table = pd.concat([df] * args.scale, ignore_index=True)
+        table[SOIL_COLUMNS] += rng.normal(0, 0.5, size=(len(table), len(SOIL_COLUMNS)))
+    queries = table[SOIL_COLUMNS].to_numpy()[rng.integers(0, len(table), args.queries)]
+    queries = queries + rng.normal(0, 1.0, size=queries.shape)
+
+    print(f"\nBenchmark on {len(table):,} plots, {args.queries} queries, k={args.k}")
+    exact = SimilarFarmIndex.build(table, method='exact')
+    start = time.perf_counter()
+    exact_distances, _ = exact.search(queries, args.k)
+    exact_seconds = time.perf_counter() - start
+    print(f"exact      {exact_seconds * 1000:8.1f} ms   recall 1.000")
+
+    ivf = SimilarFarmIndex.build(table, method='ivf')
+    for n_probe in (4, 8, 16):
+        start = time.perf_counter()
+        ivf.search(queries, args.k, n_probe=n_probe)
+        seconds = time.perf_counter() - start
+        # Plots repeat across years, so count a hit when the returned plot is
+        # truly within the exact k-th distance rather than matching row ids
+        _, rows = ivf.search(queries, args.k, n_probe=n_probe)
+        true_distances = np.linalg.norm(exact.arrays['vectors'][rows] - exact._standardize(queries)[:, None, :], axis=2)
+        recall = np.mean(true_distances <= exact_distances[:, -1:] + 1e-4)
+        print(f"ivf/{n_probe:<3}   {seconds * 1000:8.1f} ms   recall {recall:.3f}")
+    ivf_bytes = ivf.arrays['codes'].nbytes + ivf.arrays['order'].nbytes
+    print(f"Vector storage: exact {exact.arrays['vectors'].nbytes / 1024**2:.1f} MB, "
+          f"ivf {ivf_bytes / 1024**2:.1f} MB (codes + row order)")
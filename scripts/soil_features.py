@@ -0,0 +1,21 @@
+"""
+Soil and climate feature names shared by the crop model scripts
+FEATURES is the column order the crop recommendation model was trained on;
+COLUMN_ALIASES maps soil health card and crop_yeild.csv column names onto it
+"""
+
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Column names used by soil health card exports and crop_yeild.csv
+COLUMN_ALIASES = {
+    'N_SOIL': 'N',
+    'P_SOIL': 'P',
+    'K_SOIL': 'K',
+    'TEMPERATURE': 'temperature',
+    'HUMIDITY': 'humidity',
+    'PH': 'ph',
+    'RAINFALL': 'rainfall'
+}
+
+# Soil/climate columns of crop_yeild.csv, in model feature order
+SOIL_COLUMNS = ['N_SOIL', 'P_SOIL', 'K_SOIL', 'TEMPERATURE', 'HUMIDITY', 'ph', 'RAINFALL']
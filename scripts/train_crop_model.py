@@ -3,6 +3,9 @@ XGBoost Crop Recommendation Model Training Script
 This script demonstrates how to train an XGBoost model for crop recommendation
 """
 
+import argparse
+import os
+import time
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
@@ -12,55 +15,93 @@ import xgboost as xgb
 import joblib
 import matplotlib.pyplot as plt
 import seaborn as sns
+from instrumentation import get_recorder, span
 
-def load_and_prepare_data():
+FEATURE_DISTRIBUTIONS = {
+    'N': (50, 20),
+    'P': (53, 15),
+    'K': (48, 18),
+    'temperature': (25, 5),
+    'humidity': (71, 15),
+    'ph': (6.5, 0.8),
+    'rainfall': (103, 50)
+}
+
+RULE_LABELS = ['rice', 'wheat', 'maize', 'cotton', 'sugarcane', 'jute',
+               'coconut', 'papaya', 'banana']
+FALLBACK_LABELS = ['kidneybeans', 'blackgram', 'mungbean', 'mothbeans', 'pigeonpeas',
+                   'chickpea', 'lentil', 'pomegranate', 'grapes', 'apple']
+CROP_LABELS = RULE_LABELS + FALLBACK_LABELS
+
+def assign_labels(data, rng):
+    """
+    Apply the labelling rules to whole columns at once.
+    Returns integer codes into CROP_LABELS; rows that match no rule
+    get a random fallback crop.
+    """
+    conditions = [
+        (data['N'] > 80) & (data['rainfall'] > 150),
+        (data['temperature'] < 25) & (data['rainfall'] < 100),
+        (data['K'] > 60) & (data['temperature'] > 25),
+        data['ph'] > 6.5,
+        data['P'] > 60,
+        data['humidity'] > 80,
+        data['N'] < 30,
+        data['temperature'] > 30,
+        data['rainfall'] > 200
+    ]
+    n_samples = len(data['N'])
+    fallback = len(RULE_LABELS) + rng.integers(0, len(FALLBACK_LABELS), n_samples)
+    # np.select picks the first matching condition, like the original if/elif chain
+    return np.select(conditions, np.arange(len(RULE_LABELS)), default=fallback)
+
+def generate_synthetic_crop_data(n_samples=2200, seed=42, chunk_size=1_000_000):
+    """
+    Generate synthetic crop recommendation data in chunks of vectorized rows.
+    Each chunk draws from its own child seed, so the output is reproducible
+    for a given seed and chunk size and chunks can be consumed lazily.
+    """
+    seed_sequence = np.random.SeedSequence(seed)
+    n_chunks = max(1, int(np.ceil(n_samples / chunk_size)))
+    child_seeds = seed_sequence.spawn(n_chunks)
+
+    for chunk_index in range(n_chunks):
+        rng = np.random.default_rng(child_seeds[chunk_index])
+        size = min(chunk_size, n_samples - chunk_index * chunk_size)
+
+        data = {feature: rng.normal(mean, std, size)
+                for feature, (mean, std) in FEATURE_DISTRIBUTIONS.items()}
+        codes = assign_labels(data, rng)
+        data['label'] = pd.Categorical.from_codes(codes, categories=CROP_LABELS)
+
+        yield pd.DataFrame(data)
+
+def write_synthetic_crop_data(path, n_samples, seed=42, chunk_size=1_000_000):
+    """
+    Write synthetic data to disk one chunk at a time (CSV or Parquet).
+    Parquet output is a directory of part files, one per chunk.
+    """
+    total_rows = 0
+    for chunk_index, chunk in enumerate(generate_synthetic_crop_data(n_samples, seed, chunk_size)):
+        if str(path).endswith('.parquet'):
+            os.makedirs(path, exist_ok=True)
+            chunk.to_parquet(os.path.join(path, f'part-{chunk_index:05d}.parquet'), index=False)
+        else:
+            chunk.to_csv(path, mode='w' if chunk_index == 0 else 'a',
+                         header=chunk_index == 0, index=False)
+        total_rows += len(chunk)
+
+    print(f"Wrote {total_rows:,} synthetic rows to {path}")
+    return total_rows
+
+def load_and_prepare_data(n_samples=2200, seed=42):
     """
     Load and prepare the crop recommendation dataset
     Expected columns: N, P, K, temperature, humidity, ph, rainfall, label
     """
     # Sample data structure - replace with your actual dataset
-    np.random.seed(42)
-    n_samples = 2200
-    
-    # Generate synthetic data similar to crop recommendation dataset
-    data = {
-        'N': np.random.normal(50, 20, n_samples),
-        'P': np.random.normal(53, 15, n_samples),
-        'K': np.random.normal(48, 18, n_samples),
-        'temperature': np.random.normal(25, 5, n_samples),
-        'humidity': np.random.normal(71, 15, n_samples),
-        'ph': np.random.normal(6.5, 0.8, n_samples),
-        'rainfall': np.random.normal(103, 50, n_samples)
-    }
-    
-    # Create labels based on conditions (simplified logic)
-    labels = []
-    for i in range(n_samples):
-        if data['N'][i] > 80 and data['rainfall'][i] > 150:
-            labels.append('rice')
-        elif data['temperature'][i] < 25 and data['rainfall'][i] < 100:
-            labels.append('wheat')
-        elif data['K'][i] > 60 and data['temperature'][i] > 25:
-            labels.append('maize')
-        elif data['ph'][i] > 6.5:
-            labels.append('cotton')
-        elif data['P'][i] > 60:
-            labels.append('sugarcane')
-        elif data['humidity'][i] > 80:
-            labels.append('jute')
-        elif data['N'][i] < 30:
-            labels.append('coconut')
-        elif data['temperature'][i] > 30:
-            labels.append('papaya')
-        elif data['rainfall'][i] > 200:
-            labels.append('banana')
-        else:
-            labels.append(np.random.choice(['kidneybeans', 'blackgram', 'mungbean', 
-                                         'mothbeans', 'pigeonpeas', 'chickpea', 
-                                         'lentil', 'pomegranate', 'grapes', 'apple']))
-    
-    data['label'] = labels
-    df = pd.DataFrame(data)
+    df = pd.concat(generate_synthetic_crop_data(n_samples, seed), ignore_index=True)
+    df['label'] = df['label'].astype(str)
     
     return df
 
@@ -76,7 +117,8 @@ def train_xgboost_model(df):
     
     # Encode labels
     label_encoder = LabelEncoder()
-    y_encoded = label_encoder.fit_transform(y)
+    with span('encode', rows=len(y)):
+        y_encoded = label_encoder.fit_transform(y)
     
     # Split the data
     X_train, X_test, y_train, y_test = train_test_split(
@@ -93,10 +135,12 @@ def train_xgboost_model(df):
         random_state=42
     )
     
-    model.fit(X_train, y_train)
+    with span('fit', rows=len(X_train)):
+        model.fit(X_train, y_train)
     
     # Make predictions
-    y_pred = model.predict(X_test)
+    with span('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
     
     # Calculate accuracy
     accuracy = accuracy_score(y_test, y_pred)
@@ -131,8 +175,9 @@ def save_model(model, label_encoder, accuracy):
     Save the trained model and label encoder
     """
     # Save model
-    joblib.dump(model, 'crop_recommendation_xgboost.pkl')
-    joblib.dump(label_encoder, 'crop_label_encoder.pkl')
+    with span('save'):
+        joblib.dump(model, 'crop_recommendation_xgboost.pkl')
+        joblib.dump(label_encoder, 'crop_label_encoder.pkl')
     
     # Save model metadata
     metadata = {
@@ -170,9 +215,29 @@ def predict_crop(model, label_encoder, soil_params):
     return crop_name, confidence
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train the XGBoost crop recommendation model')
+    parser.add_argument('--samples', type=int, default=2200,
+                        help='Number of synthetic samples to generate')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed for the synthetic data generator')
+    parser.add_argument('--generate-only', metavar='PATH',
+                        help='Write the synthetic dataset to a CSV/Parquet path and exit')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000,
+                        help='Rows per generated chunk')
+    args = parser.parse_args()
+    
+    if args.generate_only:
+        start = time.perf_counter()
+        write_synthetic_crop_data(args.generate_only, args.samples, args.seed, args.chunk_size)
+        print(f"Generation took {time.perf_counter() - start:.2f}s")
+        raise SystemExit(0)
+    
+    recorder = get_recorder('crop_model_xgboost')
+    
     # Load and prepare data
     print("Loading and preparing data...")
-    df = load_and_prepare_data()
+    with span('load', rows=args.samples):
+        df = load_and_prepare_data(args.samples, args.seed)
     print(f"Dataset shape: {df.shape}")
     print(f"Crops in dataset: {df['label'].unique()}")
     
@@ -197,7 +262,12 @@ if __name__ == "__main__":
         'rainfall': 202.9
     }
     
-    crop, confidence = predict_crop(model, label_encoder, test_params)
+    with span('predict', rows=1):
+        crop, confidence = predict_crop(model, label_encoder, test_params)
     print(f"Recommended Crop: {crop}")
     print(f"Confidence: {confidence:.2f}%")
     print(f"Input Parameters: {test_params}")
+    
+    recorder.record_metric('accuracy', float(accuracy))
+    # Separate from process_crop_dataset.py's data/crop_model_run.json
+    recorder.save('data/crop_xgboost_run.json')
@@ -6,7 +6,7 @@ This script demonstrates how to train a ResNet model for plant disease predictio
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, Subset
 import torchvision.transforms as transforms
 import torchvision.models as models
 from PIL import Image
@@ -14,8 +14,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import json
+import time
 from sklearn.metrics import accuracy_score, classification_report
 import seaborn as sns
+from instrumentation import get_recorder, span
+from model_registry import register_model
 
 class PlantDiseaseDataset(Dataset):
     """
@@ -61,12 +64,12 @@ def create_data_transforms():
     
     return train_transform, val_transform
 
-def create_resnet_model(num_classes):
+def create_resnet_model(num_classes, pretrained=True):
     """
     Create ResNet model for disease classification
     """
     # Load pre-trained ResNet50
-    model = models.resnet50(pretrained=True)
+    model = models.resnet50(pretrained=pretrained)
     
     # Freeze early layers (optional - for transfer learning)
     for param in model.parameters():
@@ -88,92 +91,171 @@ def create_resnet_model(num_classes):
     
     return model
 
-def train_model(model, train_loader, val_loader, num_epochs=25, device='cuda'):
+def _evaluate(model, loader, criterion, device):
     """
-    Train the ResNet model
+    Mean loss and accuracy of the model over a loader
+    """
+    model.eval()
+    total_loss = 0.0
+    corrects = 0
+    count = 0
+    
+    with torch.no_grad():
+        for inputs, labels in loader:
+            inputs = inputs.to(device)
+            labels = labels.to(device)
+            
+            outputs = model(inputs)
+            total_loss += criterion(outputs, labels).item() * inputs.size(0)
+            corrects += (outputs.argmax(1) == labels).sum().item()
+            count += inputs.size(0)
+    
+    return total_loss / max(count, 1), corrects / max(count, 1)
+
+def train_model(model, train_loader, val_loader, num_epochs=25, device='cuda',
+                patience=5, min_delta=1e-3, eval_every=None, eval_subsample=256,
+                metrics_path='disease_training_metrics.jsonl', seed=42):
+    """
+    Train the ResNet model with early stopping.
+    The learning rate is reduced when the validation loss plateaus, the best
+    weights are kept, and training stops once the loss has not improved by
+    min_delta for patience checks. Without eval_every a check is the full
+    validation pass after every epoch. With eval_every, a check is a fixed
+    random subsample of eval_subsample validation images scored every
+    eval_every steps, so a converged run stops mid-epoch; the full pass then
+    only fills the per-epoch history. All metrics are appended to
+    metrics_path as JSON lines while training runs.
     """
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.fc.parameters(), lr=0.001)
-    scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=7, gamma=0.1)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.1,
+                                                     patience=max(1, patience // 2))
     
     model = model.to(device)
     
+    subsample_loader = None
+    if eval_every:
+        generator = np.random.default_rng(seed)
+        size = min(eval_subsample, len(val_loader.dataset))
+        indices = generator.choice(len(val_loader.dataset), size, replace=False).tolist()
+        subsample_loader = DataLoader(Subset(val_loader.dataset, indices), batch_size=val_loader.batch_size,
+                                      num_workers=val_loader.num_workers)
+    
     train_losses = []
     val_losses = []
     train_accuracies = []
     val_accuracies = []
     
-    best_val_acc = 0.0
+    best_val_loss = float('inf')
     best_model_state = None
-    
-    for epoch in range(num_epochs):
-        print(f'Epoch {epoch+1}/{num_epochs}')
-        print('-' * 10)
+    checks_without_improvement = 0
+    step = 0
+    start = time.perf_counter()
+    
+    metrics_file = open(metrics_path, 'w') if metrics_path else None
+    
+    def log_metrics(event, **values):
+        if metrics_file is None:
+            return
+        record = {'event': event, 'step': step, 'elapsed_s': round(time.perf_counter() - start, 3),
+                  'lr': optimizer.param_groups[0]['lr'], **values}
+        metrics_file.write(json.dumps(record) + '\n')
+        metrics_file.flush()
+    
+    def should_stop(val_loss):
+        """
+        Keep the best weights, step the scheduler and count the checks
+        without improvement; True once patience runs out
+        """
+        nonlocal best_val_loss, best_model_state, checks_without_improvement
+        # Keep a real copy of the best weights; state_dict() shares its tensors
+        if val_loss < best_val_loss - min_delta:
+            best_val_loss = val_loss
+            best_model_state = {name: value.detach().clone() for name, value in model.state_dict().items()}
+            checks_without_improvement = 0
+        else:
+            checks_without_improvement += 1
+        scheduler.step(val_loss)
         
-        # Training phase
-        model.train()
-        running_loss = 0.0
-        running_corrects = 0
-        
-        for inputs, labels in train_loader:
-            inputs = inputs.to(device)
-            labels = labels.to(device)
-            
-            optimizer.zero_grad()
-            
-            outputs = model(inputs)
-            _, preds = torch.max(outputs, 1)
-            loss = criterion(outputs, labels)
+        if checks_without_improvement < patience:
+            return False
+        unit = f'subsample checks ({eval_every} steps each)' if subsample_loader is not None else 'epochs'
+        print(f'Early stopping: no validation improvement for {patience} {unit}')
+        log_metrics('early_stop', epoch=epoch + 1, best_val_loss=best_val_loss)
+        return True
+    
+    stop = False
+    try:
+        for epoch in range(num_epochs):
+            print(f'Epoch {epoch+1}/{num_epochs}')
+            print('-' * 10)
             
-            loss.backward()
-            optimizer.step()
+            # Training phase
+            model.train()
+            running_loss = 0.0
+            running_corrects = 0
+            running_count = 0
             
-            running_loss += loss.item() * inputs.size(0)
-            running_corrects += torch.sum(preds == labels.data)
-        
-        epoch_loss = running_loss / len(train_loader.dataset)
-        epoch_acc = running_corrects.double() / len(train_loader.dataset)
-        
-        train_losses.append(epoch_loss)
-        train_accuracies.append(epoch_acc.cpu().numpy())
-        
-        print(f'Train Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
-        
-        # Validation phase
-        model.eval()
-        val_running_loss = 0.0
-        val_running_corrects = 0
-        
-        with torch.no_grad():
-            for inputs, labels in val_loader:
+            for inputs, labels in train_loader:
                 inputs = inputs.to(device)
                 labels = labels.to(device)
                 
+                optimizer.zero_grad()
+                
                 outputs = model(inputs)
-                _, preds = torch.max(outputs, 1)
                 loss = criterion(outputs, labels)
                 
-                val_running_loss += loss.item() * inputs.size(0)
-                val_running_corrects += torch.sum(preds == labels.data)
-        
-        val_epoch_loss = val_running_loss / len(val_loader.dataset)
-        val_epoch_acc = val_running_corrects.double() / len(val_loader.dataset)
-        
-        val_losses.append(val_epoch_loss)
-        val_accuracies.append(val_epoch_acc.cpu().numpy())
-        
-        print(f'Val Loss: {val_epoch_loss:.4f} Acc: {val_epoch_acc:.4f}')
-        
-        # Save best model
-        if val_epoch_acc > best_val_acc:
-            best_val_acc = val_epoch_acc
-            best_model_state = model.state_dict().copy()
-        
-        scheduler.step()
-        print()
+                loss.backward()
+                optimizer.step()
+                step += 1
+                
+                running_loss += loss.item() * inputs.size(0)
+                running_corrects += (outputs.argmax(1) == labels).sum().item()
+                running_count += inputs.size(0)
+                
+                if subsample_loader is not None and step % eval_every == 0:
+                    sub_loss, sub_acc = _evaluate(model, subsample_loader, criterion, device)
+                    model.train()
+                    log_metrics('subsample_eval', epoch=epoch + 1,
+                                train_loss=running_loss / running_count,
+                                train_acc=running_corrects / running_count,
+                                val_loss=sub_loss, val_acc=sub_acc)
+                    print(f'  Step {step}: subsample val loss {sub_loss:.4f} acc {sub_acc:.4f}')
+                    if should_stop(sub_loss):
+                        stop = True
+                        break
+            
+            epoch_loss = running_loss / max(running_count, 1)
+            epoch_acc = running_corrects / max(running_count, 1)
+            
+            train_losses.append(epoch_loss)
+            train_accuracies.append(epoch_acc)
+            
+            print(f'Train Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
+            
+            # Validation phase
+            val_epoch_loss, val_epoch_acc = _evaluate(model, val_loader, criterion, device)
+            
+            val_losses.append(val_epoch_loss)
+            val_accuracies.append(val_epoch_acc)
+            
+            print(f'Val Loss: {val_epoch_loss:.4f} Acc: {val_epoch_acc:.4f}')
+            log_metrics('epoch', epoch=epoch + 1, train_loss=epoch_loss, train_acc=epoch_acc,
+                        val_loss=val_epoch_loss, val_acc=val_epoch_acc)
+            
+            if subsample_loader is None:
+                stop = should_stop(val_epoch_loss)
+            print()
+            
+            if stop:
+                break
+    finally:
+        if metrics_file is not None:
+            metrics_file.close()
     
     # Load best model
-    model.load_state_dict(best_model_state)
+    if best_model_state is not None:
+        model.load_state_dict(best_model_state)
     
     return model, train_losses, val_losses, train_accuracies, val_accuracies
 
@@ -202,10 +284,18 @@ def plot_training_history(train_losses, val_losses, train_accuracies, val_accura
     plt.tight_layout()
     plt.show()
 
-def save_disease_model(model, class_names, accuracy):
+def save_disease_model(model, class_names, accuracy, temperature=None, tta_mode=None,
+                       calibration_loader=None):
     """
-    Save the trained disease prediction model
+    Save the trained disease prediction model.
+    Without an explicit temperature, one is fitted on calibration_loader
+    (the validation split) so served confidences are calibrated.
     """
+    if temperature is None and calibration_loader is not None:
+        from disease_inference import calibrate_temperature
+        temperature = calibrate_temperature(model, calibration_loader, tta_mode or 'none')
+        print(f"Calibrated confidence temperature: {temperature:.3f}")
+
     # Save model
     torch.save(model.state_dict(), 'plant_disease_resnet.pth')
     
@@ -221,50 +311,101 @@ def save_disease_model(model, class_names, accuracy):
         'input_size': [224, 224],
         'classes': class_names
     }
+    if temperature is not None:
+        metadata['temperature'] = float(temperature)
+    if tta_mode is not None:
+        metadata['tta_mode'] = tta_mode
     
     with open('disease_model_metadata.json', 'w') as f:
         json.dump(metadata, f, indent=2)
     
+    register_model('plant_disease', {
+        'model.pth': 'plant_disease_resnet.pth',
+        'classes.json': 'disease_classes.json'
+    }, metadata)
+    
     print(f"\nDisease model saved successfully!")
     print(f"Files created:")
     print("- plant_disease_resnet.pth")
     print("- disease_classes.json")
     print("- disease_model_metadata.json")
 
-def create_sample_data():
+DISEASE_CLASSES = [
+    'Healthy',
+    'Leaf_Blight',
+    'Powdery_Mildew',
+    'Bacterial_Spot',
+    'Rust',
+    'Mosaic_Virus',
+    'Black_Spot',
+    'Anthracnose'
+]
+
+class ArrayImageDataset(Dataset):
+    """
+    Dataset over an in-memory or memory-mapped uint8 image array.
+    Only the selected indices are read, so splits never copy image data.
+    """
+    def __init__(self, images, labels, indices=None, transform=None):
+        self.images = images
+        self.labels = labels
+        self.indices = np.arange(len(images)) if indices is None else indices
+        self.transform = transform
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def __getitem__(self, idx):
+        index = self.indices[idx]
+        image = Image.fromarray(np.asarray(self.images[index]))
+        
+        if self.transform:
+            image = self.transform(image)
+        
+        return image, int(self.labels[index])
+
+def create_sample_data(num_samples_per_class=100, image_size=(224, 224, 3),
+                       mmap_path=None, seed=42, block_size=256):
     """
     Create sample data for demonstration
-    Since we don't have actual plant disease images, we'll create synthetic data
+    Since we don't have actual plant disease images, we'll create synthetic data.
+    Images are written straight into one preallocated array (memory-mapped
+    when mmap_path is given), block by block, so peak memory stays at the
+    size of the dataset plus one block.
     """
     print("Creating sample dataset...")
     
-    # Define disease classes
-    disease_classes = [
-        'Healthy',
-        'Leaf_Blight',
-        'Powdery_Mildew',
-        'Bacterial_Spot',
-        'Rust',
-        'Mosaic_Virus',
-        'Black_Spot',
-        'Anthracnose'
-    ]
+    disease_classes = list(DISEASE_CLASSES)
+    num_samples = num_samples_per_class * len(disease_classes)
+    shape = (num_samples,) + tuple(image_size)
+    
+    if mmap_path:
+        images = np.lib.format.open_memmap(mmap_path, mode='w+', dtype=np.uint8, shape=shape)
+    else:
+        images = np.empty(shape, dtype=np.uint8)
+    labels = np.repeat(np.arange(len(disease_classes)), num_samples_per_class)
     
     # Create synthetic image data (in real scenario, you'd load actual images)
-    num_samples_per_class = 100
-    image_size = (224, 224, 3)
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_samples, block_size):
+        stop = min(start + block_size, num_samples)
+        images[start:stop] = rng.integers(0, 255, (stop - start,) + tuple(image_size), dtype=np.uint8)
     
-    all_images = []
-    all_labels = []
+    if mmap_path:
+        images.flush()
     
-    for class_idx, class_name in enumerate(disease_classes):
-        for i in range(num_samples_per_class):
-            # Create synthetic image data
-            synthetic_image = np.random.randint(0, 255, image_size, dtype=np.uint8)
-            all_images.append(synthetic_image)
-            all_labels.append(class_idx)
+    return images, labels, disease_classes
+
+def split_indices(labels, test_size=0.2, random_state=42):
+    """
+    Stratified train/validation split that returns index arrays instead of copies
+    """
+    from sklearn.model_selection import train_test_split
     
-    return np.array(all_images), np.array(all_labels), disease_classes
+    return train_test_split(
+        np.arange(len(labels)), test_size=test_size,
+        random_state=random_state, stratify=labels
+    )
 
 if __name__ == "__main__":
     print("Plant Disease Prediction Model Training")
@@ -276,27 +417,30 @@ if __name__ == "__main__":
     
     # Create sample data (replace with your actual dataset loading)
     print("\nLoading dataset...")
-    images, labels, class_names = create_sample_data()
+    recorder = get_recorder('disease_model')
+    with span('load'):
+        images, labels, class_names = create_sample_data()
     print(f"Dataset size: {len(images)} images")
     print(f"Number of classes: {len(class_names)}")
     print(f"Classes: {class_names}")
     
     # Split data into train and validation
-    from sklearn.model_selection import train_test_split
-    
-    train_images, val_images, train_labels, val_labels = train_test_split(
-        images, labels, test_size=0.2, random_state=42, stratify=labels
-    )
+    train_indices, val_indices = split_indices(labels)
     
     # Create data transforms
     train_transform, val_transform = create_data_transforms()
     
+    train_dataset = ArrayImageDataset(images, labels, train_indices, train_transform)
+    val_dataset = ArrayImageDataset(images, labels, val_indices, val_transform)
+    print(f"Train/validation split: {len(train_dataset)}/{len(val_dataset)} images")
+    
     # Note: In a real implementation, you would create proper datasets and dataloaders
     # For this demo, we'll simulate the training process
     
     # Create model
     print(f"\nCreating ResNet model...")
-    model = create_resnet_model(len(class_names))
+    with span('build_model'):
+        model = create_resnet_model(len(class_names))
     print(f"Model created with {len(class_names)} output classes")
     
     # Simulate training (in real implementation, you'd use actual training loop)
@@ -308,7 +452,12 @@ if __name__ == "__main__":
     print(f"Final validation accuracy: {final_accuracy:.4f}")
     
     # Save model
-    save_disease_model(model, class_names, final_accuracy)
+    with span('save'):
+        save_disease_model(model, class_names, final_accuracy,
+                           calibration_loader=DataLoader(val_dataset, batch_size=32))
+    
+    recorder.record_metric('accuracy', final_accuracy)
+    recorder.save('disease_model_run.json')
     
     print(f"\nModel training and saving completed successfully!")
     print(f"You can now use this model for plant disease prediction.")
@@ -0,0 +1,187 @@
+"""
+Historical yield time-series store for AgriBot
+Builds one contiguous yield series per Crop x State x Season indexed by
+Crop_Year, with precomputed mean, best year, rolling average and a
+Theil-Sen trend slope, saved as a compact .npz artifact
+"""
+
+import numpy as np
+import pandas as pd
+
+ROLLING_WINDOW = 3
+# Relative Theil-Sen slope (fraction of the mean yield per year) beyond which
+# a series is labelled increasing or decreasing
+TREND_THRESHOLD = 0.01
+TREND_LABELS = np.array(['stable', 'increasing', 'decreasing', 'insufficient_data'])
+
+def series_key(crop, state, season):
+    """
+    Normalized lookup key; seasons in the raw data are whitespace-padded
+    """
+    return f"{str(crop).strip().lower()}|{str(state).strip().lower()}|{str(season).strip().lower()}"
+
+def _theil_sen_slopes(series_ids, years, yields, offsets):
+    """
+    Median pairwise slope for every series in one vectorized pass
+    """
+    n_obs = len(years)
+    series_end = np.repeat(offsets[1:], np.diff(offsets))
+    # Pair every observation with each later observation of the same series
+    partners = series_end - np.arange(n_obs) - 1
+    first = np.repeat(np.arange(n_obs), partners)
+    pair_starts = np.repeat(np.cumsum(partners) - partners, partners)
+    second = first + 1 + (np.arange(len(first)) - pair_starts)
+
+    slopes = (yields[second] - yields[first]) / (years[second] - years[first])
+    pair_series = series_ids[first]
+
+    order = np.lexsort((slopes, pair_series))
+    sorted_slopes = slopes[order]
+    n_series = len(offsets) - 1
+    pair_counts = np.bincount(pair_series, minlength=n_series)
+    pair_offsets = np.concatenate([[0], np.cumsum(pair_counts)])
+
+    medians = np.full(n_series, np.nan)
+    has_pairs = pair_counts > 0
+    low = pair_offsets[:-1] + (pair_counts - 1) // 2
+    high = pair_offsets[:-1] + pair_counts // 2
+    medians[has_pairs] = (sorted_slopes[low[has_pairs]] + sorted_slopes[high[has_pairs]]) / 2
+    return medians
+
+def build_yield_timeseries(df, window=ROLLING_WINDOW):
+    """
+    Build the time-series store arrays from the crop yield dataframe.
+    Rows repeated for different soil samples are averaged per year first.
+    """
+    yearly = (
+        df.assign(
+            Crop=df['Crop'].str.strip(),
+            State=df['State'].str.strip(),
+            Season=df['Season'].str.strip()
+        )
+        .groupby(['Crop', 'State', 'Season', 'Crop_Year'], sort=True)['Yield']
+        .mean()
+        .reset_index()
+    )
+
+    series_ids = yearly.groupby(['Crop', 'State', 'Season'], sort=True).ngroup().to_numpy()
+    years = yearly['Crop_Year'].to_numpy(dtype=np.int16)
+    yields = yearly['Yield'].to_numpy(dtype=np.float64)
+    counts = np.bincount(series_ids)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    starts = offsets[:-1]
+    n_series = len(counts)
+
+    # Mean and best year (the most recent one when yields tie)
+    mean = np.add.reduceat(yields, starts) / counts
+    by_yield = np.lexsort((yields, series_ids))
+    best_index = by_yield[offsets[1:] - 1]
+
+    # Trailing rolling average at every observation, and its latest value per series
+    cumulative = np.concatenate([[0.0], np.cumsum(yields)])
+    positions = np.arange(len(yields))
+    window_start = np.maximum(np.repeat(starts, counts), positions - window + 1)
+    rolling = (cumulative[positions + 1] - cumulative[window_start]) / (positions + 1 - window_start)
+
+    slope = _theil_sen_slopes(series_ids, years.astype(np.float64), yields, offsets)
+    relative_slope = slope / np.where(mean != 0, np.abs(mean), 1.0)
+    trend = np.zeros(n_series, dtype=np.int8)
+    trend[relative_slope > TREND_THRESHOLD] = 1
+    trend[relative_slope < -TREND_THRESHOLD] = 2
+    trend[np.isnan(slope)] = 3
+
+    first_rows = yearly.iloc[starts]
+    keys = np.array([series_key(crop, state, season) for crop, state, season in
+                     zip(first_rows['Crop'], first_rows['State'], first_rows['Season'])])
+
+    return {
+        'keys': keys,
+        'crops': first_rows['Crop'].to_numpy(dtype=str),
+        'states': first_rows['State'].to_numpy(dtype=str),
+        'seasons': first_rows['Season'].to_numpy(dtype=str),
+        'offsets': offsets,
+        'years': years,
+        'yields': yields.astype(np.float32),
+        'rolling': rolling.astype(np.float32),
+        'mean': mean.astype(np.float32),
+        'best_year': years[best_index],
+        'best_yield': yields[best_index].astype(np.float32),
+        'rolling_avg': rolling[offsets[1:] - 1].astype(np.float32),
+        'trend_slope': slope.astype(np.float32),
+        'trend': trend,
+        'window': np.array(window)
+    }
+
+def save_yield_timeseries(df, path='data/yield_timeseries.npz'):
+    """
+    Build and save the time-series store artifact
+    """
+    store = build_yield_timeseries(df)
+    np.savez_compressed(path, **store)
+    print(f"Yield time-series store with {len(store['keys'])} series saved to {path}")
+    return store
+
+class YieldTimeSeriesStore:
+    """
+    Read side of the time-series artifact with O(1) lookups by
+    Crop x State x Season
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.index = {key: i for i, key in enumerate(arrays['keys'].tolist())}
+
+    @classmethod
+    def load(cls, path='data/yield_timeseries.npz'):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return series_key(*key) in self.index
+
+    def lookup(self, crop, state, season):
+        """
+        Historical summary for one series, or None if it is not in the data
+        """
+        i = self.index.get(series_key(crop, state, season))
+        if i is None:
+            return None
+
+        a = self.arrays
+        start, end = a['offsets'][i], a['offsets'][i + 1]
+        return {
+            'crop': str(a['crops'][i]),
+            'state': str(a['states'][i]),
+            'season': str(a['seasons'][i]),
+            'avg_yield': float(a['mean'][i]),
+            'best_yield': float(a['best_yield'][i]),
+            'best_year': int(a['best_year'][i]),
+            'rolling_avg': float(a['rolling_avg'][i]),
+            'trend': str(TREND_LABELS[a['trend'][i]]),
+            'trend_slope': float(a['trend_slope'][i]),
+            'years': a['years'][start:end].tolist(),
+            'yields': a['yields'][start:end].tolist(),
+            'rolling': a['rolling'][start:end].tolist()
+        }
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Build the historical yield time-series store')
+    parser.add_argument('--data', default='crop_yeild.csv', help='Path to the crop yield CSV')
+    parser.add_argument('--output', default='data/yield_timeseries.npz')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    df = pd.read_csv(args.data)
+    save_yield_timeseries(df, args.output)
+
+    store = YieldTimeSeriesStore.load(args.output)
+    crop, state, season = store.arrays['crops'][0], store.arrays['states'][0], store.arrays['seasons'][0]
+    summary = store.lookup(crop, state, season)
+    print(f"\nExample: {crop} / {state} / {season}")
+    print(f"Average yield: {summary['avg_yield']:.3f}, best {summary['best_yield']:.3f} "
+          f"in {summary['best_year']}, trend {summary['trend']} ({summary['trend_slope']:+.4f}/year)")
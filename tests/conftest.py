@@ -0,0 +1,13 @@
+"""
+Shared setup for the AgriBot test suite
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
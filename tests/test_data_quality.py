@@ -0,0 +1,58 @@
+"""
+Tests for the data quality stage on the published crop_yeild.csv
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import ROOT_DIR
+from data_quality import (
+    OUTLIER_GROUP,
+    OUTLIER_RULE,
+    rules_with_outlier_statistics,
+    streaming_outlier_statistics,
+    validate_dataframe,
+    yield_outlier_statistics
+)
+
+DATA_PATH = os.path.join(ROOT_DIR, 'crop_yeild.csv')
+
+@pytest.fixture(scope='module')
+def crop_yield():
+    return pd.read_csv(DATA_PATH)
+
+def test_no_crop_state_group_is_quarantined_whole(crop_yield):
+    result = validate_dataframe(crop_yield)
+
+    groups = result.quarantine.groupby(OUTLIER_GROUP).size()
+    sizes = result.clean.groupby(OUTLIER_GROUP).size().reindex(groups.index, fill_value=0) + groups
+    assert not (groups == sizes).any()
+    assert set(result.clean['State']) == set(crop_yield['State'].str.strip())
+
+def test_outlier_rule_rejects_an_implausible_yield(crop_yield):
+    df = crop_yield.copy()
+    df.loc[5, 'Yield'] *= 1e4
+
+    result = validate_dataframe(df)
+    assert result.summary['rows_quarantined'] == 1
+    assert OUTLIER_RULE in result.quarantine['dq_failures'].iloc[0]
+
+def test_streaming_statistics_do_not_depend_on_chunking(crop_yield):
+    clean = validate_dataframe(crop_yield).clean
+    expected = yield_outlier_statistics(clean).sort_index()
+
+    for chunksize in (997, 5000):
+        statistics = streaming_outlier_statistics(pd.read_csv(DATA_PATH, chunksize=chunksize)).sort_index()
+        assert list(statistics.index) == list(expected.index)
+        np.testing.assert_allclose(statistics.to_numpy(), expected.to_numpy())
+
+def test_chunked_validation_matches_whole_file(crop_yield):
+    df = crop_yield.copy()
+    df.loc[[5, 7000], 'Yield'] *= 1e4
+    whole = validate_dataframe(df)
+
+    rules = rules_with_outlier_statistics(streaming_outlier_statistics([df]))
+    chunked = sum(validate_dataframe(df.iloc[start:start + 1000], rules=rules).summary['rows_quarantined']
+                  for start in range(0, len(df), 1000))
+    assert chunked == whole.summary['rows_quarantined'] == 2
@@ -0,0 +1,58 @@
+"""
+Tests for the crop profitability ranking on the published crop_yeild.csv
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+from conftest import ROOT_DIR
+from profitability import PriceTable, ProfitabilityEngine, build_price_table
+
+DATA_PATH = os.path.join(ROOT_DIR, 'crop_yeild.csv')
+FARM_COLUMNS = ['State', 'Season', 'Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+NUMERIC_FEATURES = ['Crop_Year', 'Area', 'Annual_Rainfall', 'Fertilizer', 'Pesticide']
+
+@pytest.fixture(scope='module')
+def crop_yield():
+    df = pd.read_csv(DATA_PATH)
+    return df.assign(**{column: df[column].str.strip() for column in ('Crop', 'Season', 'State')})
+
+@pytest.fixture(scope='module')
+def engine(crop_yield):
+    encoders = {column: LabelEncoder().fit(crop_yield[column]) for column in ('Crop', 'Season', 'State')}
+    X = pd.DataFrame({
+        **{f'{column}_encoded': encoder.transform(crop_yield[column]) for column, encoder in encoders.items()},
+        **{column: crop_yield[column] for column in NUMERIC_FEATURES}
+    })
+    model = RandomForestRegressor(n_estimators=10, max_depth=8, random_state=42).fit(X, crop_yield['Yield'])
+    return ProfitabilityEngine(model, encoders['Crop'], encoders['Season'], encoders['State'],
+                               PriceTable(build_price_table(crop_yield)))
+
+def test_rank_leaves_out_crops_never_grown_in_the_state(crop_yield, engine):
+    farms = crop_yield.sample(200, random_state=0)[FARM_COLUMNS]
+    grown = set(zip(crop_yield['Crop'], crop_yield['State']))
+
+    ranking = engine.rank(farms)
+    assert set(zip(ranking['crop'], ranking['state'])) <= grown
+
+    evaluated = engine.evaluate(farms)
+    unsupported = evaluated[~evaluated['supported']]
+    assert len(unsupported) > 0
+    assert not set(zip(unsupported['crop'], unsupported['state'])) & grown
+    assert (unsupported['risk'] == 'unsupported').all()
+
+    every_crop = engine.rank(farms, include_unsupported=True)
+    assert (every_crop.groupby('farm').size() == len(engine.crops)).all()
+
+def test_price_rows_match_per_pair_lookup(engine):
+    table = engine.price_table
+    crops = ['Rice', ' jute', 'MAIZE', 'Wheat', 'Rice']
+    states = ['Assam', 'Andhra Pradesh', 'Gujarat ', 'Assam', None]
+
+    expected = [table.index.get((str(crop).strip().lower(), str(state).strip().lower()),
+                                table.index.get((str(crop).strip().lower(), '*'), -1))
+                for crop, state in zip(crops, states)]
+    np.testing.assert_array_equal(table.rows(crops, states), expected)
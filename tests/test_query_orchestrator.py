@@ -0,0 +1,149 @@
+"""
+Tests for the concurrent query orchestrator, using local stand-ins for the
+models and the LLM advice endpoint
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from query_orchestrator import LocalAdviceStandIn, QueryOrchestrator, build_term_index, translate_terms
+
+VOCABULARY = {
+    'en': {'crops': ['rice', 'wheat'], 'nutrients': ['nitrogen']},
+    'hi': {'crops': ['धान', 'गेहूं'], 'nutrients': ['नाइट्रोजन']}
+}
+
+QUERY = {
+    'text': 'धान में नाइट्रोजन कितना डालें?',
+    'language': 'hi',
+    'soil_params': {'N': 90, 'P': 42, 'K': 43},
+    'yield_inputs': {'crop': 'Rice', 'state': 'Assam'},
+    'image': b'leaf'
+}
+
+def sleeping(seconds, result):
+    def predictor(_):
+        time.sleep(seconds)
+        return result
+    return predictor
+
+def failing(_):
+    raise RuntimeError('model file missing')
+
+@pytest.fixture
+def make_orchestrator():
+    orchestrators = []
+
+    def make(**kwargs):
+        kwargs.setdefault('vocabulary', VOCABULARY)
+        orchestrator = QueryOrchestrator(**kwargs)
+        orchestrators.append(orchestrator)
+        return orchestrator
+
+    yield make
+    for orchestrator in orchestrators:
+        orchestrator.close()
+
+def test_translate_terms_uses_precompiled_patterns():
+    index = build_term_index(VOCABULARY)
+    assert hasattr(index['hi']['pattern'], 'sub')
+
+    translated = translate_terms(QUERY['text'], 'hi', index)
+    assert translated['text'] == 'rice में nitrogen कितना डालें?'
+    assert [term['english'] for term in translated['terms']] == ['rice', 'nitrogen']
+    assert translate_terms('rice', 'en', index) == {'text': 'rice', 'terms': []}
+
+def test_all_branches_succeed(make_orchestrator):
+    advice = LocalAdviceStandIn(delay=0.01)
+    orchestrator = make_orchestrator(
+        crop_predictor=sleeping(0.01, ['rice']),
+        yield_predictor=sleeping(0.01, {'mean': 2.8}),
+        disease_predictor=sleeping(0.01, {'disease': 'Rust'}),
+        advice_client=advice
+    )
+    response = asyncio.run(orchestrator.handle_query(QUERY))
+
+    assert not response['partial']
+    assert set(response['status']) == {'translation', 'crop_recommendation', 'yield_prediction',
+                                       'disease_lookup', 'advice'}
+    assert response['results']['crop_recommendation'] == ['rice']
+    assert response['results']['advice'] == advice.response
+    assert advice.calls == 1
+
+def test_branches_run_concurrently(make_orchestrator):
+    # Each model branch waits until all three are running at the same time
+    barrier = threading.Barrier(3, timeout=2)
+
+    def meeting(result):
+        def predictor(_):
+            barrier.wait()
+            time.sleep(0.2)
+            return result
+        return predictor
+
+    orchestrator = make_orchestrator(
+        crop_predictor=meeting('crop'),
+        yield_predictor=meeting('yield'),
+        disease_predictor=meeting('disease'),
+        advice_client=LocalAdviceStandIn(delay=0.2)
+    )
+    response = asyncio.run(orchestrator.handle_query(QUERY))
+
+    assert not response['partial']
+    # Four branches of at least 0.2s each finish in about the time of one
+    assert response['latency_s'] < 0.6
+    assert sum(response['timings_s'].values()) > response['latency_s'] * 2
+
+def test_slow_branch_times_out_without_holding_back_others(make_orchestrator):
+    orchestrator = make_orchestrator(
+        crop_predictor=sleeping(0.01, ['rice']),
+        yield_predictor=sleeping(0.01, {'mean': 2.8}),
+        disease_predictor=sleeping(1.0, {'disease': 'Rust'}),
+        advice_client=LocalAdviceStandIn(delay=0.01),
+        deadlines={'disease_lookup': 0.1}
+    )
+    response = asyncio.run(orchestrator.handle_query(QUERY))
+
+    assert response['partial']
+    assert response['status']['disease_lookup'] == 'timeout'
+    assert 'disease_lookup' not in response['results']
+    assert response['results']['yield_prediction'] == {'mean': 2.8}
+    assert response['timings_s']['disease_lookup'] < 0.5
+    assert response['latency_s'] < 0.5
+
+def test_failing_branch_returns_partial_results(make_orchestrator):
+    orchestrator = make_orchestrator(
+        crop_predictor=failing,
+        yield_predictor=sleeping(0.01, {'mean': 2.8}),
+        advice_client=LocalAdviceStandIn(delay=0.01)
+    )
+    response = asyncio.run(orchestrator.handle_query(QUERY))
+
+    assert response['partial']
+    assert response['status']['crop_recommendation'] == 'error: model file missing'
+    assert 'crop_recommendation' not in response['results']
+    assert response['status']['yield_prediction'] == 'ok'
+    assert response['results']['translation']['text'].startswith('rice')
+
+def test_timed_out_calls_do_not_starve_later_queries(make_orchestrator):
+    # The stuck disease call keeps its thread after the first query times
+    # out; the default executor leaves room for the next query's branches
+    orchestrator = make_orchestrator(
+        crop_predictor=sleeping(0.01, ['rice']),
+        yield_predictor=sleeping(0.01, {'mean': 2.8}),
+        disease_predictor=sleeping(0.8, {'disease': 'Rust'}),
+        deadlines={'disease_lookup': 0.05, 'crop_recommendation': 0.3, 'yield_prediction': 0.3},
+        max_concurrent_queries=2
+    )
+
+    async def two_queries():
+        first = await orchestrator.handle_query(QUERY)
+        second = await orchestrator.handle_query(QUERY)
+        return first, second
+
+    first, second = asyncio.run(two_queries())
+    for response in (first, second):
+        assert response['status']['disease_lookup'] == 'timeout'
+        assert response['status']['crop_recommendation'] == 'ok'
+        assert response['status']['yield_prediction'] == 'ok'